@@ -7,3 +7,6 @@ class AuthConfig(AppConfig):
     verbose_name = 'Utilisateurs'
     label = 'Cauth'
 
+    def ready(self):
+        from . import signals
+        signals.replace_update_last_login()
@@ -0,0 +1,97 @@
+import time
+from typing import Dict, Set
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db import transaction
+
+CACHE_TIMEOUT = 60 * 60
+GLOBAL_VERSION_KEY = 'perms:version'
+
+
+def user_version_key(user_id: int) -> str:
+    return f'perms:user:{user_id}:version'
+
+
+def permissions_key(user_id: int) -> str:
+    return f'perms:user:{user_id}'
+
+
+def permissions_cache():
+    """ Shared by the processes of the server: a revocation must be seen by all of them """
+    return caches[settings.PERMISSIONS_CACHE_ALIAS]
+
+
+def bump_version(key: str) -> None:
+    cache = permissions_cache()
+    try:
+        cache.incr(key)
+    except ValueError:  # not in the cache (never set or evicted)
+        cache.set(key, time.time_ns(), None)
+
+
+def bump_versions_on_commit(*keys: str) -> None:
+    """
+    Once the change is committed: bumped before, a request could compute the permissions from the database as it
+    was before the commit and cache them with the new version.
+    """
+    def bump() -> None:
+        for key in keys:
+            bump_version(key)
+
+    transaction.on_commit(bump)
+
+
+def invalidate_user_permissions(*user_ids: int) -> None:
+    """ Forget the cached permissions of these users (their groups or their own permissions have changed) """
+    bump_versions_on_commit(*(user_version_key(user_id) for user_id in user_ids))
+
+
+def invalidate_all_permissions() -> None:
+    """ Forget the cached permissions of every user (the permissions of a group have changed) """
+    bump_versions_on_commit(GLOBAL_VERSION_KEY)
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ``ModelBackend`` keeping the permissions of the users in the cache between requests.
+
+    The cached permissions are stored with the global version and the version of the user at the time they were
+    computed, and ignored if one of them has changed since: the versions are bumped by the signals of
+    ``auth.signals``. The cache, the two versions included, is read with a single ``get_many``.
+    """
+
+    def _get_permissions(self, user_obj, obj, from_name):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+
+        perm_cache_name = '_%s_perm_cache' % from_name
+        if not hasattr(user_obj, perm_cache_name):
+            setattr(user_obj, perm_cache_name, self._get_cached_permissions(user_obj)[from_name])
+        return getattr(user_obj, perm_cache_name)
+
+    def _get_cached_permissions(self, user_obj) -> Dict[str, Set[str]]:
+        """ ``{'user': permissions of the user, 'group': permissions of their groups}`` """
+        cache = permissions_cache()
+        keys = [GLOBAL_VERSION_KEY, user_version_key(user_obj.pk), permissions_key(user_obj.pk)]
+        cached = cache.get_many(keys)
+        versions = tuple(cached.get(key) for key in keys[:2])
+
+        if None in versions:
+            # start the versions at an arbitrary value, so permissions cached before an eviction are not reused
+            for key in keys[:2]:
+                cache.add(key, time.time_ns(), None)
+            cached = cache.get_many(keys[:2])
+            versions = tuple(cached.get(key) for key in keys[:2])
+
+        elif cached.get(keys[2], {}).get('versions') == versions:
+            return cached[keys[2]]
+
+        permissions = {
+            'user': super()._get_permissions(user_obj, None, 'user'),
+            'group': super()._get_permissions(user_obj, None, 'group'),
+            'versions': versions,
+        }
+        cache.set(keys[2], permissions, CACHE_TIMEOUT)
+        return permissions
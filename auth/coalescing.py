@@ -0,0 +1,88 @@
+"""
+Write-behind buffers: writes which can be delayed a few seconds are kept in memory, the last value per key
+only, and written in one transaction when the buffer is full, when ``WRITE_BEHIND_INTERVAL`` has elapsed
+(checked at the end of each request) and when the process exits.
+
+SQLite has a single writer lock, shared with the likes and the comments: a batch of 100 updates takes it
+once instead of 100 times.
+"""
+import atexit
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DatabaseError, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+buffers: List['WriteBuffer'] = []
+
+
+class WriteBuffer:
+
+    def __init__(self, name: str, write: Callable[[Any, Dict[Hashable, Any]], None], using: str = 'default') -> None:
+        """ ``write(connection, pending)`` writes the ``{key: last value}`` of the buffer to the database """
+        self.name = name
+        self.write = write
+        self.using = using
+        self.pending: Dict[Hashable, Any] = {}
+        self.database_name = None
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+        buffers.append(self)
+
+    def add(self, key: Hashable, value: Any) -> None:
+        with self.lock:
+            if not self.pending:
+                self.database_name = connections[self.using].settings_dict['NAME']
+            self.pending[key] = value
+            full = len(self.pending) >= settings.WRITE_BEHIND_BATCH_SIZE
+
+        if full or not settings.WRITE_BEHIND_INTERVAL:
+            self.flush()
+
+    def discard(self, key: Hashable) -> None:
+        with self.lock:
+            self.pending.pop(key, None)
+
+    def flush_if_due(self) -> None:
+        if self.pending and time.monotonic() - self.last_flush >= settings.WRITE_BEHIND_INTERVAL:
+            self.flush()
+
+    def flush(self) -> None:
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.last_flush = time.monotonic()
+        if not pending:
+            return
+
+        connection = connections[self.using]
+        if connection.settings_dict['NAME'] != self.database_name:
+            # the writes were buffered for another database (a test database which has been destroyed)
+            logger.warning("%d pending %s write(s) dropped, the database has changed", len(pending), self.name)
+            return
+
+        try:
+            with transaction.atomic(using=self.using):
+                self.write(connection, pending)
+        except DatabaseError:
+            logger.exception("Failed to write %d pending %s write(s), retrying later", len(pending), self.name)
+            with self.lock:
+                self.pending = {**pending, **self.pending}
+
+
+def flush_due_buffers(**kwargs) -> None:
+    for buffer in buffers:
+        buffer.flush_if_due()
+
+
+def flush_all_buffers() -> None:
+    for buffer in buffers:
+        buffer.flush()
+
+
+request_finished.connect(flush_due_buffers)
+atexit.register(flush_all_buffers)
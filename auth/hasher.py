@@ -1,13 +1,19 @@
+import hashlib
+
 from django.contrib.auth.hashers import PBKDF2PasswordHasher
-from werkzeug.security import _hash_internal
 
 
 class Hasher(PBKDF2PasswordHasher):
+    """
+    Passwords of the Flask version of the site (werkzeug ``pbkdf2:sha256``, hexadecimal digest).
+
+    Only used to check them: they are upgraded to the preferred hasher on the next successful login.
+    """
     iterations = 260000
     algorithm = "pbkdf2:sha256"
 
     def encode(self, password, salt, iterations=None):
         self._check_encode_args(password, salt)
         iterations = iterations or self.iterations
-        hash = _hash_internal(self.algorithm, salt, password)[0]
-        return "%s$%d$%s$%s" % (self.algorithm, iterations, salt, hash)
\ No newline at end of file
+        hash = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), iterations).hex()
+        return "%s$%d$%s$%s" % (self.algorithm, iterations, salt, hash)
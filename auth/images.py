@@ -0,0 +1,131 @@
+"""
+Resized copies of the profile pictures.
+
+Each picture is decoded once and saved in a few fixed sizes, in WebP and in JPEG for the browsers without WebP,
+without its metadata (EXIF: GPS position, camera...). The names of the variants contain a hash of the original,
+so they can be cached for good. They are listed in ``CustomUser.profile_pic_variants``::
+
+    {'source': 'profile_pics/photo.jpg',
+     'avatar': {'width': 64, 'height': 64, 'webp': 'profile_pics/variants/1/photo-5e1f...-avatar.webp', 'jpeg': ...},
+     'card': {...}, 'full': {...}}
+"""
+import hashlib
+import io
+import logging
+import posixpath
+from typing import Dict, Optional
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from PIL import Image, ImageOps, features
+
+from monodcrush.background import submit_on_commit
+from .models import CustomUser
+
+logger = logging.getLogger(__name__)
+
+# name: (width, height), cropped to fill the box if ``crop``, else resized to fit in it
+VARIANTS = {
+    'avatar': ((64, 64), True),
+    'card': ((256, 256), True),
+    'full': ((1024, 1024), False),
+}
+# format: (extension, Pillow options), WebP only if Pillow has been built with libwebp
+FORMATS = {
+    'webp': ('webp', {'format': 'WEBP', 'quality': 80, 'method': 6}),
+    'jpeg': ('jpg', {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True}),
+}
+if not features.check('webp'):
+    del FORMATS['webp']
+VARIANTS_DIRECTORY = 'profile_pics/variants'
+
+
+def render_variants(image: Image.Image) -> Dict[str, Dict[str, bytes]]:
+    """ ``{variant: {format: encoded image}}`` of the image """
+    image = ImageOps.exif_transpose(image)  # apply the orientation of the photo before dropping the EXIF
+    if image.mode != 'RGB':
+        image = image.convert('RGBA').convert('RGB') if image.mode in ('P', 'LA') else image.convert('RGB')
+
+    rendered = {}
+    for name, (size, crop) in VARIANTS.items():
+        if crop:
+            resized = ImageOps.fit(image, size, Image.LANCZOS)
+        else:
+            resized = image.copy()
+            resized.thumbnail(size, Image.LANCZOS)
+
+        rendered[name] = {'size': resized.size}
+        for image_format, (extension, options) in FORMATS.items():
+            output = io.BytesIO()
+            # a new image has no ``info``: neither EXIF nor ICC profile are written
+            resized.save(output, **options)
+            rendered[name][image_format] = output.getvalue()
+    return rendered
+
+
+def generate_profile_pic_variants(user_id: int, source: Optional[str] = None, force: bool = False) -> bool:
+    """
+    Generate the variants of the current profile picture of the user (``source``, '' if it has been removed)
+    and delete the old ones. Return False if there was nothing to do.
+    """
+    user = CustomUser.objects.filter(pk=user_id).only('profile_pic', 'profile_pic_variants').first()
+    current = (user.profile_pic.name or '') if user is not None else None
+    if user is None or (source is not None and current != source):
+        return False  # deleted or changed again since the task was submitted: another task handles it
+
+    old_variants = user.profile_pic_variants or {}
+    if (old_variants.get('source') or '') == current and not force:
+        return False
+    variants = save_variants(user) if current else {}
+
+    # only if the picture has not changed meanwhile, otherwise the variants are those of the previous one
+    still_current = Q(profile_pic=current) if current else Q(profile_pic='') | Q(profile_pic__isnull=True)
+    updated = CustomUser.objects.filter(still_current, pk=user_id).update(profile_pic_variants=variants)
+    if updated:
+        delete_variants(old_variants, keep=variants)
+    else:
+        delete_variants(variants, keep=old_variants)
+    return bool(updated)
+
+
+def save_variants(user: CustomUser) -> dict:
+    with user.profile_pic.open('rb') as file:
+        content = file.read()
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    stem = posixpath.splitext(posixpath.basename(user.profile_pic.name))[0]
+
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            # decode a JPEG directly at a lower resolution when it is much bigger than needed
+            image.draft('RGB', (2048, 2048))
+            rendered = render_variants(image)
+    except (OSError, Image.DecompressionBombError, ValueError):
+        logger.exception("Unreadable profile picture %s of the user %d", user.profile_pic.name, user.pk)
+        return {'source': user.profile_pic.name}
+
+    variants = {'source': user.profile_pic.name}
+    for name, encoded in rendered.items():
+        width, height = encoded.pop('size')
+        variants[name] = {'width': width, 'height': height}
+        for image_format, data in encoded.items():
+            path = f'{VARIANTS_DIRECTORY}/{user.pk}/{stem}-{digest}-{name}.{FORMATS[image_format][0]}'
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            variants[name][image_format] = default_storage.save(path, ContentFile(data))
+    return variants
+
+
+def delete_variants(variants: dict, keep: dict) -> None:
+    kept = {path for name in VARIANTS for path in (keep.get(name) or {}).values() if isinstance(path, str)}
+    for name in VARIANTS:
+        for path in (variants.get(name) or {}).values():
+            if isinstance(path, str) and path not in kept:
+                default_storage.delete(path)
+
+
+def schedule_profile_pic_variants(user: CustomUser) -> None:
+    """ Generate the variants in the background once the new picture is committed, if they are outdated """
+    variants = user.profile_pic_variants or {}
+    if (user.profile_pic.name or '') != (variants.get('source') or ''):
+        submit_on_commit(generate_profile_pic_variants, user.pk, user.profile_pic.name or '')
@@ -0,0 +1,53 @@
+import os
+import threading
+import time
+
+from django.contrib.auth.hashers import check_password, get_hasher
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ("Measure the password checks per second (the CPU cost of a login) with the passwords hashed by "
+            "concurrent request threads.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, nargs='+', default=sorted({1, os.cpu_count() or 1}),
+                            help="Numbers of concurrent logins to compare, like the threads of a web worker "
+                                 "(default: 1 and the CPU count)")
+        parser.add_argument('--duration', type=float, default=5, help="Seconds per measure (default: 5)")
+
+    def handle(self, *args, threads: list, duration: float, **options):
+        if min(threads) < 1 or duration <= 0:
+            raise CommandError("--threads and --duration must be positive")
+
+        password = 'benchmark-password'
+        encoded = {
+            'default': get_hasher('default').encode(password, get_hasher('default').salt()),
+            'legacy': get_hasher('pbkdf2:sha256').encode(password, get_hasher('pbkdf2:sha256').salt()),
+        }
+
+        for thread_count in threads:
+            cores = min(thread_count, os.cpu_count() or 1)
+            for name, hash in encoded.items():
+                logins = self.measure(password, hash, thread_count, duration)
+                self.stdout.write(f"{name:7} hash, {thread_count} threads: {logins / duration:8.1f} logins/s, "
+                                  f"{logins / duration / cores:7.1f} logins/s per core ({cores} core(s))")
+
+    @staticmethod
+    def measure(password: str, encoded: str, threads: int, duration: float) -> int:
+        """ Check the password from ``threads`` threads during ``duration`` seconds, return the number of checks """
+        deadline = time.perf_counter() + duration
+        counts = [0] * threads
+
+        def login(index: int) -> None:
+            while time.perf_counter() < deadline:
+                if not check_password(password, encoded):
+                    raise AssertionError("Wrong password hash")
+                counts[index] += 1
+
+        workers = [threading.Thread(target=login, args=(index,)) for index in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return sum(counts)
@@ -0,0 +1,42 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from auth.images import VARIANTS, generate_profile_pic_variants
+from auth.models import CustomUser
+
+
+def variants_size(variants: dict, image_format: str) -> int:
+    return sum(default_storage.size(variant[image_format]) for name, variant in variants.items()
+               if name in VARIANTS and variant.get(image_format))
+
+
+class Command(BaseCommand):
+    help = ("Generate the missing or outdated variants of the profile pictures (avatar, card, full in WebP and "
+            "JPEG), for the pictures uploaded before the variants existed or whose background task was lost.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Generate again the variants already up to date")
+
+    def handle(self, *args, force: bool, **options):
+        users = CustomUser.objects.exclude(Q(profile_pic='') | Q(profile_pic__isnull=True)).order_by('pk')
+        generated = skipped = original_bytes = webp_bytes = jpeg_bytes = 0
+
+        for user_id in users.values_list('pk', flat=True).iterator():
+            if not generate_profile_pic_variants(user_id, force=force):
+                skipped += 1
+                continue
+
+            user = CustomUser.objects.only('profile_pic', 'profile_pic_variants').get(pk=user_id)
+            if 'full' not in user.profile_pic_variants:
+                self.stderr.write(f"Unreadable profile picture {user.profile_pic.name} (user {user_id})")
+                continue
+            generated += 1
+            original_bytes += user.profile_pic.size
+            webp_bytes += variants_size(user.profile_pic_variants, 'webp')
+            jpeg_bytes += variants_size(user.profile_pic_variants, 'jpeg')
+
+        self.stdout.write(f"{generated} profile pictures processed, {skipped} already up to date")
+        if generated:
+            self.stdout.write(f"Originals: {original_bytes / 1024:.0f} KiB, all the variants: "
+                              f"{webp_bytes / 1024:.0f} KiB in WebP, {jpeg_bytes / 1024:.0f} KiB in JPEG")
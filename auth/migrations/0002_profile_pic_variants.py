@@ -0,0 +1,23 @@
+# Generated by Django 4.0.5 on 2026-10-18 09:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Cauth', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='profile_pic_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='miniatures de la photo de profil'),
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='email',
+            field=models.EmailField(blank=True, help_text="L'adresse mail permet de récupérer son compte en cas de perte de mot de passe. Elle n'est pas publiée sur votre profil.", max_length=254, verbose_name='adresse mail'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.5 on 2026-10-18 09:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Cauth', '0002_profile_pic_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="nombre d'abonnés"),
+        ),
+    ]
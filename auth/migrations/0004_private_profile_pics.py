@@ -0,0 +1,37 @@
+# Generated by Django 4.0.5 on 2026-10-18 10:10
+
+import auth.storage
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def move_originals(source, target):
+    """ Move the original pictures uploaded so far out of MEDIA_ROOT (their variants stay there) """
+    def move(apps, schema_editor):
+        CustomUser = apps.get_model('Cauth', 'CustomUser')
+        names = CustomUser.objects.exclude(Q(profile_pic='') | Q(profile_pic__isnull=True)) \
+            .values_list('profile_pic', flat=True)
+        for name in names:
+            if source.exists(name) and not target.exists(name):
+                with source.open(name, 'rb') as file:
+                    target.save(name, file)
+                source.delete(name)
+    return move
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Cauth', '0003_followers_count'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='profile_pic',
+            field=models.ImageField(blank=True, null=True, storage=auth.storage.PrivateStorage(), upload_to='profile_pics', verbose_name='photo de profil'),
+        ),
+        migrations.RunPython(move_originals(default_storage, auth.storage.private_storage),
+                             move_originals(auth.storage.private_storage, default_storage)),
+    ]
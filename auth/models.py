@@ -1,13 +1,16 @@
 from datetime import date
-from typing import Any
+from typing import Any, List, Optional
 
 from django.contrib.auth.base_user import AbstractBaseUser
 from django.contrib.auth.models import PermissionsMixin, UserManager
 from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
 from django.core.mail import send_mail
 from django.db import models
 from django.db.models.functions import Lower
+from django.templatetags.static import static
 
+from .storage import private_storage
 from .validators import username_validator, date_of_birth_validator, instagram_validator, twitter_validator
 
 
@@ -30,9 +33,13 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     profile_pic = models.ImageField(
             "photo de profil",
             upload_to="profile_pics",
+            storage=private_storage,
             blank=True,
             null=True,
     )
+    # resized copies of profile_pic, generated in the background by auth.images
+    profile_pic_variants = models.JSONField("miniatures de la photo de profil", default=dict, blank=True,
+                                            editable=False)
 
     first_name = models.CharField("prénom", max_length=150, blank=True)
     bio = models.TextField("biographie", max_length=500, blank=True)
@@ -60,11 +67,17 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     )
     date_joined = models.DateTimeField("date d'inscription", auto_now_add=True)
 
+    # denormalized counter, kept up to date by blog.timelines and blog.signals
+    followers_count = models.PositiveIntegerField("nombre d'abonnés", default=0, editable=False)
+
     objects = UserManager()
 
     EMAIL_FIELD = "email"
     USERNAME_FIELD = "username"
     REQUIRED_FIELDS = ["date_of_birth"]
+    DENORMALIZED_FIELDS = ("followers_count",)
+    SQUARE_PROFILE_PIC_VARIANTS = ("avatar", "card")
+    PROFILE_PIC_PLACEHOLDER = "icons/account.svg"
 
     class Meta:
         constraints = [
@@ -81,6 +94,16 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
             raise ValidationError("Ce nom d'utilisateur est déjà utilisé.", code="unique_username")
         super().validate_unique(exclude)
 
+    def save(self, *args: Any, **kwargs: Any) -> None:
+        """
+        Saving an existing user (admin, password change) leaves out followers_count: the value loaded with the user
+        would overwrite the follows made since by the other requests.
+        """
+        if not self._state.adding and kwargs.get("update_fields") is None and not kwargs.get("force_insert"):
+            kwargs["update_fields"] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in CustomUser.DENORMALIZED_FIELDS]
+        super().save(*args, **kwargs)
+
     def clean(self) -> None:
         super().clean()
         self.email = self.__class__.objects.normalize_email(self.email)
@@ -93,3 +116,37 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     def is_birthday(self) -> bool:
         """ Return True if the user is a birthday."""
         return self.date_of_birth.month == date.today().month and self.date_of_birth.day == date.today().day
+
+    def profile_pic_variant_url(self, variant: str, image_format: str) -> Optional[str]:
+        """ URL of a variant of the profile picture, None if it has not been generated (yet) """
+        variants = self.profile_pic_variants or {}
+        if not self.profile_pic or variants.get('source') != self.profile_pic.name:
+            return None
+        path = (variants.get(variant) or {}).get(image_format)
+        return default_storage.url(path) if path else None
+
+    @property
+    def profile_pic_sources(self) -> List[dict]:
+        """ ``<source>`` elements of the square variants of the profile picture, WebP first """
+        sources = []
+        for image_format, mime_type in (('webp', 'image/webp'), ('jpeg', 'image/jpeg')):
+            srcset = []
+            for variant in self.SQUARE_PROFILE_PIC_VARIANTS:
+                url = self.profile_pic_variant_url(variant, image_format)
+                if url:
+                    srcset.append(f"{url} {self.profile_pic_variants[variant]['width']}w")
+            if srcset:
+                sources.append({'type': mime_type, 'srcset': ', '.join(srcset)})
+        return sources
+
+    @property
+    def profile_pic_fallback_url(self) -> Optional[str]:
+        """ JPEG card for the browsers without ``<picture>``, a placeholder until the variants are generated """
+        if not self.profile_pic:
+            return None
+        return self.profile_pic_variant_url('card', 'jpeg') or static(self.PROFILE_PIC_PLACEHOLDER)
+
+    @property
+    def profile_pic_full_url(self) -> Optional[str]:
+        """ Largest variant, None until it is generated: the original is never published """
+        return self.profile_pic_variant_url('full', 'jpeg')
@@ -0,0 +1,41 @@
+"""
+Session engine reading the sessions from a cache shared by the processes (``SESSION_CACHE_ALIAS``) and writing
+the modified sessions to the database in batches.
+
+New sessions are written to the database at once, like the ``cached_db`` engine does, so that the uniqueness
+of the session key is checked. The modifications of existing sessions are written to the cache at once and
+to the database by a write-behind buffer (``auth.coalescing``). The buffered writes are updates only: a session
+deleted meanwhile (logout) is not written back.
+"""
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.contrib.sessions.models import Session
+
+from .coalescing import WriteBuffer
+
+
+def write_sessions(connection, pending: dict) -> None:
+    table = connection.ops.quote_name(Session._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+                f"UPDATE {table} SET session_data = %s, expire_date = %s WHERE session_key = %s",
+                [(data, connection.ops.adapt_datetimefield_value(expire_date), session_key)
+                 for session_key, (data, expire_date) in pending.items()])
+
+
+session_writes = WriteBuffer('session', write_sessions)
+
+
+class SessionStore(CachedDBStore):
+
+    def save(self, must_create=False):
+        if must_create or self.session_key is None:
+            return super().save(must_create)
+
+        data = self._get_session(no_load=must_create)
+        self._cache.set(self.cache_key, data, self.get_expiry_age())
+        session = self.create_model_instance(data)
+        session_writes.add(self.session_key, (session.session_data, session.expire_date))
+
+    def delete(self, session_key=None):
+        session_writes.discard(session_key or self.session_key)
+        super().delete(session_key)
@@ -0,0 +1,87 @@
+from django.contrib.auth.models import Group, Permission, update_last_login as django_update_last_login
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from monodcrush.background import submit_on_commit
+from .backends import invalidate_user_permissions, invalidate_all_permissions
+from .coalescing import WriteBuffer
+from .images import delete_variants, schedule_profile_pic_variants
+from .models import CustomUser
+
+CHANGING_ACTIONS = ('post_add', 'post_remove', 'post_clear')
+
+
+@receiver(m2m_changed, sender=CustomUser.groups.through)
+@receiver(m2m_changed, sender=CustomUser.user_permissions.through)
+def user_permissions_changed(sender, instance, action: str, reverse: bool, pk_set, **kwargs) -> None:
+    """ ``user.groups``/``user.user_permissions`` or their reverse (``group.user_set``...) have changed """
+    if action not in CHANGING_ACTIONS:
+        return
+
+    if not reverse:
+        invalidate_user_permissions(instance.pk)
+    elif pk_set:
+        invalidate_user_permissions(*pk_set)
+    else:
+        # reverse clear (group.user_set.clear()): the users are not known anymore
+        invalidate_all_permissions()
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def group_permissions_changed(sender, action: str, **kwargs) -> None:
+    if action in CHANGING_ACTIONS:
+        invalidate_all_permissions()
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def group_or_permission_deleted(sender, **kwargs) -> None:
+    invalidate_all_permissions()
+
+
+@receiver(post_save, sender=Permission)
+def permission_saved(sender, created: bool, raw: bool, **kwargs) -> None:
+    """ A renamed codename (admin, data migration): the cached permissions still hold the old one """
+    if not created and not raw:
+        invalidate_all_permissions()
+
+
+def write_last_logins(connection, pending: dict) -> None:
+    table = connection.ops.quote_name(CustomUser._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(f"UPDATE {table} SET last_login = %s WHERE id = %s",
+                           [(connection.ops.adapt_datetimefield_value(last_login), user_id)
+                            for user_id, last_login in pending.items()])
+
+
+last_login_writes = WriteBuffer('last_login', write_last_logins)
+
+
+def update_last_login(sender, user, **kwargs) -> None:
+    """ Set ``last_login`` on the instance at once, in the database with the next batch """
+    user.last_login = timezone.now()
+    last_login_writes.add(user.pk, user.last_login)
+
+
+def replace_update_last_login() -> None:
+    """
+    Replace Django's receiver, which saves last_login on every login, with ``update_last_login`` whatever the
+    order of the apps: Django's receiver is disconnected if ``django.contrib.auth`` is ready first, otherwise its
+    connection is ignored since ours holds its dispatch_uid.
+    """
+    user_logged_in.disconnect(django_update_last_login, dispatch_uid='update_last_login')
+    user_logged_in.connect(update_last_login, dispatch_uid='update_last_login')
+
+
+@receiver(post_save, sender=CustomUser)
+def profile_pic_changed(sender, instance: CustomUser, raw: bool, **kwargs) -> None:
+    if not raw:  # not when loading fixtures
+        schedule_profile_pic_variants(instance)
+
+
+@receiver(post_delete, sender=CustomUser)
+def user_deleted(sender, instance: CustomUser, **kwargs) -> None:
+    if instance.profile_pic_variants:
+        submit_on_commit(delete_variants, instance.profile_pic_variants, {})
@@ -0,0 +1,21 @@
+"""
+Storage of the original profile pictures, outside of MEDIA_ROOT.
+
+The originals keep their metadata (EXIF: GPS position, camera...), they are only read by auth.images to generate
+the variants, which are the only copies published under MEDIA_URL.
+"""
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+
+
+class PrivateStorage(FileSystemStorage):
+    """ Files of PRIVATE_MEDIA_ROOT, never served: they have no URL """
+
+    def __init__(self) -> None:
+        super().__init__(location=settings.PRIVATE_MEDIA_ROOT, base_url=None)
+
+    def url(self, name: str) -> str:
+        return ''
+
+
+private_storage = PrivateStorage()
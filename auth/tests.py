@@ -1,3 +1,220 @@
-from django.test import TestCase
+import hashlib
+import io
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, Permission
+from django.contrib.sessions.models import Session
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from blog.benchmark import RouteBenchmark, seed_dataset, format_failure
+from .backends import permissions_cache
+from .hasher import Hasher
+from .images import FORMATS, render_variants
+from .models import CustomUser
+from .sessions import SessionStore, session_writes
+from .storage import private_storage
+
+
+class RouteQueryBudgetTests(TestCase):
+    """ Number of SQL queries of the authentication pages, the budgets are in blog/route_budgets.json """
+    namespaces = ('auth',)
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(nb_users=50, nb_posts=100)
+
+    def test_routes_within_query_budget(self):
+        report = RouteBenchmark(namespaces=self.namespaces, repeat=1).run()
+        self.assertEqual([], [format_failure(result) for result in report['failures']])
+
+
+class LegacyPasswordTests(TestCase):
+    """ Passwords of the Flask version of the site, see auth.hasher.Hasher """
+
+    def test_hasher_round_trip(self):
+        hasher = Hasher()
+        encoded = hasher.encode('motdepasse', 'Zl5hWf0rQp', iterations=1000)
+        digest = hashlib.pbkdf2_hmac('sha256', b'motdepasse', b'Zl5hWf0rQp', 1000).hex()
+        self.assertEqual(f'pbkdf2:sha256$1000$Zl5hWf0rQp${digest}', encoded)
+        self.assertTrue(hasher.verify('motdepasse', encoded))
+        self.assertFalse(hasher.verify('mauvais', encoded))
+
+        self.assertTrue(hasher.must_update(encoded))
+        self.assertFalse(hasher.must_update(hasher.encode('motdepasse', hasher.salt())))
+
+    def test_legacy_password_is_checked_and_upgraded(self):
+        salt = 'Zl5hWf0rQp'
+        digest = hashlib.pbkdf2_hmac('sha256', b'motdepasse', salt.encode(), 1000).hex()
+        user = CustomUser.objects.create(username='ancien', date_of_birth='2000-01-01',
+                                         password=f'pbkdf2:sha256$1000${salt}${digest}')
+
+        self.assertFalse(self.client.login(username='ancien', password='mauvais'))
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2:sha256$'))
+
+        self.assertTrue(self.client.login(username='ancien', password='motdepasse'))
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(user.check_password('motdepasse'))
+
+
+class CachedPermissionsTests(TestCase):
+    """ Permissions cached between requests by auth.backends, forgotten by the signals of auth.signals """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.permission = Permission.objects.get(codename='view_reports')
+        cls.group = Group.objects.create(name="modérateurs")
+        cls.group.permissions.add(cls.permission)
+        cls.user = CustomUser.objects.create(username='moderator', date_of_birth='2000-01-01')
+        cls.user.groups.add(cls.group)
+
+    def setUp(self):
+        permissions_cache().clear()
+
+    def has_perm(self) -> bool:
+        # a new instance, like in a new request: an instance keeps the permissions it has read
+        return CustomUser.objects.get(pk=self.user.pk).has_perm('blog.view_reports')
+
+    def test_permissions_are_cached(self):
+        self.assertTrue(self.has_perm())
+        with self.assertNumQueries(1):  # the user
+            self.assertTrue(self.has_perm())
+
+    def test_user_removed_from_the_group(self):
+        self.assertTrue(self.has_perm())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.remove(self.group)
+        self.assertFalse(self.has_perm())
+
+    def test_permission_removed_from_the_group(self):
+        self.assertTrue(self.has_perm())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.permissions.remove(self.permission)
+        self.assertFalse(self.has_perm())
+
+    def test_permission_renamed(self):
+        self.assertTrue(self.has_perm())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.permission.codename = 'see_reports'
+            self.permission.save()
+        self.assertFalse(self.has_perm())
+
+    def test_invalidated_once_committed(self):
+        self.assertTrue(self.has_perm())
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.groups.remove(self.group)
+        self.assertEqual(1, len(callbacks))
+        self.assertTrue(self.has_perm())
+
+        callbacks[0]()
+        self.assertFalse(self.has_perm())
+
+
+@override_settings(SESSION_CACHE_ALIAS='default', WRITE_BEHIND_INTERVAL=60)
+class CoalescedSessionTests(TestCase):
+    """ Sessions modified in the cache at once and written to the database in batches, see auth.sessions """
+
+    def setUp(self):
+        session_writes.flush()
+
+    def create_session(self) -> SessionStore:
+        session = SessionStore()
+        session['step'] = 1
+        session.create()
+        return session
+
+    def stored_step(self, session: SessionStore) -> int:
+        return Session.objects.get(session_key=session.session_key).get_decoded()['step']
+
+    def test_modifications_written_in_one_batch(self):
+        sessions = [self.create_session() for _ in range(2)]
+        for step in (2, 3):
+            for session in sessions:
+                session['step'] = step
+                session.save()
+
+        self.assertEqual([3, 3], [SessionStore(session.session_key).load()['step'] for session in sessions])
+        self.assertEqual([1, 1], [self.stored_step(session) for session in sessions])
+
+        with CaptureQueriesContext(connection) as queries:
+            session_writes.flush()
+        # one executemany for the two sessions
+        self.assertEqual(1, len([query for query in queries if 'UPDATE' in query['sql']]))
+        self.assertEqual([3, 3], [self.stored_step(session) for session in sessions])
+
+    def test_deleted_session_is_not_written_back(self):
+        session = self.create_session()
+        session['step'] = 2
+        session.save()
+        session.delete()
+
+        session_writes.flush()
+        self.assertFalse(Session.objects.filter(session_key=session.session_key).exists())
+
+
+def photo(width: int = 2000, height: int = 1000) -> bytes:
+    """ JPEG taken with the camera turned (EXIF orientation 6) and geotagged """
+    exif = Image.Exif()
+    exif[0x0112] = 6  # orientation
+    exif[0x8825] = {2: (48.0, 51.0, 24.0), 4: (2.0, 21.0, 8.0)}  # GPS latitude and longitude
+    output = io.BytesIO()
+    Image.new('RGB', (width, height), 'red').save(output, format='JPEG', exif=exif)
+    return output.getvalue()
+
+
+class ProfilePictureTests(TestCase):
+    """ Originals kept private by auth.storage, stripped variants published by auth.images """
+
+    def test_variants_are_resized_and_stripped(self):
+        with Image.open(io.BytesIO(photo())) as image:
+            self.assertEqual(6, image.getexif()[0x0112])
+            rendered = render_variants(image)
+
+        # the orientation is applied: the photo is portrait
+        self.assertEqual({'avatar': (64, 64), 'card': (256, 256), 'full': (512, 1024)},
+                         {name: variant['size'] for name, variant in rendered.items()})
+        for name, variant in rendered.items():
+            for image_format in FORMATS:
+                encoded = io.BytesIO(variant[image_format])
+                with self.subTest(variant=name, format=image_format), Image.open(encoded) as image:
+                    self.assertEqual(variant['size'], image.size)
+                    self.assertEqual(0, len(image.getexif()))
+                    self.assertNotIn('exif', image.info)
+
+    @override_settings(BACKGROUND_WORKERS=0)
+    def test_uploaded_picture_is_only_published_stripped(self):
+        private, public = tempfile.TemporaryDirectory(), tempfile.TemporaryDirectory()
+        self.addCleanup(private.cleanup)
+        self.addCleanup(public.cleanup)
+        user = CustomUser.objects.create(username='photographe', date_of_birth='2000-01-01')
+        self.client.force_login(user)
+
+        with override_settings(MEDIA_ROOT=public.name), mock.patch.object(private_storage, 'location', private.name):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('blog:edit-profile', kwargs={'username': user.username}), {
+                    'username': user.username,
+                    'profile_pic': SimpleUploadedFile('vacances.jpg', photo(), content_type='image/jpeg'),
+                })
+            self.assertRedirects(response, reverse('blog:profile', kwargs={'username': user.username}))
+
+            user.refresh_from_db()
+            self.assertTrue(private_storage.exists(user.profile_pic.name))
+            self.assertFalse(default_storage.exists(user.profile_pic.name))
+            self.assertEqual('', user.profile_pic.url)
+
+            full = user.profile_pic_variants['full']['jpeg']
+            with default_storage.open(full) as file, Image.open(file) as image:
+                self.assertEqual(0, len(image.getexif()))
+
+            response = self.client.get(reverse('blog:profile', kwargs={'username': user.username}))
+            self.assertContains(response, f'<a href="{default_storage.url(full)}">')
+            self.assertContains(response, '<source type="image/jpeg"')
+            self.assertNotContains(response, user.profile_pic.name)
@@ -1,4 +1,4 @@
-from django.contrib.auth import authenticate, login
+from django.contrib.auth import login
 from django.forms import ModelForm
 from django.views.generic import FormView
 
@@ -14,7 +14,6 @@ class RegisterView(FormView):
         """Security check complete. Log the user in."""
         user = form.save()
 
-        # log the user in
-        user = authenticate(username=user.username, password=form.cleaned_data['password1'])
+        # log the user in, the password has just been set: no need to hash it again with authenticate()
         login(self.request, user)
         return super().form_valid(form)
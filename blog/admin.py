@@ -1,44 +1,96 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db.models import Max
+from django.forms.models import BaseInlineFormSet
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+
+from .models import Post, Comment, PostReport, Like, DeletionJob
+from .search import filter_posts
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Paginator of the changelists of the big tables, where ``COUNT(*)`` reads every row matching the filters.
+    Without filter the count is the largest id (the rows are rarely deleted), with filters the counting stops
+    at ``MAX_COUNT`` rows: the last pages of a big result are not reachable, refine the filters instead.
+    """
+    MAX_COUNT = 10000
+
+    @cached_property
+    def count(self) -> int:
+        queryset = self.object_list
+        if not queryset.query.where:
+            return queryset.aggregate(last=Max('pk'))['last'] or 0
+        return queryset.order_by()[:self.MAX_COUNT].count()
+
+
+class CappedInlineFormSet(BaseInlineFormSet):
+    """ Only the first ``max_rows`` rows: a popular post has thousands of likes """
+    max_rows = 20
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            queryset = super().get_queryset()[:self.max_rows]
+            # the rows are displayed with their post (__str__), which is not loaded again for each of them
+            for row in queryset:
+                setattr(row, self.fk.name, self.instance)
+            self._queryset = queryset
+        return self._queryset
+
+
+class CappedInline(admin.TabularInline):
+    """ Read-only inline of the newest rows, all of them are in the changelist linked from the post """
+    formset = CappedInlineFormSet
+    ordering = ('-created_at',)
+    extra = 0
+    max_num = 0
+    # loaded with the rows, displayed by the read-only fields
+    related_fields = ()
 
-from .models import Post, Comment, PostReport, Like
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(*self.related_fields)
 
 
-class ReportersInline(admin.TabularInline):
+class ReportersInline(CappedInline):
     model = PostReport
     readonly_fields = ("user", 'created_at')
-    extra = 0
-    max_num = 0
+    related_fields = ('user',)
     verbose_name = "Signalement"
 
 
-class CommentsInline(admin.TabularInline):
+class CommentsInline(CappedInline):
     model = Comment
     readonly_fields = ("text", "author", 'created_at')
     fields = ("text", "author", 'created_at')
-    extra = 0
-    max_num = 0
+    related_fields = ('author',)
     verbose_name = "Commentaire"
 
 
-class LikesInline(admin.TabularInline):
+class LikesInline(CappedInline):
     model = Like
     readonly_fields = ("user", 'created_at')
-    extra = 0
-    max_num = 0
+    related_fields = ('user',)
     verbose_name = "Like"
 
 
 class PostAdmin(admin.ModelAdmin):
-    list_display = ('short_text', 'status', 'nb_of_reports', 'is_anonymous', 'author', "created_at")
+    list_display = ('short_text', 'status', 'reports_count', 'likes_count', 'comments_count', 'is_anonymous',
+                    'author', "created_at")
     list_filter = ('status', 'created_at', 'is_anonymous')
     search_fields = ('text', 'author__username', 'author__first_name')
     date_hierarchy = 'created_at'
     ordering = ('-created_at',)
     actions = ["make_published", "make_hidden"]
+    # no COUNT(*) of the whole table next to the count of the filtered posts, which is approximate
+    show_full_result_count = False
+    paginator = ApproximateCountPaginator
 
     readonly_fields = (
         'created_at', 'updated_at', 'author', 'is_anonymous',
-        'nb_of_reports', 'nb_of_likes', 'nb_of_comments',
+        'all_comments', 'all_likes', 'all_reports',
     )
 
     inlines = [CommentsInline, LikesInline, ReportersInline]
@@ -47,6 +99,10 @@ class PostAdmin(admin.ModelAdmin):
         (None, {
             'fields': ('text', 'status', 'is_anonymous', 'author')
         }),
+        ('Réactions', {
+            'description': f"Seuls les {CappedInlineFormSet.max_rows} plus récents sont affichés ci-dessous.",
+            'fields': ('all_comments', 'all_likes', 'all_reports')
+        }),
         ('Dates', {
             'classes': ('collapse',),
             'fields': ('created_at', 'updated_at')
@@ -61,10 +117,38 @@ class PostAdmin(admin.ModelAdmin):
          ),
     )
 
+    def get_queryset(self, request):
+        """ Load the author with the posts to avoid one query per row """
+        return super().get_queryset(request).select_related('author')
+
+    @staticmethod
+    def changelist_link(model, post: Post, count: int) -> str:
+        """ Link to the changelist of the rows of the post, counted by the counters of the post """
+        url = reverse(f'admin:blog_{model._meta.model_name}_changelist')
+        return format_html('<a href="{}?post__id__exact={}">{} (voir tout)</a>', url, post.id, count)
+
+    @admin.display(description="commentaires")
+    def all_comments(self, post: Post) -> str:
+        return self.changelist_link(Comment, post, post.comments_count)
+
+    @admin.display(description="likes")
+    def all_likes(self, post: Post) -> str:
+        return self.changelist_link(Like, post, post.likes_count)
+
+    @admin.display(description="signalements")
+    def all_reports(self, post: Post) -> str:
+        return self.changelist_link(PostReport, post, post.reports_count)
+
+    def get_search_results(self, request, queryset, search_term):
+        """ Use the full-text index instead of scanning the text of every post """
+        return filter_posts(queryset, search_term), False
+
     def save_model(self, request, obj, form, change):
-        """ Override the save_model method to set the author of the post as the current user for new posts """
+        """ Set the author of new posts as the current user and date the hiding of the post """
         if not obj.id:
             obj.author = request.user
+        if 'status' in form.changed_data and obj.status == Post.HIDDEN:
+            obj.hidden_at = timezone.now()
         super().save_model(request, obj, form, change)
 
     @admin.action(description='Rendre les posts selections visibles')
@@ -73,7 +157,7 @@ class PostAdmin(admin.ModelAdmin):
 
     @admin.action(description='Masquer les posts selections')
     def make_hidden(self, request, queryset):
-        queryset.update(status=Post.HIDDEN)
+        queryset.exclude(status=Post.HIDDEN).update(status=Post.HIDDEN, hidden_at=timezone.now())
 
     def has_view_permission(self, request, obj=None):
         return request.user.has_perm('blog.view_post')
@@ -88,8 +172,52 @@ class PostAdmin(admin.ModelAdmin):
         return request.user.has_perm('blog.view_post')
 
 
+class PostRelatedAdmin(admin.ModelAdmin):
+    """
+    Changelists of the rows pointing to a post (comments, likes, reports): the biggest tables. The foreign keys
+    are edited by id, a select would list every post and every user.
+    """
+    ordering = ('-id',)
+    show_full_result_count = False
+    paginator = ApproximateCountPaginator
+
+
+class CommentAdmin(PostRelatedAdmin):
+    list_display = ('short_text', 'author', 'post', 'is_anonymous', 'created_at')
+    list_select_related = ('author', 'post__author')
+    list_filter = ('is_anonymous',)
+    raw_id_fields = ('post', 'author')
+
+
+class LikeAdmin(PostRelatedAdmin):
+    list_display = ('user', 'post', 'created_at')
+    list_select_related = ('user', 'post__author')
+    raw_id_fields = ('post', 'user')
+
+
+class PostReportAdmin(PostRelatedAdmin):
+    list_display = ('user', 'post', 'created_at')
+    list_select_related = ('user', 'post__author')
+    raw_id_fields = ('post', 'user')
+
+
+class DeletionJobAdmin(admin.ModelAdmin):
+    """ Progress of the deletions run in the background, resumed by the resume_deletions command """
+    list_display = ('__str__', 'status', 'step', 'progress', 'created_at', 'updated_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    ordering = ('-id',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 admin.site.register(Post, PostAdmin)
 
-admin.site.register(Comment)
-admin.site.register(Like)
-admin.site.register(PostReport)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Like, LikeAdmin)
+admin.site.register(PostReport, PostReportAdmin)
+
+admin.site.register(DeletionJob, DeletionJobAdmin)
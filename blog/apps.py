@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import post_migrate
+
+
+def restore_search_index(using: str, **kwargs) -> None:
+    from .search import ensure_search_index
+    ensure_search_index(connections[using])
 
 
 class BlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blog'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+
+        post_migrate.connect(restore_search_index, sender=self)
@@ -0,0 +1,59 @@
+"""
+Async versions of the busiest views, used instead of the sync ones when ``ASYNC_VIEWS`` is set (see ``blog.urls``).
+
+Under ASGI, Django runs a sync view with ``sync_to_async(thread_sensitive=True)``: every sync view of the process
+waits for the same single thread. Django 4.0 has neither an async ORM nor async template rendering, so these
+views run the sync view, rendering included, in a thread of the default executor
+(``thread_sensitive=False``) and await it: the requests are handled concurrently, like the threads of a WSGI
+server, while the event loop stays free.
+
+A view runs entirely in one thread, so its queries and transactions use the connection of that thread. Like at
+the start and the end of a request, the connections of the thread are closed when they are too old.
+"""
+from functools import wraps
+from typing import Callable
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import HttpRequest, HttpResponse
+
+from .views import PostListView, PostFeedView, PostLikeView, PostCommentView, ProfilSearchView
+
+
+def database_sync_to_async(function: Callable) -> Callable:
+    """ ``sync_to_async`` in the thread pool for a function using the database """
+
+    def in_thread(*args, **kwargs):
+        close_old_connections()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(in_thread, thread_sensitive=False)
+
+
+def as_async_view(view: Callable) -> Callable:
+    """ Async view running the given sync view and rendering its response in the thread pool """
+
+    def render(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            # otherwise the handler would render the TemplateResponse in the single thread-sensitive thread
+            response.render()
+        return response
+
+    render_in_thread = database_sync_to_async(render)
+
+    @wraps(view)
+    async def async_view(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        return await render_in_thread(request, *args, **kwargs)
+
+    return async_view
+
+
+post_list = as_async_view(PostListView.as_view())
+post_feed = as_async_view(PostFeedView.as_view())
+post_like = as_async_view(PostLikeView.as_view())
+post_comment = as_async_view(PostCommentView.as_view())
+profile_search = as_async_view(ProfilSearchView.as_view())
@@ -0,0 +1,165 @@
+"""
+Query-count and latency benchmark of every page of the blog, auth and about apps.
+
+Each route is requested as an anonymous user, as a logged-in user (author of the sample post) and as a
+superuser, recording the number of SQL queries, the SQL time and the wall time. The number of queries
+must stay under the budgets committed in ``route_budgets.json``, whatever the size of the dataset:
+going over a budget usually means an N+1 query has been introduced.
+
+Used by the ``benchmark_routes`` command (big dataset, JSON report) and by the tests of the apps.
+"""
+import datetime
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from django.contrib.auth.tokens import default_token_generator
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from auth.coalescing import flush_all_buffers
+from auth.models import CustomUser
+from .models import Post, Comment, Like, PostReport
+from .seeding import generate_dataset
+
+BUDGETS_FILE = Path(__file__).resolve().parent / 'route_budgets.json'
+
+NAMESPACES = ('blog', 'auth', 'about')
+ROLES = ('anonymous', 'authenticated', 'superuser')
+
+# routes which are declared but not implemented yet (see the TODOs of blog.urls)
+SKIPPED_ROUTES = {
+    'blog:delete-comment', 'blog:like-comment', 'blog:report-comment', 'blog:hide-comment',
+}
+
+# write endpoints benchmarked with a POST, with their form data
+POST_ROUTES = {
+    'blog:comment-post': {'comment': 'Commentaire du benchmark'},
+    'blog:like-post': {'like': '1'},
+    'blog:report-post': {},
+}
+
+
+def seed_dataset(nb_users: int = 2000, nb_posts: int = 5000, seed: int = 0) -> None:
+    """ Fill the database with users, posts, likes, comments and reports using bulk inserts """
+    generate_dataset(nb_users, nb_posts, seed=seed)
+
+
+def dataset_size() -> Dict[str, int]:
+    return {model._meta.model_name: model.objects.count() for model in (CustomUser, Post, Comment, Like, PostReport)}
+
+
+def discover_routes(namespaces=NAMESPACES) -> List[dict]:
+    """ Every named route of the given url namespaces with the names of its url parameters """
+    routes = []
+    for resolver in get_resolver().url_patterns:
+        if getattr(resolver, 'namespace', None) not in namespaces:
+            continue
+
+        for pattern in resolver.url_patterns:
+            name = f'{resolver.namespace}:{pattern.name}'
+            if pattern.name and name not in SKIPPED_ROUTES:
+                routes.append({'name': name, 'parameters': list(pattern.pattern.converters)})
+    return routes
+
+
+class RouteBenchmark:
+    """ Request every route and compare the number of queries with the budgets """
+
+    def __init__(self, namespaces=NAMESPACES, repeat: int = 3, budgets: Optional[dict] = None) -> None:
+        self.namespaces = namespaces
+        self.repeat = repeat
+        self.budgets = budgets if budgets is not None else load_budgets()
+
+        # the logged-in user is the author of the sample post and the owner of the sample profile
+        self.post = Post.objects.public().filter(comments_count__gt=0).first() or Post.objects.public().first()
+        self.user = self.post.author
+        self.superuser = CustomUser.objects.filter(is_superuser=True).first() or CustomUser.objects.create_superuser(
+                'benchadmin', password='benchmark', date_of_birth=datetime.date.today())
+        self.comment = self.post.comments.first()
+
+    def url_parameters(self) -> dict:
+        return {
+            'post_id': self.post.id,
+            'comment_id': self.comment.id if self.comment else 0,
+            'username': self.user.username,
+            'uidb64': urlsafe_base64_encode(force_bytes(self.user.pk)),
+            'token': default_token_generator.make_token(self.user),
+        }
+
+    def client(self, role: str) -> Client:
+        client = Client(raise_request_exception=False)
+        if role == 'authenticated':
+            client.force_login(self.user)
+        elif role == 'superuser':
+            client.force_login(self.superuser)
+        # write the buffered last_login now rather than during one of the measured requests
+        flush_all_buffers()
+        return client
+
+    def measure(self, role: str, method: str, url: str, data: Optional[dict]) -> dict:
+        """ Request the url ``repeat`` times, keep the worst number of queries and the median times """
+        queries, sql_times, wall_times, status = [], [], [], None
+        for _ in range(self.repeat):
+            client = self.client(role)
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                response = getattr(client, method.lower())(url, data or {})
+                if response.streaming:  # read by the server after the view returned, with its queries
+                    b''.join(response.streaming_content)
+                wall_times.append(time.perf_counter() - start)
+            status = response.status_code
+            # savepoints depend on the enclosing transaction (tests run in one), they are not counted
+            captured = [query for query in context.captured_queries if 'SAVEPOINT' not in query['sql']]
+            queries.append(len(captured))
+            sql_times.append(sum(float(query['time']) for query in captured))
+
+        return {
+            'status': status,
+            'queries': max(queries),
+            'sql_ms': round(statistics.median(sql_times) * 1000, 2),
+            'wall_ms': round(statistics.median(wall_times) * 1000, 2),
+        }
+
+    def run(self) -> dict:
+        parameters = self.url_parameters()
+        results, failures = [], []
+
+        for route in discover_routes(self.namespaces):
+            url = reverse(route['name'], kwargs={name: parameters[name] for name in route['parameters']})
+            method = 'POST' if route['name'] in POST_ROUTES else 'GET'
+
+            for role in ROLES:
+                result = {'route': route['name'], 'url': url, 'method': method, 'role': role,
+                          **self.measure(role, method, url, POST_ROUTES.get(route['name']))}
+
+                budget = self.budgets.get(route['name'], {}).get(role)
+                result['budget'] = budget
+                if budget is None or result['queries'] > budget:
+                    failures.append(result)
+                results.append(result)
+
+        return {
+            'generated_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'dataset': dataset_size(),
+            'routes': results,
+            'failures': failures,
+        }
+
+
+def load_budgets(path: Path = BUDGETS_FILE) -> dict:
+    """ ``{route name: {role: max number of queries}}`` """
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def format_failure(result: dict) -> str:
+    budget = 'no budget' if result['budget'] is None else f"budget {result['budget']}"
+    return (f"{result['method']} {result['url']} ({result['route']}) as {result['role']}: "
+            f"{result['queries']} queries, {budget}")
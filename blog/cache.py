@@ -0,0 +1,27 @@
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+from .models import Post
+
+# fragments of blog/partials/post.html which do not depend on the viewer (see the {% cache %} tags),
+# their key includes updated_at so an edited post never serves its old text, whatever the process which cached it,
+# and the username of the author, who can change it (profile edit form) without touching their posts.
+# The counters change too often and from too many places (admin, deletions...) to be cached: the like button and the
+# comments area are rendered outside the fragments.
+POST_BODY_FRAGMENT = 'post-body'
+
+
+def post_card_keys(post: Post) -> list:
+    """ Cache keys of every cached fragment of the post card """
+    version = post.updated_at.isoformat()
+    return [
+        make_template_fragment_key(POST_BODY_FRAGMENT, [post.id, version, post.author.username]),
+    ]
+
+
+def invalidate_post_card(post: Post) -> None:
+    """
+    Drop the cached fragments of the post card, to be called when a post is edited, hidden or deleted.
+    The counters are rendered outside the cache, liking or commenting a post does not need to invalidate anything.
+    """
+    cache.delete_many(post_card_keys(post))
@@ -0,0 +1,38 @@
+import sqlite3
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.checks import Error, Tags, Warning, register
+from django.db import connections
+
+from monodcrush.staticfiles import VENDORED_SCRIPTS
+
+# UPDATE ... RETURNING (blog.models.add_to_post_counter), and FTS5 with the trigram tokenizer (3.34, blog.search)
+MIN_SQLITE_VERSION = (3, 35)
+
+
+@register()
+def check_sqlite_version(app_configs, **kwargs) -> list:
+    uses_sqlite = any(connections[alias].vendor == 'sqlite' for alias in connections)
+    if not uses_sqlite or sqlite3.sqlite_version_info >= MIN_SQLITE_VERSION:
+        return []
+
+    return [Error(
+            f"SQLite {sqlite3.sqlite_version} is too old, {'.'.join(map(str, MIN_SQLITE_VERSION))} or newer is needed",
+            hint="Use a Python linked against a newer SQLite library",
+            id='blog.E001',
+    )]
+
+
+@register(Tags.staticfiles)
+def check_vendored_scripts(app_configs, **kwargs) -> list:
+    """ Also run by collectstatic: a production build can't be published without the local copies """
+    missing = [name for name, (path, *_) in VENDORED_SCRIPTS.items() if not finders.find(path)]
+    if not missing:
+        return []
+
+    message = f"Vendored scripts missing from the static files: {', '.join(missing)}"
+    hint = "Run python manage.py vendor_static"
+    if settings.PROFILE != 'production':
+        return [Warning(message, hint=hint + ", they are loaded from their CDN meanwhile", id='blog.W002')]
+    return [Error(message, hint=hint, id='blog.E002')]
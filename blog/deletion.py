@@ -0,0 +1,186 @@
+"""
+Deletion of the users and the posts without the cascade of the ORM, which loads every dependent row (posts, likes,
+comments, reports, follows, timeline entries) and deletes them in one transaction, locking the database for as long.
+
+The account is deactivated (the post marked as deleted) at once, then a ``DeletionJob`` purges the dependent rows
+in the background by batches of ``DELETION_BATCH_SIZE``, each in a short transaction of its own. A batch deletes
+its rows without loading them nor sending signals: it takes them out of the counters they were in with one UPDATE
+per distinct delta instead of one per row, and records the progress of the job in the same transaction. Every step
+only selects what remains, a job interrupted by a crash or a restart goes on where it stopped when it is run again
+(``resume_deletions`` command). The user or the post itself is deleted last with the ORM, with nothing left to
+cascade.
+"""
+import logging
+import traceback
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, QuerySet
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from auth.models import CustomUser
+from monodcrush.background import submit_on_commit
+from .models import Comment, DeletionJob, Follow, Like, Post, PostReport, TimelineEntry, delete_rows
+
+log = logging.getLogger(__name__)
+
+# foreign key of the purged rows, model and field of the counter they are taken out of
+CounterRef = Tuple[str, type, str]
+
+# rows pointing to the posts, purged before them, by step
+POST_DEPENDENTS = (
+    ('timeline_entries', TimelineEntry),
+    ('likes', Like),
+    ('comments', Comment),
+    ('reports', PostReport),
+)
+
+
+def delete_user(user: CustomUser) -> DeletionJob:
+    """ Deactivate the account now (the user can't log in anymore) and purge it in the background """
+    with transaction.atomic():
+        CustomUser.objects.filter(pk=user.pk).update(is_active=False)
+        user.is_active = False
+        return start_job(DeletionJob.USER, user.pk)
+
+
+def delete_post(post: Post) -> DeletionJob:
+    """ Take the post out of every feed now and purge it in the background """
+    with transaction.atomic():
+        Post.objects.filter(pk=post.pk).update(status=Post.DELETED)
+        post.status = Post.DELETED
+        return start_job(DeletionJob.POST, post.pk)
+
+
+def start_job(kind: str, target_id: int) -> DeletionJob:
+    """ Run the unfinished job of the target once committed, a new one if it has none """
+    job = DeletionJob.objects.filter(kind=kind, target_id=target_id, status__in=DeletionJob.UNFINISHED).first()
+    if job is None:
+        job = DeletionJob.objects.create(kind=kind, target_id=target_id)
+    submit_on_commit(run_job, job.pk)
+    return job
+
+
+def run_job(job_id: int) -> None:
+    """ Run the job from where it has stopped, mark it as failed with its traceback if a batch fails """
+    job = DeletionJob.objects.filter(pk=job_id, status__in=DeletionJob.UNFINISHED).first()
+    if job is None:  # already done
+        return
+
+    job.status, job.error = DeletionJob.RUNNING, ''
+    job.save(update_fields=['status', 'error', 'updated_at'])
+    try:
+        if job.kind == DeletionJob.USER:
+            purge_user(job)
+        else:
+            purge_posts(job, [job.target_id])
+    except Exception:
+        job.status, job.error = DeletionJob.FAILED, traceback.format_exc()
+        job.save(update_fields=['status', 'error', 'updated_at'])
+        raise
+
+    job.status, job.step, job.finished_at = DeletionJob.DONE, '', timezone.now()
+    job.save(update_fields=['status', 'step', 'finished_at', 'updated_at'])
+    log.info(f"Deletion of {job} done: {job.progress}")
+
+
+def purge_user(job: DeletionJob) -> None:
+    user_id = job.target_id
+    run_batches(job, 'hidden_posts', lambda: hide_posts(Post.objects.filter(author=user_id)))
+
+    # the reactions of the user on the posts of the others, and their counters
+    purge(job, 'likes', Like.objects.filter(user=user_id), ('post', Post, 'likes_count'))
+    purge(job, 'comments', Comment.objects.filter(author=user_id), ('post', Post, 'comments_count'))
+    purge(job, 'reports', PostReport.objects.filter(user=user_id), ('post', Post, 'reports_count'))
+
+    purge(job, 'following', Follow.objects.filter(follower=user_id), ('followed', CustomUser, 'followers_count'))
+    purge(job, 'followers', Follow.objects.filter(followed=user_id))
+    purge(job, 'timeline', TimelineEntry.objects.filter(user=user_id))
+    purge(job, 'timeline_entries', TimelineEntry.objects.filter(author=user_id))
+
+    for post_ids in batches_of_ids(Post.objects.filter(author=user_id)):
+        purge_posts(job, post_ids)
+
+    # nothing left to cascade but the small relations (profile picture, map nodes...)
+    with transaction.atomic():
+        user = CustomUser.objects.filter(pk=user_id).first()
+        if user is not None:
+            user.delete()
+            add_progress(job, 'user', 1)
+
+
+def purge_posts(job: DeletionJob, post_ids: List[int]) -> None:
+    """ Purge the rows pointing to the posts, then the posts (their counters don't matter anymore) """
+    for step, model in POST_DEPENDENTS:
+        purge(job, step, model.objects.filter(post__in=post_ids))
+
+    with transaction.atomic():
+        deleted = Post.objects.filter(pk__in=post_ids).delete()[1].get(Post._meta.label, 0)
+        if deleted:
+            add_progress(job, 'posts', deleted)
+
+
+def batches_of_ids(queryset: QuerySet) -> Iterator[List[int]]:
+    """ Ids of the rows of the queryset which are still there, by batches """
+    while True:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:settings.DELETION_BATCH_SIZE])
+        if not ids:
+            return
+        yield ids
+
+
+def run_batches(job: DeletionJob, step: str, batch: Callable[[], int]) -> None:
+    """ Run ``batch`` in short transactions, until it has nothing left to do, with the progress of the job """
+    while True:
+        with transaction.atomic():
+            count = batch()
+            if count:
+                add_progress(job, step, count)
+        if not count:
+            return
+
+
+def add_progress(job: DeletionJob, step: str, count: int) -> None:
+    job.step = step
+    job.progress[step] = job.progress.get(step, 0) + count
+    job.save(update_fields=['step', 'progress', 'updated_at'])
+
+
+def hide_posts(posts: QuerySet) -> int:
+    ids = list(posts.exclude(status=Post.DELETED).order_by('pk')
+               .values_list('pk', flat=True)[:settings.DELETION_BATCH_SIZE])
+    return Post.objects.filter(pk__in=ids).update(status=Post.DELETED)
+
+
+def purge(job: DeletionJob, step: str, rows: QuerySet, counter: Optional[CounterRef] = None) -> None:
+    run_batches(job, step, lambda: delete_batch(rows, counter))
+
+
+def delete_batch(rows: QuerySet, counter: Optional[CounterRef] = None) -> int:
+    """
+    Delete the first rows of the queryset in two statements (ids, then ``DELETE ... WHERE id IN``) and take them
+    out of ``counter``. Return the number of deleted rows.
+    """
+    fields = ['pk', f'{counter[0]}_id'] if counter else ['pk']
+    batch = list(rows.order_by('pk').values_list(*fields)[:settings.DELETION_BATCH_SIZE])
+    if not batch:
+        return 0
+
+    if counter:
+        _, model, field = counter
+        decrement(model, field, Counter(target_id for _, target_id in batch))
+
+    return delete_rows(rows.model, id=[row[0] for row in batch])
+
+
+def decrement(model: type, field: str, counts: Dict[int, int]) -> None:
+    """ Subtract ``counts[pk]`` from the counter of each row (without going below zero), one UPDATE per delta """
+    by_delta: Dict[int, List[int]] = defaultdict(list)
+    for pk, count in counts.items():
+        by_delta[count].append(pk)
+
+    for delta, pks in by_delta.items():
+        model.objects.filter(pk__in=pks).update(**{field: Greatest(F(field) - delta, 0)})
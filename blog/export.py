@@ -0,0 +1,81 @@
+"""
+Export of the personal data of a user, for the data-access requests: a zip of NDJSON files (one JSON object per
+line) with their profile, posts, comments, likes, reports and follows.
+
+The archive is streamed as it is written: the rows are read by chunks with ``QuerySet.iterator`` and the zip is
+written to an unseekable buffer emptied every ``FLUSH_SIZE`` bytes (``zipfile`` then writes the sizes of each
+file after its data), so the memory stays flat whatever the size of the account and the first bytes go out
+immediately. Used by ``ProfileExportView`` and the ``export_user_data`` command.
+"""
+import json
+import zipfile
+from typing import Iterator, List, Tuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, QuerySet
+from django.utils import timezone
+
+from auth.models import CustomUser
+from .models import Comment, Follow, Like, Post, PostReport
+
+CHUNK_SIZE = 2000
+FLUSH_SIZE = 64 * 1024
+
+PROFILE_FIELDS = ('id', 'username', 'first_name', 'email', 'date_of_birth', 'bio', 'study', 'instagram', 'twitter',
+                  'github', 'website', 'profile_pic', 'date_joined', 'last_login', 'is_active', 'followers_count')
+
+
+class StreamBuffer:
+    """ Unseekable file keeping what is written until it is taken """
+
+    def __init__(self) -> None:
+        self.chunks: List[bytes] = []
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks, self.size = [], 0
+        return data
+
+
+def export_files(user: CustomUser) -> List[Tuple[str, QuerySet]]:
+    """ ``(name, rows)`` of the files of the archive, the rows are read when the file is written """
+    return [
+        ('profile.ndjson', CustomUser.objects.filter(pk=user.pk).values(*PROFILE_FIELDS)),
+        ('posts.ndjson', Post.objects.filter(author=user).order_by('id').values(
+                'id', 'text', 'is_anonymous', 'status', 'created_at', 'updated_at', 'likes_count', 'comments_count')),
+        ('comments.ndjson', Comment.objects.filter(author=user).order_by('id').values(
+                'id', 'post_id', 'text', 'is_anonymous', 'created_at')),
+        ('likes.ndjson', Like.objects.filter(user=user).order_by('id').values('post_id', 'created_at')),
+        ('reports.ndjson', PostReport.objects.filter(user=user).order_by('id').values('post_id', 'created_at')),
+        ('following.ndjson', Follow.objects.filter(follower=user).order_by('id').values(
+                'created_at', username=F('followed__username'))),
+    ]
+
+
+def export_archive(user: CustomUser) -> Iterator[bytes]:
+    """ Bytes of the zip archive, by chunks of about ``FLUSH_SIZE`` """
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, rows in export_files(user):
+            # the size is unknown when the header is written: without ZIP64 a file can't grow past 2 GiB
+            with archive.open(name, 'w', force_zip64=True) as file:
+                for row in rows.iterator(chunk_size=CHUNK_SIZE):
+                    file.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False).encode() + b'\n')
+                    if buffer.size >= FLUSH_SIZE:
+                        yield buffer.take()
+            if buffer.size:
+                yield buffer.take()
+    yield buffer.take()  # central directory
+
+
+def export_filename(user: CustomUser) -> str:
+    return f"monodcrush-{user.username}-{timezone.now():%Y%m%d}.zip"
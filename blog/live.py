@@ -0,0 +1,206 @@
+"""
+Live updates of the open feeds with Server-Sent Events: like counts, comment counts, new comments and new posts.
+
+The views publish what they change to the in-process ``broker`` once their transaction is committed. The updates
+are merged by post (only the last like count of a post is sent) and flushed every ``LIVE_UPDATES_DEBOUNCE``
+seconds as one batch: a single SSE message of out-of-band htmx fragments (``hx-swap-oob``), so that the htmx SSE
+extension only swaps the fragments of the posts present in the page, which never has to be reloaded.
+
+The SSE endpoint (``stream``) is served by the ASGI application of ``monodcrush.asgi`` beside Django: an open
+connection only costs a queue and an idle coroutine. The broker lives in the server process, with several
+processes a client only receives the updates published by the process it is connected to.
+"""
+import asyncio
+import logging
+import threading
+from importlib import import_module
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.db import close_old_connections, transaction
+from django.http import parse_cookie
+from django.template.loader import render_to_string
+
+from .models import Comment, Post
+
+log = logging.getLogger(__name__)
+
+EVENT = 'update'
+# batches waiting to be sent to a connection, the next ones are dropped if it is too slow to read them
+QUEUE_SIZE = 32
+
+
+class Subscriber:
+    """ An open SSE connection, its queue is filled from the thread flushing the broker """
+
+    def __init__(self, user_id: Optional[int]) -> None:
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def put(self, message: str) -> None:
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            log.warning(f"Live update dropped for a slow connection (user {self.user_id})")
+
+
+class Broker:
+    """
+    In-process pub/sub. ``publish`` is called from the threads of the views, the first pending update starts a
+    timer which renders the batch once and hands it to the event loop of each connection.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.subscribers: Set[Subscriber] = set()
+        # key -> (template, context, user not to send it to): a new update replaces the pending one of the same key
+        self.pending: Dict[Hashable, Tuple[str, dict, Optional[int]]] = {}
+        self.timer: Optional[threading.Timer] = None
+
+    def subscribe(self, user_id: Optional[int]) -> Subscriber:
+        subscriber = Subscriber(user_id)
+        with self.lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def publish(self, key: Hashable, template_name: str, context: dict, excluded_user_id: Optional[int] = None) -> None:
+        with self.lock:
+            if not self.subscribers:
+                return
+            self.pending[key] = (template_name, context, excluded_user_id)
+            if self.timer is None:
+                self.timer = threading.Timer(settings.LIVE_UPDATES_DEBOUNCE, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self) -> None:
+        with self.lock:
+            pending, self.pending, self.timer = self.pending, {}, None
+            subscribers = list(self.subscribers)
+
+        fragments: List[Tuple[str, Optional[int]]] = []
+        for template_name, context, excluded_user_id in pending.values():
+            try:
+                fragments.append((render_to_string(template_name, context), excluded_user_id))
+            except Exception:
+                log.exception(f"Failed to render the live update {template_name}")
+
+        for subscriber in subscribers:
+            message = ''.join(html for html, excluded_user_id in fragments
+                              if excluded_user_id is None or excluded_user_id != subscriber.user_id)
+            if message:
+                try:
+                    subscriber.loop.call_soon_threadsafe(subscriber.put, message)
+                except RuntimeError:  # the event loop is closed, the server is stopping
+                    pass
+
+
+broker = Broker()
+
+
+def live_updates_url() -> Optional[str]:
+    return settings.LIVE_UPDATES_PATH if settings.LIVE_UPDATES else None
+
+
+def publish_on_commit(key: Hashable, template_name: str, context: dict,
+                      excluded_user_id: Optional[int] = None) -> None:
+    if settings.LIVE_UPDATES:
+        transaction.on_commit(lambda: broker.publish(key, template_name, context, excluded_user_id))
+
+
+# the contexts are plain values: they are rendered later in the thread of the broker
+
+
+def likes_changed(post: Post) -> None:
+    publish_on_commit(('likes', post.id), 'blog/components/post-like-count.html',
+                      {'post': {'id': post.id, 'nb_of_likes': post.likes_count}, 'oob': True})
+
+
+def comment_added(post: Post, comment: Comment) -> None:
+    """ The new counter, and the comment for the open threads except the ones of its author who already has it """
+    publish_on_commit(('comments', post.id), 'blog/components/post-comment-count.html',
+                      {'post': {'id': post.id, 'nb_of_comments': post.comments_count}, 'oob': True})
+    publish_on_commit(('comment', comment.id), 'blog/partials/live-comment.html',
+                      {'post': {'id': post.id}, 'comment': comment}, excluded_user_id=comment.author_id)
+
+
+def post_published(post: Post) -> None:
+    """ Only a notice, the post cards depend on the viewer: they are loaded by the button it shows """
+    publish_on_commit('posts', 'blog/partials/live-new-posts.html', {})
+
+
+# SSE endpoint
+
+
+def session_user_id(cookies: Dict[str, str]) -> Optional[int]:
+    """ Id of the logged-in user of the session cookie, only used to not send them back their own comments """
+    session_key = cookies.get(settings.SESSION_COOKIE_NAME)
+    if not session_key:
+        return None
+
+    close_old_connections()
+    try:
+        user_id = import_module(settings.SESSION_ENGINE).SessionStore(session_key).get(SESSION_KEY)
+    finally:
+        close_old_connections()
+    try:
+        return int(user_id) if user_id is not None else None
+    except ValueError:
+        return None
+
+
+def format_event(data: str) -> bytes:
+    lines = ''.join(f'data: {line}\n' for line in data.splitlines())
+    return f'event: {EVENT}\n{lines}\n'.encode()
+
+
+async def wait_for_disconnect(receive) -> None:
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def stream(scope: dict, receive, send) -> None:
+    """ ASGI application of the SSE endpoint: a batch of fragments per message, a comment line while idle """
+    if scope['method'] != 'GET':
+        await send({'type': 'http.response.start', 'status': 405, 'headers': [(b'allow', b'GET')]})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+
+    headers = dict(scope['headers'])
+    cookies = parse_cookie(headers.get(b'cookie', b'').decode('latin-1'))
+    user_id = await sync_to_async(session_user_id, thread_sensitive=False)(cookies)
+
+    subscriber = broker.subscribe(user_id)
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),  # not buffered by nginx
+        ]})
+        await send({'type': 'http.response.body', 'body': b': connected\n\n', 'more_body': True})
+
+        while True:
+            message = asyncio.ensure_future(subscriber.queue.get())
+            done, _ = await asyncio.wait({message, disconnected}, timeout=settings.LIVE_UPDATES_KEEPALIVE,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                message.cancel()
+                return
+
+            if message in done:
+                body = format_event(message.result())
+            else:
+                message.cancel()
+                body = b': keep-alive\n\n'
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        broker.unsubscribe(subscriber)
+        disconnected.cancel()
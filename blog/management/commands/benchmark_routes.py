@@ -0,0 +1,58 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from blog.benchmark import RouteBenchmark, seed_dataset, format_failure, BUDGETS_FILE
+
+
+class Command(BaseCommand):
+    help = ("Seed a throwaway test database, request every route of the blog, auth and about apps and record "
+            "their number of queries, SQL time and wall time. Fail if a route goes over its query budget.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=3, help="Requests per route and role (default: 3)")
+        parser.add_argument('--output', default='bench_report.json', help="Path of the JSON report")
+        parser.add_argument('--update-budgets', action='store_true',
+                            help=f"Write the measured number of queries as the new budgets in {BUDGETS_FILE.name}")
+
+    def handle(self, *args, users: int, posts: int, repeat: int, output: str, update_budgets: bool, **options):
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        for alias in connections:
+            if connections[alias].settings_dict['TEST'].get('MIRROR') == DEFAULT_DB_ALIAS:
+                connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+        try:
+            self.stdout.write(f"Seeding {users} users and {posts} posts...")
+            seed_dataset(nb_users=users, nb_posts=posts)
+            report = RouteBenchmark(repeat=repeat).run()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        with open(output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+        for result in report['routes']:
+            self.stdout.write(f"{result['method']:4} {result['url']:45} {result['role']:13} {result['status']} "
+                              f"{result['queries']:3} queries {result['sql_ms']:8} ms SQL {result['wall_ms']:8} ms")
+        self.stdout.write(f"Report written to {output}")
+
+        if update_budgets:
+            budgets = {}
+            for result in report['routes']:
+                budgets.setdefault(result['route'], {})[result['role']] = result['queries']
+            with open(BUDGETS_FILE, 'w', encoding='utf-8') as file:
+                json.dump(budgets, file, indent=2)
+                file.write('\n')
+            self.stdout.write(self.style.SUCCESS(f"Budgets written to {BUDGETS_FILE}"))
+
+        elif report['failures']:
+            raise CommandError("Query budget exceeded:\n" + '\n'.join(map(format_failure, report['failures'])))
+
+        else:
+            self.stdout.write(self.style.SUCCESS("Every route is within its query budget"))
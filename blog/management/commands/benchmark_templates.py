@@ -0,0 +1,86 @@
+import importlib.util
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import SessionBase
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.template.backends.base import BaseEngine
+from django.test import RequestFactory
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils.module_loading import import_string
+
+from auth.models import CustomUser
+from blog.models import Post
+from blog.seeding import generate_dataset
+from blog.views import PostListView
+
+TEMPLATE_NAME = 'blog/partials/post-list.html'
+
+
+def build_engine(backend: dict, name: str) -> BaseEngine:
+    """ Template engine of a ``TEMPLATES`` entry """
+    params = {key: value for key, value in backend.items() if key != 'BACKEND'}
+    return import_string(backend['BACKEND'])({**params, 'NAME': name})
+
+
+def fragment_cache():
+    try:
+        return caches['template_fragments']
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+class Command(BaseCommand):
+    help = ("Render a page of the feed (blog/partials/post-list.html) with the Django templates and with their "
+            "Jinja2 versions (see blog.jinja2env), with the cached fragments cleared before each rendering (cold) "
+            "and kept (warm). The posts are fetched once: only the rendering is measured.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=PostListView.paginate_by,
+                            help=f"Posts per page (default: {PostListView.paginate_by})")
+        parser.add_argument('--repeat', type=int, default=200, help="Renderings per measure (default: 200)")
+
+    def handle(self, *args, posts: int, repeat: int, **options):
+        if posts < 1 or repeat < 1:
+            raise CommandError("--posts and --repeat must be positive")
+        if importlib.util.find_spec('jinja2') is None:
+            raise CommandError("The jinja2 package is not installed")
+
+        # both engines, whatever JINJA2_TEMPLATES
+        django_backend = next(backend for backend in settings.TEMPLATES
+                              if backend['BACKEND'] == 'django.template.backends.django.DjangoTemplates')
+        engines = {
+            'django': build_engine(django_backend, 'django'),
+            'jinja2': build_engine(settings.JINJA2_BACKEND, 'jinja2'),
+        }
+
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            generate_dataset(max(50, posts // 10), posts * 2)
+            user = CustomUser.objects.order_by('pk').first()
+            request = RequestFactory().get('/')
+            request.user, request.session = user, SessionBase()
+            page = list(Post.objects.public().for_viewer(user)[:posts])
+
+            for name, engine in engines.items():
+                template = engine.get_template(TEMPLATE_NAME)
+                for state in ('cold', 'warm'):
+                    timings = []
+                    for _ in range(repeat):
+                        if state == 'cold':
+                            fragment_cache().clear()
+                        start = time.perf_counter()
+                        html = template.render({'posts': page}, request)
+                        timings.append(time.perf_counter() - start)
+                    self.stdout.write(f"{name:7} {state}: median {statistics.median(timings) * 1000:.2f} ms, "
+                                      f"min {min(timings) * 1000:.2f} ms per page of {len(page)} posts "
+                                      f"({len(html) / 1024:.0f} KiB)")
+        finally:
+            fragment_cache().clear()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
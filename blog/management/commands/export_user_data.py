@@ -0,0 +1,30 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from auth.models import CustomUser
+from blog.export import export_archive, export_filename
+
+
+class Command(BaseCommand):
+    help = ("Export the personal data of a user (profile, posts, comments, likes, reports and follows) as a zip of "
+            "NDJSON files, for the data-access requests.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--output', help="Path of the zip file (default: monodcrush-<username>-<date>.zip)")
+
+    def handle(self, *args, username: str, output: str, **options):
+        try:
+            user = CustomUser.objects.get(username=username)
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"There is no user {username!r}")
+
+        path = Path(output or export_filename(user))
+        size = 0
+        with path.open('wb') as file:
+            for chunk in export_archive(user):
+                file.write(chunk)
+                size += len(chunk)
+
+        self.stdout.write(self.style.SUCCESS(f"Data of {user} exported to {path} ({size / 1024:.0f} KiB)"))
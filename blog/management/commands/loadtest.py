@@ -0,0 +1,229 @@
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import List
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment, \
+    teardown_test_environment
+from django.urls import reverse
+
+from auth.coalescing import flush_all_buffers
+from auth.models import CustomUser
+from blog.models import Post
+from blog.seeding import generate_dataset
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+PROFILES = ('development', 'production')
+
+
+def point_mirrors_at(path: Path) -> None:
+    """ Open the read-only aliases mirroring the default database (TEST MIRROR) on the throwaway database """
+    for alias in connections:
+        if connections.settings[alias]['TEST'].get('MIRROR') == DEFAULT_DB_ALIAS:
+            connections[alias].close()
+            connections.settings[alias]['NAME'] = f'file:{path}?mode=ro'
+
+
+class Command(BaseCommand):
+    help = ("Seed a throwaway SQLite database and measure the throughput of concurrent logged-in users loading "
+            "the feed while other users like posts, with each session engine. With --compare-profiles, run once "
+            "per settings profile (MONODCRUSH_PROFILE) to compare the database configurations. With --asgi, "
+            "the requests go through the ASGI handler, from concurrent asyncio tasks instead of threads, and "
+            "--compare-async runs with the sync and with the async views (MONODCRUSH_ASYNC_VIEWS).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--threads', type=int, default=8, help="Concurrent users reading the feed (default: 8)")
+        parser.add_argument('--like-writers', type=int, default=0,
+                            help="Concurrent users liking and unliking posts meanwhile (default: 0)")
+        parser.add_argument('--duration', type=float, default=10, help="Seconds per session engine (default: 10)")
+        parser.add_argument('--login-every', type=int, default=20,
+                            help="Each user logs in again every N requests (default: 20)")
+        parser.add_argument('--session-writes', type=float, default=0.2,
+                            help="Proportion of the requests which modify the session (default: 0.2)")
+        parser.add_argument('--session-engines', nargs='+',
+                            default=['django.contrib.sessions.backends.db', settings.SESSION_ENGINE])
+        parser.add_argument('--compare-profiles', action='store_true',
+                            help=f"Run the load test in a subprocess for each profile: {', '.join(PROFILES)}")
+        parser.add_argument('--asgi', action='store_true',
+                            help="Send the requests through the ASGI handler (AsyncClient), --threads being the "
+                                 "number of concurrent tasks")
+        parser.add_argument('--compare-async', action='store_true',
+                            help="Run the ASGI load test in a subprocess with the sync views, then the async views")
+
+    def handle(self, *args, users: int, posts: int, threads: int, like_writers: int, duration: float,
+               session_engines: List[str], compare_profiles: bool, asgi: bool, compare_async: bool, **options):
+        if threads < 1 or like_writers < 0 or duration <= 0 or options['login_every'] < 1:
+            raise CommandError("--threads, --duration and --login-every must be positive")
+
+        if compare_profiles:
+            return self.compare('MONODCRUSH_PROFILE', PROFILES, '--compare-profiles')
+        if compare_async:
+            return self.compare('MONODCRUSH_ASYNC_VIEWS', ('0', '1'), '--compare-async', '--asgi')
+
+        self.stdout.write(f"Profile {settings.PROFILE}, " + (
+                f"ASGI with the {'async' if settings.ASYNC_VIEWS else 'sync'} views" if asgi else "WSGI"))
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        with tempfile.TemporaryDirectory() as directory:
+            # a file, not the in-memory test database: the threads need their own connections to the same database
+            path = Path(directory) / 'loadtest.sqlite3'
+            connection.settings_dict['TEST']['NAME'] = str(path)
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            point_mirrors_at(path)
+            try:
+                self.stdout.write(f"Seeding {users} users and {posts} posts...")
+                generate_dataset(users, posts)
+                user_ids = list(CustomUser.objects.values_list('id', flat=True))
+                post_ids = list(Post.objects.public().values_list('id', flat=True))
+                connection.close()
+
+                for engine in session_engines:
+                    with override_settings(SESSION_ENGINE=engine):
+                        if asgi:
+                            report = asyncio.run(self.run_asgi(user_ids, post_ids, threads, like_writers, duration,
+                                                               **options))
+                        else:
+                            report = self.run(user_ids, post_ids, threads, like_writers, duration, **options)
+                        flush_all_buffers()
+                    self.write_report(engine, report, duration)
+            finally:
+                connections.close_all()
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                teardown_test_environment()
+
+    def compare(self, variable: str, values: tuple, option: str, *extra_arguments: str) -> None:
+        """ Run the command again without ``option`` in a subprocess for each value of the environment variable """
+        arguments = [argument for argument in sys.argv[1:] if argument != option]
+        for value in values:
+            self.stdout.flush()
+            subprocess.run([sys.executable, sys.argv[0], *arguments, *extra_arguments], check=True,
+                           env={**os.environ, variable: value})
+
+    def run(self, user_ids: List[int], post_ids: List[int], threads: int, like_writers: int, duration: float,
+            login_every: int, session_writes: float, **options) -> dict:
+        feed_url = reverse('blog:index')
+        deadline = time.perf_counter() + duration
+        results = {'read': [], 'like': []}
+        writes, errors = {'read': 0, 'like': 0}, {'read': 0, 'like': 0}
+        lock = threading.Lock()
+
+        def browse(index: int, kind: str) -> None:
+            rng = random.Random(index)
+            user = CustomUser.objects.get(pk=rng.choice(user_ids))
+            client = Client(raise_request_exception=False)
+            latencies, thread_errors = [], 0
+
+            with CaptureQueriesContext(connection) as queries:
+                requests = 0
+                while time.perf_counter() < deadline:
+                    start = time.perf_counter()
+                    try:
+                        if requests % login_every == 0:
+                            client.force_login(user)
+                        if kind == 'like':
+                            url = reverse('blog:like-post', kwargs={'post_id': rng.choice(post_ids)})
+                            status = client.post(url, {'like': rng.choice('01')}).status_code
+                        else:
+                            if rng.random() < session_writes:
+                                self.touch_session(client)
+                            status = client.get(feed_url).status_code
+                    except Exception:  # database is locked...
+                        status = 500
+                    latencies.append(time.perf_counter() - start)
+                    thread_errors += status != 200
+                    requests += 1
+
+                thread_writes = sum(query['sql'].lstrip().upper().startswith(WRITE_STATEMENTS)
+                                    for query in queries.captured_queries)
+            connections.close_all()
+
+            with lock:
+                results[kind].extend(latencies)
+                writes[kind] += thread_writes
+                errors[kind] += thread_errors
+
+        workers = [threading.Thread(target=browse, args=(index, 'read')) for index in range(threads)]
+        workers += [threading.Thread(target=browse, args=(threads + index, 'like')) for index in range(like_writers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        return {kind: {'latencies': latencies, 'writes': writes[kind], 'errors': errors[kind]}
+                for kind, latencies in results.items() if latencies}
+
+    async def run_asgi(self, user_ids: List[int], post_ids: List[int], tasks: int, like_writers: int,
+                       duration: float, login_every: int, session_writes: float, **options) -> dict:
+        """ Same load as ``run()`` from asyncio tasks, the SQL writes are not counted """
+        feed_url = reverse('blog:index')
+        deadline = time.perf_counter() + duration
+        results = {'read': [], 'like': []}
+        errors = {'read': 0, 'like': 0}
+
+        async def browse(index: int, kind: str) -> None:
+            rng = random.Random(index)
+            user = await sync_to_async(CustomUser.objects.get)(pk=rng.choice(user_ids))
+            client = AsyncClient(raise_request_exception=False)
+
+            requests = 0
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    if requests % login_every == 0:
+                        await sync_to_async(client.force_login)(user)
+                    if kind == 'like':
+                        url = reverse('blog:like-post', kwargs={'post_id': rng.choice(post_ids)})
+                        # url-encoded: the AsyncClient of Django 4.0 can't stream a multipart body
+                        response = await client.post(url, f"like={rng.choice('01')}",
+                                                     content_type='application/x-www-form-urlencoded')
+                    else:
+                        if rng.random() < session_writes:
+                            await sync_to_async(self.touch_session)(client)
+                        response = await client.get(feed_url)
+                    status = response.status_code
+                except Exception:  # database is locked...
+                    status = 500
+                results[kind].append(time.perf_counter() - start)
+                errors[kind] += status != 200
+                requests += 1
+
+        await asyncio.gather(*[browse(index, 'read') for index in range(tasks)],
+                             *[browse(tasks + index, 'like') for index in range(like_writers)])
+        await sync_to_async(connections.close_all)()
+
+        return {kind: {'latencies': latencies, 'writes': None, 'errors': errors[kind]}
+                for kind, latencies in results.items() if latencies}
+
+    @staticmethod
+    def touch_session(client) -> None:
+        session = client.session
+        session['last_visit'] = time.time()
+        session.save()
+
+    def write_report(self, engine: str, report: dict, duration: float) -> None:
+        if not report:
+            self.stdout.write(self.style.ERROR(f"{engine}: no request completed"))
+            return
+
+        for kind, result in report.items():
+            latencies = sorted(result['latencies'])
+            p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) >= 20 else latencies[-1]
+            self.stdout.write(
+                    f"{engine} [{'feed' if kind == 'read' else 'likes'}]: {len(latencies) / duration:.1f} requests/s, "
+                    f"median {statistics.median(latencies) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms, "
+                    + ("" if result['writes'] is None else f"{result['writes']} SQL writes, ")
+                    + f"{result['errors']} errors")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from blog.search import POST_INDEX, USER_INDEX
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search indexes of the posts and the users from their tables."
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("The full-text search index is only available with SQLite")
+
+        with connection.cursor() as cursor:
+            for index in (POST_INDEX, USER_INDEX):
+                cursor.execute(f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+                cursor.execute(f"INSERT INTO {index}({index}) VALUES ('optimize')")
+                self.stdout.write(f"{index} rebuilt")
+
+        self.stdout.write(self.style.SUCCESS("Search indexes rebuilt"))
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, F, Max
+from django.db.models.functions import Coalesce
+
+from auth.models import CustomUser
+from blog.models import Follow, Post
+from blog.signals import COUNTER_FIELDS
+
+
+def count_per_row(model, field: str = 'post') -> Coalesce:
+    """ Correlated ``COUNT(*)`` of the rows of ``model`` whose ``field`` points to the outer row. """
+    counts = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(count=Count('pk'))
+    return Coalesce(Subquery(counts.values('count'), output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = ("Recompute the like/comment/report counters of the posts and the followers counters of the users which "
+            "have drifted.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help="Number of posts checked and updated per transaction (default: 1000)")
+
+    def handle(self, *args, chunk_size: int, **options):
+        real_counts = {field: count_per_row(model) for model, field in COUNTER_FIELDS.items()}
+        fixed = self.reconcile(Post, real_counts, chunk_size)
+        self.stdout.write(self.style.SUCCESS(f"{fixed} post(s) fixed"))
+
+        fixed = self.reconcile(CustomUser, {'followers_count': count_per_row(Follow, 'followed')}, chunk_size)
+        self.stdout.write(self.style.SUCCESS(f"{fixed} user(s) fixed"))
+
+    @staticmethod
+    def reconcile(model, real_counts: dict, chunk_size: int) -> int:
+        """ Set the counters ``{field: real count}`` of the rows which have drifted, return their number """
+        drift = Q()
+        for field in real_counts:
+            drift |= ~Q(**{field: F(f'real_{field}')})
+
+        last_id = model.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        fixed = 0
+
+        # walk the table by primary key ranges, each chunk in its own short transaction
+        for start in range(0, last_id + 1, chunk_size):
+            with transaction.atomic():
+                chunk = model.objects.filter(id__gte=start, id__lt=start + chunk_size)
+                drifted = chunk.alias(**{f'real_{field}': count for field, count in real_counts.items()}).filter(drift)
+                ids = list(drifted.values_list('id', flat=True))
+                if ids:
+                    model.objects.filter(id__in=ids).update(**real_counts)
+
+            fixed += len(ids)
+        return fixed
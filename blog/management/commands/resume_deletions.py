@@ -0,0 +1,38 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from blog.deletion import run_job
+from blog.models import DeletionJob
+
+
+class Command(BaseCommand):
+    help = ("Run again the deletions of users and posts which have been interrupted (restart, crash) or have failed, "
+            "from where they stopped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale-after', type=int, default=10,
+                            help="Minutes without progress after which a running deletion is considered interrupted "
+                                 "(default: 10)")
+
+    def handle(self, *args, stale_after: int, **options):
+        stale = timezone.now() - datetime.timedelta(minutes=stale_after)
+        jobs = DeletionJob.objects.filter(Q(status__in=(DeletionJob.PENDING, DeletionJob.FAILED)) |
+                                          Q(status=DeletionJob.RUNNING, updated_at__lt=stale)).order_by('id')
+
+        failed = 0
+        for job in jobs:
+            try:
+                run_job(job.pk)
+            except Exception as exception:
+                failed += 1
+                self.stderr.write(f"Deletion of {job} failed: {exception!r}")
+                continue
+
+            job.refresh_from_db()
+            self.stdout.write(f"Deletion of {job} {job.get_status_display().lower()}: {job.progress}")
+
+        style = self.style.ERROR if failed else self.style.SUCCESS
+        self.stdout.write(style(f"{len(jobs)} deletion(s) resumed, {failed} failed"))
@@ -0,0 +1,71 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Max
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from auth.models import CustomUser
+from blog.models import Post, Comment, Like, PostReport, DailyStats, StatsWatermark
+
+# DailyStats field: (model, date field), the new rows are found by primary key
+APPEND_ONLY_SOURCES = {
+    'posts': (Post, 'created_at'),
+    'users': (CustomUser, 'date_joined'),
+    'comments': (Comment, 'created_at'),
+    'likes': (Like, 'created_at'),
+    'reports': (PostReport, 'created_at'),
+}
+
+# hidden_at is set before the transaction hiding the post commits: the posts hidden during the last minutes are left
+# for the next run, otherwise a post committed after the run with an older hidden_at would never be counted
+HIDDEN_POSTS_LAG = datetime.timedelta(minutes=5)
+
+
+class Command(BaseCommand):
+    help = ("Add the rows created since the last run to the daily statistics shown in the moderation panel. "
+            "Meant to be run periodically (cron), each run only reads the new rows.")
+
+    def handle(self, *args, **options):
+        for source, (model, date_field) in APPEND_ONLY_SOURCES.items():
+            with transaction.atomic():
+                watermark, _ = StatsWatermark.objects.select_for_update().get_or_create(source=source)
+                new_rows = model.objects.filter(id__gt=watermark.last_id)
+                last_id = new_rows.aggregate(last_id=Max('id'))['last_id']
+                if last_id is None:
+                    continue
+
+                per_day = new_rows.filter(id__lte=last_id).annotate(day=TruncDate(date_field))
+                added = self.add_to_stats(source, per_day.values('day').annotate(count=Count('id')))
+
+                watermark.last_id = last_id
+                watermark.save()
+                self.stdout.write(f"{source}: {added} new row(s)")
+
+        # a post can be hidden long after its creation, the hidden posts are found by hiding date
+        with transaction.atomic():
+            watermark, _ = StatsWatermark.objects.select_for_update().get_or_create(source='hidden_posts')
+            until = timezone.now() - HIDDEN_POSTS_LAG
+            hidden = Post.objects.filter(hidden_at__lte=until)
+            if watermark.last_date:
+                hidden = hidden.filter(hidden_at__gt=watermark.last_date)
+
+            per_day = hidden.annotate(day=TruncDate('hidden_at')).values('day').annotate(count=Count('id'))
+            added = self.add_to_stats('hidden_posts', per_day)
+
+            watermark.last_date = until
+            watermark.save()
+            self.stdout.write(f"hidden_posts: {added} new row(s)")
+
+        self.stdout.write(self.style.SUCCESS("Statistics up to date"))
+
+    @staticmethod
+    def add_to_stats(field: str, counts_per_day) -> int:
+        """ Increment ``field`` of the DailyStats of each day, return the total added """
+        total = 0
+        for row in counts_per_day.order_by():
+            DailyStats.objects.get_or_create(day=row['day'])
+            DailyStats.objects.filter(day=row['day']).update(**{field: F(field) + row['count']})
+            total += row['count']
+        return total
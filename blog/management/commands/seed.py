@@ -0,0 +1,57 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.seeding import DatasetGenerator, DEFAULT_END, PASSWORD
+
+
+class Command(BaseCommand):
+    help = ("Fill the database with a big synthetic dataset (users, follows, posts, likes, comments, reports and "
+            "timelines), deterministic for a given seed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000, help="Number of users to create (default: 10000)")
+        parser.add_argument('--posts', type=int, default=100000, help="Number of posts to create (default: 100000)")
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the random generator (default: 0)")
+        parser.add_argument('--days', type=int, default=180,
+                            help="Length in days of the period covered by the posts (default: 180)")
+        parser.add_argument('--end', type=datetime.date.fromisoformat, default=DEFAULT_END,
+                            help=f"End of the period covered by the posts, YYYY-MM-DD (default: {DEFAULT_END})")
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help="Number of posts (with their likes and comments) inserted per transaction "
+                                 "(default: 10000)")
+        parser.add_argument('--likes-exponent', type=float, default=1.3,
+                            help="Exponent of the power law of the number of likes per post, lower means more "
+                                 "likes (default: 1.3)")
+        parser.add_argument('--follows-exponent', type=float, default=1.5,
+                            help="Exponent of the power law of the number of accounts followed per user, lower "
+                                 "means more follows (default: 1.5)")
+        parser.add_argument('--report-ratio', type=float, default=0.01,
+                            help="Proportion of reported posts (default: 0.01)")
+
+    def handle(self, *args, users: int, posts: int, seed: int, days: int, end: datetime.date, batch_size: int,
+               likes_exponent: float, follows_exponent: float, report_ratio: float, **options):
+        if batch_size < 1 or days < 1:
+            raise CommandError("--batch-size and --days must be positive")
+
+        generator = DatasetGenerator(seed=seed, days=days, end=end, batch_size=batch_size,
+                                     likes_exponent=likes_exponent, follows_exponent=follows_exponent,
+                                     report_ratio=report_ratio, log=self.stdout.write)
+
+        start = time.perf_counter()
+        generator.generate_users(users)
+        generator.generate_follows()
+        if not generator.user_ids and posts:
+            raise CommandError("There is no user to write the posts")
+        generator.generate_posts(posts)
+        elapsed = time.perf_counter() - start
+
+        total = sum(generator.rows.values())
+        for model_name, count in generator.rows.items():
+            self.stdout.write(f"{model_name}: {count} rows")
+        self.stdout.write(self.style.SUCCESS(
+                f"{total} rows in {elapsed:.1f}s: {total / elapsed:.0f} rows/s overall, "
+                f"{generator.throughput:.0f} rows/s of inserts"))
+        self.stdout.write(f"The password of the generated users is {PASSWORD!r}. "
+                          f"Run the rollup_stats command to update the statistics.")
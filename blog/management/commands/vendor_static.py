@@ -0,0 +1,49 @@
+import hashlib
+import urllib.request
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from monodcrush.staticfiles import VENDORED_SCRIPTS
+
+
+class Command(BaseCommand):
+    help = ("Download the third-party scripts (Alpine.js...) at their pinned versions into the static files, "
+            "to serve them with the other static files instead of from a CDN. A script whose sha256 differs from "
+            "the one pinned in VENDORED_SCRIPTS is refused.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Download the scripts already present again")
+
+    def handle(self, *args, force: bool, **options):
+        directory = Path(settings.STATICFILES_DIRS[0])
+
+        for name, (path, url, sha256) in VENDORED_SCRIPTS.items():
+            if not sha256:
+                raise CommandError(f"No sha256 pinned for {name} in VENDORED_SCRIPTS, {url} can't be verified")
+
+            destination = directory / path
+            if destination.exists() and not force:
+                if hashlib.sha256(destination.read_bytes()).hexdigest() != sha256:
+                    raise CommandError(f"{name}: {path} does not match its pinned sha256, download it again "
+                                       f"with --force")
+                self.stdout.write(f"{name}: {path} already present")
+                continue
+
+            try:
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    content = response.read()
+            except OSError as error:
+                raise CommandError(f"Failed to download {name} from {url}: {error}")
+
+            digest = hashlib.sha256(content).hexdigest()
+            if digest != sha256:
+                raise CommandError(f"{name}: the sha256 of {url} is {digest} instead of the pinned {sha256}, "
+                                   f"nothing written")
+
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            destination.write_bytes(content)
+            self.stdout.write(self.style.SUCCESS(f"{name}: {url} -> {path} ({len(content)} bytes)"))
+
+        self.stdout.write("Run collectstatic to publish them.")
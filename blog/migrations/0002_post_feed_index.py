@@ -0,0 +1,21 @@
+# Generated by Django 4.0.5 on 2026-10-18 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='post',
+            options={'default_permissions': (), 'permissions': (('hide_posts', "Peut masquer des posts (sans voir l'auteur)"), ('edit_posts', "Peut modifier/supprimer des posts (sans voir l'auteur)"), ('view_posts_details', "Peut voir les détails des posts (dont l'auteur) (doit faire partie du staff)")), 'verbose_name': 'post', 'verbose_name_plural': 'posts'},
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='post_feed_idx'),
+        ),
+    ]
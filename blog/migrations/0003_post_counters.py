@@ -0,0 +1,45 @@
+# Generated by Django 4.0.5 on 2026-10-18 08:57
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_per_post(model):
+    counts = model.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(count=Count('pk'))
+    return Coalesce(Subquery(counts.values('count'), output_field=IntegerField()), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    Post.objects.update(
+            likes_count=count_per_post(apps.get_model('blog', 'Like')),
+            comments_count=count_per_post(apps.get_model('blog', 'Comment')),
+            reports_count=count_per_post(apps.get_model('blog', 'PostReport')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_post_feed_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='nombre de commentaires'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='nombre de likes'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='reports_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='nombre de signalements'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+# FTS5 external content tables with the trigram tokenizer (SQLite >= 3.34) so that substring
+# searches still match, kept in sync with their content table by triggers. See blog.search
+
+
+def create_search_index(apps, schema_editor):
+    from blog.search import create_search_index
+    create_search_index(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    from blog.search import INDEXED_TABLES
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    for index in INDEXED_TABLES:
+        for trigger in ('ai', 'ad', 'au'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {index}_{trigger}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {index}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Cauth', '0001_initial'),
+        ('blog', '0003_post_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.0.5 on 2026-10-18 08:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True, verbose_name='jour')),
+                ('posts', models.PositiveIntegerField(default=0, verbose_name='posts')),
+                ('users', models.PositiveIntegerField(default=0, verbose_name='utilisateurs')),
+                ('comments', models.PositiveIntegerField(default=0, verbose_name='commentaires')),
+                ('likes', models.PositiveIntegerField(default=0, verbose_name='likes')),
+                ('reports', models.PositiveIntegerField(default=0, verbose_name='signalements')),
+                ('hidden_posts', models.PositiveIntegerField(default=0, verbose_name='posts masqués')),
+            ],
+            options={
+                'verbose_name': 'statistiques du jour',
+                'verbose_name_plural': 'statistiques par jour',
+                'ordering': ('-day',),
+            },
+        ),
+        migrations.CreateModel(
+            name='StatsWatermark',
+            fields=[
+                ('source', models.CharField(max_length=20, primary_key=True, serialize=False, verbose_name='source')),
+                ('last_id', models.BigIntegerField(default=0, verbose_name='dernier id traité')),
+                ('last_date', models.DateTimeField(blank=True, null=True, verbose_name='dernière date traitée')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='dernière mise à jour')),
+            ],
+            options={
+                'verbose_name': 'curseur des statistiques',
+                'verbose_name_plural': 'curseurs des statistiques',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='hidden_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='date de masquage'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.0.5 on 2026-10-18 09:02
+
+from django.db import migrations, models
+from django.db.models import Max, Min, OuterRef, Subquery
+
+
+def fill_report_dates(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    PostReport = apps.get_model('blog', 'PostReport')
+
+    reports = PostReport.objects.filter(post=OuterRef('pk')).order_by().values('post')
+    Post.objects.filter(reports_count__gt=0).update(
+            first_reported_at=Subquery(reports.annotate(first=Min('created_at')).values('first')),
+            last_reported_at=Subquery(reports.annotate(last=Max('created_at')).values('last')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_comment_thread_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='first_reported_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='premier signalement'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='last_reported_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='dernier signalement'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('reports_count__gt', 0)), fields=['-last_reported_at'], name='post_report_queue_idx'),
+        ),
+        migrations.RunPython(fill_report_dates, migrations.RunPython.noop),
+    ]
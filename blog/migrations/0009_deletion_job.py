@@ -0,0 +1,36 @@
+# Generated by Django 4.0.5 on 2026-10-18 09:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_follow_timeline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('U', 'Utilisateur'), ('P', 'Post')], max_length=1, verbose_name='type')),
+                ('target_id', models.BigIntegerField(verbose_name='id supprimé')),
+                ('status', models.CharField(choices=[('P', 'En attente'), ('R', 'En cours'), ('D', 'Terminée'), ('F', 'Échouée')], default='P', max_length=1, verbose_name='état')),
+                ('step', models.CharField(blank=True, max_length=30, verbose_name='étape')),
+                ('progress', models.JSONField(blank=True, default=dict, verbose_name='progression')),
+                ('error', models.TextField(blank=True, verbose_name='erreur')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='date de création')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='dernière progression')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='date de fin')),
+            ],
+            options={
+                'verbose_name': 'suppression en cours',
+                'verbose_name_plural': 'suppressions en cours',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='deletionjob',
+            index=models.Index(fields=['kind', 'target_id'], name='deletion_job_target_idx'),
+        ),
+    ]
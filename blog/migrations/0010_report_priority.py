@@ -0,0 +1,41 @@
+# Generated by Django 4.0.5 on 2026-10-18 10:28
+
+import itertools
+
+from django.db import migrations, models
+
+from blog.models import report_priority
+
+
+def fill_report_priority(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    PostReport = apps.get_model('blog', 'PostReport')
+
+    reports = PostReport.objects.order_by('post_id').values_list('post_id', 'created_at').iterator()
+    posts = [Post(id=post_id, report_priority=report_priority(date for _, date in post_reports))
+             for post_id, post_reports in itertools.groupby(reports, key=lambda report: report[0])]
+    Post.objects.bulk_update(posts, ['report_priority'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_deletion_job'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='post',
+            name='post_report_queue_idx',
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='report_priority',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='priorité des signalements'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('reports_count__gt', 0)), fields=['-report_priority', '-id'], name='post_report_queue_idx'),
+        ),
+        migrations.RunPython(fill_report_priority, migrations.RunPython.noop),
+    ]
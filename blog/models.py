@@ -1,15 +1,159 @@
 import logging
+import math
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.db.models import QuerySet, Manager
+from django.db import models, connection, transaction
+from django.db.models import QuerySet, Manager, Exists, OuterRef, Value, BooleanField, F, Q, DateTimeField, \
+    DurationField, FloatField, ExpressionWrapper, Case, When
+from django.db.models.functions import Coalesce, Cast, Now, Greatest, Least, Ln, Exp
+from django.utils import timezone
 
 from auth.models import CustomUser
 
 log = logging.getLogger(__name__)
 
 
+def insert_or_ignore(model: type, **values) -> bool:
+    """
+    Insert a row in a single ``INSERT ... ON CONFLICT DO NOTHING`` statement.
+    Return False instead of raising an IntegrityError when a unique constraint already holds the row.
+    Signals are not sent.
+    """
+    fields = [model._meta.get_field(name) for name in values]
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    params = [field.get_db_prep_save(value, connection) for field, value in zip(fields, values.values())]
+    placeholders = ', '.join(['%s'] * len(params))
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {connection.ops.quote_name(model._meta.db_table)} ({columns}) "
+                       f"VALUES ({placeholders}) ON CONFLICT DO NOTHING", params)
+        return cursor.rowcount == 1
+
+
+def delete_rows(model: type, **values) -> int:
+    """
+    Delete the matching rows in a single ``DELETE ... WHERE`` statement and return their number, a list value
+    matches any of its items. Neither the rows are loaded nor the signals sent, unlike ``QuerySet.delete()``.
+    """
+    conditions, params = [], []
+    for name, value in values.items():
+        field = model._meta.get_field(name)
+        column = connection.ops.quote_name(field.column)
+        if isinstance(value, list):
+            if not value:
+                return 0
+            conditions.append(f"{column} IN ({', '.join(['%s'] * len(value))})")
+            params.extend(field.get_db_prep_value(item, connection) for item in value)
+        else:
+            conditions.append(f"{column} = %s")
+            params.append(field.get_db_prep_value(value, connection))
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {connection.ops.quote_name(model._meta.db_table)} "
+                       f"WHERE {' AND '.join(conditions)}", params)
+        return cursor.rowcount
+
+
+# each report counts twice as much as one made REPORT_HALF_LIFE earlier, see report_priority
+REPORT_HALF_LIFE = timedelta(hours=6)
+REPORT_EPOCH = datetime(2022, 1, 1, tzinfo=timezone.utc)
+
+
+def report_weight(reported_at: datetime) -> float:
+    """ Logarithm of the weight of a report in ``Post.report_priority`` """
+    return (reported_at - REPORT_EPOCH) / REPORT_HALF_LIFE * math.log(2)
+
+
+def report_priority(report_dates: Iterable[datetime]) -> float:
+    """
+    ``Post.report_priority`` of a post reported at these dates: the logarithm of the sum of the report weights, the
+    reports decayed by their age. All the posts decay at the same pace, so their order is the one of their report
+    velocity at any time and the column never has to be recomputed.
+    """
+    weights = [report_weight(date) for date in report_dates]
+    top = max(weights)
+    return top + math.log(sum(math.exp(weight - top) for weight in weights))
+
+
+def add_to_post_counter(post_id: int, field: str, delta: int) -> Optional[int]:
+    """
+    Atomically add ``delta`` to a counter of a post (without going below zero) in a single
+    ``UPDATE ... RETURNING`` statement, return the new value or None if the post does not exist.
+    """
+    column = connection.ops.quote_name(Post._meta.get_field(field).column)
+    with connection.cursor() as cursor:
+        cursor.execute(f"UPDATE {connection.ops.quote_name(Post._meta.db_table)} "
+                       f"SET {column} = CASE WHEN {column} + %s < 0 THEN 0 ELSE {column} + %s END "
+                       f"WHERE id = %s RETURNING {column}", [delta, delta, post_id])
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+class PostQuerySet(QuerySet):
+    def public(self) -> "PostQuerySet":
+        """
+        Posts visible by everyone, newest first. The posts of a deactivated account are left out while they are
+        purged in the background.
+        """
+        return self.filter(status__in=Post.PUBLIC, author__is_active=True).order_by('-created_at', '-id')
+
+    def with_viewer_state(self, user: CustomUser) -> "PostQuerySet":
+        """ Annotate ``liked`` and ``reported`` for the given (possibly anonymous) user. """
+        if not user.is_authenticated:
+            return self.annotate(liked=Value(False, output_field=BooleanField()),
+                                 reported=Value(False, output_field=BooleanField()))
+
+        return self.annotate(
+                liked=Exists(Like.objects.filter(post=OuterRef('pk'), user=user)),
+                reported=Exists(PostReport.objects.filter(post=OuterRef('pk'), user=user)),
+        )
+
+    def for_viewer(self, user: CustomUser) -> "PostQuerySet":
+        """
+        Everything a post card needs in a single query: the author row and the viewer state.
+        Apply it on an already paginated queryset so the subqueries only run for the displayed posts.
+        """
+        return self.select_related('author').with_viewer_state(user)
+
+    def record_report(self, reported_at: datetime) -> bool:
+        """
+        Count a new report on the posts and hide those which reach ``PostReport.MAX_REPORT_COUNT``,
+        with conditional UPDATEs instead of counting the reports. Return True if a post has been hidden.
+        The weight of the report is added to ``report_priority`` in the same UPDATE (log-sum-exp, see
+        ``report_priority``).
+        """
+        weight = Value(report_weight(reported_at), FloatField())
+        priority = F('report_priority')
+        top, bottom = Greatest(priority, weight), Least(priority, weight)
+        self.update(reports_count=F('reports_count') + 1,
+                    first_reported_at=Coalesce(F('first_reported_at'), Value(reported_at, DateTimeField())),
+                    last_reported_at=reported_at,
+                    report_priority=Case(When(report_priority__isnull=True, then=weight),
+                                         default=top + Ln(Value(1.0) + Exp(bottom - top)), output_field=FloatField()))
+
+        over_reported = self.filter(status=Post.NORMAl, reports_count__gte=PostReport.MAX_REPORT_COUNT)
+        return over_reported.update(status=Post.HIDDEN, hidden_at=reported_at) > 0
+
+    def report_queue(self) -> "PostQuerySet":
+        """
+        Reported posts, the most reported lately first: the order of ``report_priority`` and of the partial index
+        ``post_report_queue_idx``, so a page is a range scan of the index (see ``paginate_by_cursor`` with
+        ``report_priority``) whatever the number of reported posts. The reports per hour since the first report are
+        computed for the posts of the page only. The reports table is never read.
+        """
+        hour = 3600 * 10 ** 6  # durations are in microseconds
+        reported_for = ExpressionWrapper(Now() - F('first_reported_at'), output_field=DurationField())
+        velocity = ExpressionWrapper(
+                Cast('reports_count', FloatField()) * hour / (Cast(reported_for, FloatField()) + hour),
+                output_field=FloatField(),
+        )
+        return (self.filter(reports_count__gt=0).exclude(status=Post.DELETED).select_related('author')
+                .annotate(report_velocity=velocity).order_by('-report_priority', '-id'))
+
+
 class Post(models.Model):
     NORMAl = 'N'
     HIDDEN = 'H'
@@ -31,17 +175,40 @@ class Post(models.Model):
     created_at = models.DateTimeField("date de création", auto_now_add=True)
     updated_at = models.DateTimeField("dernière modification", auto_now=True)
     status = models.CharField("état", max_length=1, choices=STATUS_CHOICES, default=NORMAl)
+    hidden_at = models.DateTimeField("date de masquage", null=True, blank=True, editable=False)
+    first_reported_at = models.DateTimeField("premier signalement", null=True, blank=True, editable=False)
+    last_reported_at = models.DateTimeField("dernier signalement", null=True, blank=True, editable=False)
+    report_priority = models.FloatField("priorité des signalements", null=True, blank=True, editable=False)
     is_anonymous = models.BooleanField("post anonyme", default=True)
 
+    # denormalized counters, kept up to date by blog.signals and rebuilt by the reconcile_counters command
+    likes_count = models.PositiveIntegerField("nombre de likes", default=0, editable=False)
+    comments_count = models.PositiveIntegerField("nombre de commentaires", default=0, editable=False)
+    reports_count = models.PositiveIntegerField("nombre de signalements", default=0, editable=False)
+
+    # written by their own UPDATEs only (blog.signals, record_report), never by a save of the whole post
+    DENORMALIZED_FIELDS = ('likes_count', 'comments_count', 'reports_count', 'first_reported_at', 'last_reported_at',
+                           'report_priority')
+
     likes: QuerySet["Like"]
     reports: QuerySet["PostReport"]
     comments: QuerySet["Comment"]
-    objects: Manager
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         verbose_name = "post"
         verbose_name_plural = "posts"
 
+        indexes = [
+            # keyset pagination of the feed, see blog.pagination
+            models.Index(fields=['status', '-created_at', '-id'], name='post_feed_idx'),
+            # last posts of a user: profile page, posts of the popular accounts in the timelines (blog.timelines)
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_feed_idx'),
+            # moderation queue, only the reported posts are indexed
+            models.Index(fields=['-report_priority', '-id'], condition=Q(reports_count__gt=0),
+                         name='post_report_queue_idx'),
+        ]
+
         permissions = (
             ('hide_posts', "Peut masquer des posts (sans voir l'auteur)"),
             ('edit_posts', "Peut modifier/supprimer des posts (sans voir l'auteur)"),
@@ -53,15 +220,31 @@ class Post(models.Model):
 
     @property
     def nb_of_likes(self) -> int:
-        return self.likes.count()
+        return self.likes_count
 
     @property
     def nb_of_comments(self) -> int:
-        return self.comments.count()
+        return self.comments_count
 
     @property
     def nb_of_reports(self) -> int:
-        return self.reports.count()
+        return self.reports_count
+
+    def save(self, *args, **kwargs) -> None:
+        """
+        Saving an existing post (edit form, admin) leaves out the counters: the values loaded with the post would
+        overwrite the increments made since by the other requests.
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in Post.DENORMALIZED_FIELDS]
+        super().save(*args, **kwargs)
+
+    def hide(self) -> None:
+        """ Hide the post from the public feed """
+        self.status = Post.HIDDEN
+        self.hidden_at = timezone.now()
+        self.save(update_fields=['status', 'hidden_at', 'updated_at'])
 
     def is_liked_by(self, user: CustomUser) -> bool:
         """ Returns True if the user has liked the post. """
@@ -98,6 +281,11 @@ class Comment(models.Model):
         verbose_name = "commentaire"
         verbose_name_plural = "commentaires"
 
+        indexes = [
+            # keyset pagination of the comments of a post, see blog.pagination
+            models.Index(fields=['post', '-created_at', '-id'], name='comment_thread_idx'),
+        ]
+
         permissions = (
             ('delete_other_users_comments', 'Can delete other users\' comments'),
             ('edit_other_users_comments', 'Can edit other users\' comments'),
@@ -118,7 +306,24 @@ class Comment(models.Model):
         return f"{self.author.username} - {self.created_at.strftime('%d/%m/%Y %H:%M')}"
 
 
+class PostReportQuerySet(QuerySet):
+    def report(self, post: Post, user: CustomUser) -> bool:
+        """
+        Record the report of the user and hide the post if it has been reported too many times, in one transaction.
+        Return False if the user had already reported the post.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            if not insert_or_ignore(PostReport, post=post.pk, user=user.pk, created_at=now):
+                return False
+
+            if Post.objects.filter(pk=post.pk).record_report(now):
+                log.info(f"Post {post.pk} has been hidden because it has been reported too many times")
+        return True
+
+
 class PostReport(models.Model):
+    """ Reports created with the ORM (admin...) are counted by blog.signals, the views use ``objects.report`` """
     MAX_REPORT_COUNT = 3
 
     post: Post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="reports", verbose_name="post signalé")
@@ -126,7 +331,7 @@ class PostReport(models.Model):
                                          related_name="reports", verbose_name="auteur du signalement")
     created_at = models.DateTimeField("date du signalement", auto_now_add=True)
 
-    objects: Manager
+    objects = PostReportQuerySet.as_manager()
 
     class Meta:
         constraints = [
@@ -143,7 +348,7 @@ class PostReport(models.Model):
 
     def validate_unique(self, exclude: iter = None) -> None:
         """ Check you can't report the same post twice """
-        if PostReport.objects.filter(post=self.post, user=self.user).exists():
+        if PostReport.objects.filter(post=self.post_id, user=self.user_id).exclude(pk=self.pk).exists():
             raise ValidationError("Vous avez déjà signalé ce post")
         super().validate_unique(exclude)
 
@@ -152,26 +357,40 @@ class PostReport(models.Model):
         if self.post.author == self.user:
             raise ValidationError("Vous ne pouvez pas signaler votre propre post")
 
-    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        """ Override save method to prevent more than 3 reports per post """
-        super().save(force_insert, force_update, using, update_fields)
-
-        if self.post.reports.count() >= PostReport.MAX_REPORT_COUNT:
-            self.post.status = Post.HIDDEN
-            self.post.save()
-            log.info(f"Post {self.post.id} has been hidden because it has been reported too many times")
-
     def __repr__(self) -> str:
         return f'{self.post} - {self.user.username}'
 
 
+class LikeQuerySet(QuerySet):
+    def set_liked(self, post: Post, user: CustomUser, liked: bool) -> Optional[int]:
+        """
+        Like or unlike the post and return its new number of likes, None if the post has been deleted meanwhile.
+
+        The like is inserted (or ignored if it already exists) or deleted in one statement, and the counter
+        of the post is only updated if a row changed: repeated or concurrent submits can't raise an
+        IntegrityError nor count a like twice.
+        """
+        with transaction.atomic():
+            if liked:
+                changed = insert_or_ignore(Like, post=post.pk, user=user.pk, created_at=timezone.now())
+            else:
+                # not the public delete(): it loads the row and sends post_delete, whose receiver would take the
+                # like out of the counter a second time, without returning the new value
+                changed = delete_rows(Like, post=post.pk, user=user.pk) > 0
+
+            if changed:
+                return add_to_post_counter(post.pk, 'likes_count', 1 if liked else -1)
+        # nothing changed, the count loaded with the post may be outdated
+        return Post.objects.filter(pk=post.pk).values_list('likes_count', flat=True).first()
+
+
 class Like(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="likes", verbose_name="post aimé")
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
                              related_name="likes", verbose_name="utilisateur aimant")
     created_at = models.DateTimeField("date", auto_now_add=True)
 
-    objects: Manager
+    objects = LikeQuerySet.as_manager()
 
     class Meta:
         constraints = [
@@ -188,9 +407,153 @@ class Like(models.Model):
 
     def validate_unique(self, exclude: iter = None) -> None:
         """ Check you can't like the same post twice """
-        if Like.objects.filter(post=self.post, user=self.user).exists():
+        if Like.objects.filter(post=self.post_id, user=self.user_id).exclude(pk=self.pk).exists():
             raise ValidationError("Vous avez déjà liké ce post")
         super().validate_unique(exclude)
 
     def __str__(self) -> str:
         return f'{self.post} - {self.user.username}'
+
+
+class Follow(models.Model):
+    follower = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                                 related_name="following", verbose_name="abonné")
+    followed = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                                 related_name="followers", verbose_name="compte suivi")
+    created_at = models.DateTimeField("date", auto_now_add=True)
+
+    objects: Manager
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['follower', 'followed'], name='unique_follow'),
+            models.CheckConstraint(check=~Q(follower=F('followed')), name='no_self_follow'),
+        ]
+        indexes = [
+            # followers of a user by batches, see blog.timelines.fan_out_post
+            models.Index(fields=['followed', 'follower'], name='follow_followers_idx'),
+        ]
+
+        verbose_name = "abonnement"
+        verbose_name_plural = "abonnements"
+
+    def __str__(self) -> str:
+        return f'{self.follower_id} -> {self.followed_id}'
+
+
+class TimelineEntry(models.Model):
+    """
+    Post of a followed account in the following feed of a user, written when the post is published
+    (fan-out on write, see blog.timelines): reading the feed is a range scan of the index of the user.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+",
+                             db_index=False, verbose_name="utilisateur")  # first column of timeline_idx
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="timeline_entries", verbose_name="post")
+    # copies of the author and the date of the post: removal on unfollow, order of the feed
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+",
+                               verbose_name="auteur")
+    created_at = models.DateTimeField("date du post")
+
+    objects: Manager
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'], name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-post'], name='timeline_idx'),
+            models.Index(fields=['user', 'author'], name='timeline_author_idx'),
+        ]
+
+        verbose_name = "entrée du fil d'abonnements"
+        verbose_name_plural = "entrées des fils d'abonnements"
+
+
+class DailyStats(models.Model):
+    """ Number of new rows per day, rolled up incrementally by the rollup_stats command """
+    day = models.DateField("jour", unique=True)
+    posts = models.PositiveIntegerField("posts", default=0)
+    users = models.PositiveIntegerField("utilisateurs", default=0)
+    comments = models.PositiveIntegerField("commentaires", default=0)
+    likes = models.PositiveIntegerField("likes", default=0)
+    reports = models.PositiveIntegerField("signalements", default=0)
+    hidden_posts = models.PositiveIntegerField("posts masqués", default=0)
+
+    objects: Manager
+
+    class Meta:
+        ordering = ('-day',)
+        verbose_name = "statistiques du jour"
+        verbose_name_plural = "statistiques par jour"
+
+    def __str__(self) -> str:
+        return self.day.strftime('%d/%m/%Y')
+
+
+class StatsWatermark(models.Model):
+    """ Last row of a source already counted in DailyStats """
+    source = models.CharField("source", max_length=20, primary_key=True)
+    last_id = models.BigIntegerField("dernier id traité", default=0)
+    last_date = models.DateTimeField("dernière date traitée", null=True, blank=True)
+    updated_at = models.DateTimeField("dernière mise à jour", auto_now=True)
+
+    objects: Manager
+
+    class Meta:
+        verbose_name = "curseur des statistiques"
+        verbose_name_plural = "curseurs des statistiques"
+
+    def __str__(self) -> str:
+        return self.source
+
+
+class DeletionJob(models.Model):
+    """
+    Purge of the rows of a deleted user or post by batches in the background (see blog.deletion). The target is
+    deactivated or hidden when the job is created, and its own row is deleted at the end of the job.
+    """
+    USER = 'U'
+    POST = 'P'
+
+    KIND_CHOICES = (
+        (USER, 'Utilisateur'),
+        (POST, 'Post'),
+    )
+
+    PENDING = 'P'
+    RUNNING = 'R'
+    DONE = 'D'
+    FAILED = 'F'
+
+    STATUS_CHOICES = (
+        (PENDING, 'En attente'),
+        (RUNNING, 'En cours'),
+        (DONE, 'Terminée'),
+        (FAILED, 'Échouée'),
+    )
+
+    UNFINISHED = (PENDING, RUNNING, FAILED)
+
+    kind = models.CharField("type", max_length=1, choices=KIND_CHOICES)
+    target_id = models.BigIntegerField("id supprimé")  # not a foreign key: the row is deleted by the job
+    status = models.CharField("état", max_length=1, choices=STATUS_CHOICES, default=PENDING)
+    step = models.CharField("étape", max_length=30, blank=True)
+    # number of rows deleted (or hidden) so far by step
+    progress = models.JSONField("progression", default=dict, blank=True)
+    error = models.TextField("erreur", blank=True)
+    created_at = models.DateTimeField("date de création", auto_now_add=True)
+    updated_at = models.DateTimeField("dernière progression", auto_now=True)
+    finished_at = models.DateTimeField("date de fin", null=True, blank=True)
+
+    objects: Manager
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'target_id'], name='deletion_job_target_idx'),
+        ]
+
+        verbose_name = "suppression en cours"
+        verbose_name_plural = "suppressions en cours"
+
+    def __str__(self) -> str:
+        return f'{self.get_kind_display()} {self.target_id}'
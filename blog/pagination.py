@@ -0,0 +1,91 @@
+import base64
+import binascii
+from datetime import datetime
+from typing import Callable, Optional, Tuple, Union
+
+from django.db.models import FloatField, Q, QuerySet
+from django.http import Http404
+
+
+class CursorPage:
+    """
+    A page of a keyset (cursor) pagination on ``(created_at, id)``, newest first.
+
+    Unlike ``django.core.paginator.Page`` there is no total count and no page number,
+    only the cursor of the next page: fetching page N costs the same as fetching page 1.
+    """
+
+    def __init__(self, object_list: list, next_cursor: Optional[str]) -> None:
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+
+def encode_cursor(created_at: Union[datetime, float], pk: int) -> str:
+    """ Opaque cursor pointing just after the given row, ordered by a date or by a float score. """
+    value = created_at.isoformat() if isinstance(created_at, datetime) else repr(created_at)
+    raw = f"{value}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, parse: Callable[[str], Union[datetime, float]] = datetime.fromisoformat
+                  ) -> Tuple[Union[datetime, float], int]:
+    """ Inverse of ``encode_cursor`` (``parse=float`` for a score), raise ``ValueError`` for a malformed cursor. """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split('|')
+        return parse(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError) as error:
+        raise ValueError(f"Invalid cursor {cursor!r}") from error
+
+
+def paginate_by_cursor(queryset: QuerySet, cursor: Optional[str], page_size: int, id_field: str = 'id',
+                       date_field: str = 'created_at') -> CursorPage:
+    """
+    Return the page following ``cursor`` (or the first page if there is no cursor).
+
+    The queryset is ordered by ``(-created_at, -id)`` and filtered with a row comparison,
+    so the database can seek directly in the ``(created_at, id)`` index instead of using OFFSET.
+    One extra row is fetched to know if there is a next page, no ``COUNT(*)`` is run.
+    ``id_field`` is the tie-breaker, e.g. ``post_id`` for rows pointing to posts which share their cursors,
+    ``date_field`` the (non null) date to order by instead of ``created_at``, or a float score.
+    """
+    queryset = queryset.order_by(f'-{date_field}', f'-{id_field}')
+
+    if cursor:
+        is_score = isinstance(queryset.model._meta.get_field(date_field), FloatField)
+        date, pk = decode_cursor(cursor, float if is_score else datetime.fromisoformat)
+        queryset = queryset.filter(Q(**{f'{date_field}__lt': date}) | Q(**{date_field: date, f'{id_field}__lt': pk}))
+
+    objects = list(queryset[:page_size + 1])
+    if len(objects) <= page_size:
+        return CursorPage(objects, None)
+
+    objects = objects[:page_size]
+    last = objects[-1]
+    return CursorPage(objects, encode_cursor(getattr(last, date_field), getattr(last, id_field)))
+
+
+class CursorPaginationMixin:
+    """
+    ``MultipleObjectMixin`` replacement of the OFFSET pagination by a cursor pagination.
+    The cursor is read from the ``cursor`` query parameter and the page is exposed as ``page_obj``.
+    """
+    cursor_kwarg = 'cursor'
+    cursor_date_field = 'created_at'
+
+    def paginate_queryset(self, queryset: QuerySet, page_size: int) -> tuple:
+        cursor = self.request.GET.get(self.cursor_kwarg)
+        try:
+            page = paginate_by_cursor(queryset, cursor, page_size, date_field=self.cursor_date_field)
+        except ValueError:
+            raise Http404("Page invalide")
+        return None, page, page.object_list, page.has_next()
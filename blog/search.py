@@ -0,0 +1,116 @@
+"""
+Full-text search on the posts and the users, backed by the FTS5 tables created by the
+0004_search_index migration. Other databases (and queries too short for the trigram
+tokenizer) fall back to a plain ``icontains`` search.
+"""
+from django.db import connection as default_connection
+from django.db.models import Q, QuerySet
+from django.db.models.expressions import RawSQL
+
+from auth.models import CustomUser
+
+POST_INDEX = 'blog_post_fts'
+USER_INDEX = 'blog_user_fts'
+
+# index: (content table, indexed columns)
+INDEXED_TABLES = {
+    POST_INDEX: ('blog_post', ('text',)),
+    USER_INDEX: ('Cauth_customuser', ('username', 'first_name')),
+}
+
+# the trigram tokenizer can't match less than 3 characters
+MIN_QUERY_LENGTH = 3
+
+
+def _use_index(query: str) -> bool:
+    return default_connection.vendor == 'sqlite' and len(query) >= MIN_QUERY_LENGTH
+
+
+def _match(query: str) -> str:
+    """ FTS5 query matching ``query`` as a literal substring """
+    return '"' + query.replace('"', '""') + '"'
+
+
+def _matching_ids(index: str, query: str) -> RawSQL:
+    """ Subquery of the ids matching the query, to be used with ``id__in`` """
+    return RawSQL(f"SELECT rowid FROM {index} WHERE {index} MATCH %s", (_match(query),))
+
+
+def search_users(query: str, limit: int = 50) -> list:
+    """ Users whose username or first name contains ``query``, best matches first """
+    query = query.strip()
+    if not query:
+        return []
+
+    if not _use_index(query):
+        users = CustomUser.objects.filter(Q(username__icontains=query) | Q(first_name__icontains=query), is_active=True)
+        return list(users.order_by('username')[:limit])
+
+    with default_connection.cursor() as cursor:
+        cursor.execute(f"SELECT rowid FROM {USER_INDEX} WHERE {USER_INDEX} MATCH %s ORDER BY rank LIMIT %s",
+                       (_match(query), limit))
+        ids = [row[0] for row in cursor.fetchall()]
+
+    # the deactivated accounts are still indexed until they are purged
+    users = CustomUser.objects.filter(is_active=True).in_bulk(ids)
+    return [users[id_] for id_ in ids if id_ in users]
+
+
+def filter_posts(queryset: QuerySet, query: str) -> QuerySet:
+    """ Posts of ``queryset`` whose text, author username or author first name contains ``query`` """
+    query = query.strip()
+    if not query:
+        return queryset
+
+    if not _use_index(query):
+        return queryset.filter(Q(text__icontains=query) | Q(author__username__icontains=query)
+                               | Q(author__first_name__icontains=query))
+
+    return queryset.filter(Q(id__in=_matching_ids(POST_INDEX, query))
+                           | Q(author_id__in=_matching_ids(USER_INDEX, query)))
+
+
+def create_search_index(connection) -> None:
+    """ Create the FTS5 tables with their triggers and fill them, run by the 0004_search_index migration """
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        for index, (table, columns) in INDEXED_TABLES.items():
+            cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5("
+                           f"{', '.join(columns)}, content='{table}', content_rowid='id', tokenize='trigram')")
+            _create_triggers(cursor, index)
+
+
+def ensure_search_index(connection) -> None:
+    """
+    Recreate the synchronisation triggers of the indexes if they are missing and rebuild those indexes.
+    SQLite drops the triggers when a migration remakes the content table, this runs after each ``migrate``.
+    """
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        existing = {row[0] for row in cursor.fetchall()}
+
+        for index in INDEXED_TABLES:
+            if index in existing and not {f'{index}_ai', f'{index}_ad', f'{index}_au'} <= existing:
+                _create_triggers(cursor, index)
+
+
+def _create_triggers(cursor, index: str) -> None:
+    """ The triggers keeping the index in sync with its content table, then a rebuild of the index """
+    table, columns = INDEXED_TABLES[index]
+    names = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {index}_ai AFTER INSERT ON {table} BEGIN "
+                   f"INSERT INTO {index}(rowid, {names}) VALUES (new.id, {new}); END")
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {index}_ad AFTER DELETE ON {table} BEGIN "
+                   f"INSERT INTO {index}({index}, rowid, {names}) VALUES ('delete', old.id, {old}); END")
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {index}_au AFTER UPDATE OF {names} ON {table} BEGIN "
+                   f"INSERT INTO {index}({index}, rowid, {names}) VALUES ('delete', old.id, {old}); "
+                   f"INSERT INTO {index}(rowid, {names}) VALUES (new.id, {new}); END")
+    cursor.execute(f"INSERT INTO {index}({index}) VALUES ('rebuild')")
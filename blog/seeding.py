@@ -0,0 +1,241 @@
+"""
+Fast generation of a big, realistic and deterministic dataset, used by the ``seed`` command and the benchmarks.
+
+Rows are inserted with ``bulk_create`` in large batches with precomputed primary keys, so that the likes,
+comments and reports of a batch of posts can reference them without reading them back. Every user shares
+the same precomputed password hash. The counters of the posts and the followers counts are set from the
+generated rows, and the signed posts are written in the timelines like ``blog.timelines`` would have done.
+The statistics can be rolled up afterwards with the ``rollup_stats`` command.
+"""
+import datetime
+import itertools
+import random
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Max, Model
+
+from auth.models import CustomUser
+from .models import Post, Comment, Like, PostReport, Follow, TimelineEntry, report_priority
+
+PASSWORD = 'password'
+
+# end of the generated period, fixed so that a seed always generates the same rows
+DEFAULT_END = datetime.date(2022, 7, 1)
+
+# relative activity per hour of the day: most of it during school hours and the evening
+HOUR_WEIGHTS = [
+    1, 0.5, 0.2, 0.1, 0.1, 0.3, 2, 5,  # 0h - 7h
+    9, 10, 10, 8, 12, 12, 9, 9,  # 8h - 15h
+    10, 11, 8, 7, 8, 7, 5, 2,  # 16h - 23h
+]
+# relative activity per day of the week, from monday
+WEEKDAY_WEIGHTS = [1, 1, 1, 0.8, 1, 0.5, 0.4]
+
+WORDS = ("crush", "lycée", "cours", "récré", "cantine", "bac", "prof", "sourire", "regard", "couloir", "CDI",
+         "soirée", "maths", "philo", "anglais", "bus", "café", "ce", "matin", "hier", "qui", "est", "la", "le",
+         "fille", "garçon", "en", "terminale", "première", "seconde", "avec", "un", "une", "pull", "rouge", "bleu")
+
+
+@contextmanager
+def explicit_timestamps(*models: type) -> Iterator[None]:
+    """ Let ``bulk_create`` keep the given dates instead of overwriting auto_now(_add) fields with now() """
+    fields = [field for model in models for field in model._meta.concrete_fields
+              if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class DatasetGenerator:
+    """ Generate users and their follows, then posts with their likes, comments and reports, batch by batch """
+
+    def __init__(self, seed: int = 0, days: int = 180, batch_size: int = 10000, likes_exponent: float = 1.3,
+                 comments_exponent: float = 1.8, follows_exponent: float = 1.5, report_ratio: float = 0.01,
+                 end: datetime.date = DEFAULT_END, log=None) -> None:
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.likes_exponent = likes_exponent
+        self.comments_exponent = comments_exponent
+        self.follows_exponent = follows_exponent
+        self.report_ratio = report_ratio
+        self.log = log or (lambda message: None)
+
+        self.end = datetime.datetime.combine(end, datetime.time(), tzinfo=datetime.timezone.utc)
+        self.start = self.end - datetime.timedelta(days=days)
+        self.day_weights = [WEEKDAY_WEIGHTS[(self.start + datetime.timedelta(days=day)).weekday()]
+                            for day in range(days)]
+
+        self.user_ids: List[int] = []
+        self.new_user_ids: List[int] = []
+        self.followers: Dict[int, List[int]] = {}  # fanned out authors -> their followers
+        self.rows: Dict[str, int] = {}
+        self.elapsed = 0.0
+
+    # distributions
+
+    def random_date(self) -> datetime.datetime:
+        """ A date of the period, with bursts during school hours on weekdays """
+        day = self.rng.choices(range(len(self.day_weights)), self.day_weights)[0]
+        hour = self.rng.choices(range(24), HOUR_WEIGHTS)[0]
+        date = self.start.replace(hour=0, minute=0, second=0, microsecond=0) + datetime.timedelta(
+                days=day, hours=hour, seconds=self.rng.randrange(3600), microseconds=self.rng.randrange(10 ** 6))
+        return min(date, self.end)
+
+    def reaction_date(self, posted_at: datetime.datetime) -> datetime.datetime:
+        """ Most reactions come in the hours following the post """
+        return min(posted_at + datetime.timedelta(hours=self.rng.expovariate(1 / 6)), self.end)
+
+    def power_law(self, exponent: float, maximum: int) -> int:
+        """ Pareto distributed count: most posts get a few reactions, a few posts get a lot """
+        return min(int(self.rng.paretovariate(exponent)) - 1, maximum)
+
+    def text(self, min_words: int, max_words: int) -> str:
+        return ' '.join(self.rng.choices(WORDS, k=self.rng.randint(min_words, max_words))).capitalize()
+
+    # generation
+
+    def next_id(self, model: type) -> int:
+        return (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+    def insert(self, model: type, objects: List[Model]) -> None:
+        start = time.perf_counter()
+        model.objects.bulk_create(objects, batch_size=self.batch_size)
+        self.elapsed += time.perf_counter() - start
+        self.rows[model._meta.model_name] = self.rows.get(model._meta.model_name, 0) + len(objects)
+
+    def generate_users(self, count: int) -> None:
+        password = make_password(PASSWORD)  # hashed once: PBKDF2 is slow on purpose
+        first_names = ("Camille", "Léa", "Hugo", "Louis", "Emma", "Jade", "Lucas", "Chloé", "Nathan", "Inès")
+        first_id = self.next_id(CustomUser)
+
+        for batch_start in range(first_id, first_id + count, self.batch_size):
+            users = []
+            for user_id in range(batch_start, min(batch_start + self.batch_size, first_id + count)):
+                users.append(CustomUser(
+                        id=user_id, username=f'user{user_id}', password=password,
+                        first_name=self.rng.choice(first_names),
+                        date_of_birth=datetime.date(self.rng.randint(2003, 2008), self.rng.randint(1, 12),
+                                                    self.rng.randint(1, 28)),
+                        date_joined=self.start - datetime.timedelta(days=self.rng.randrange(365)),
+                ))
+            with transaction.atomic(), explicit_timestamps(CustomUser):
+                self.insert(CustomUser, users)
+            self.new_user_ids.extend(user.id for user in users)
+            self.log(f"{batch_start + len(users) - first_id} users")
+
+        self.user_ids = list(CustomUser.objects.filter(is_active=True).values_list('id', flat=True))
+
+    def generate_follows(self) -> None:
+        """
+        Each generated user follows at least one active account, picked with a Zipf distribution: a few accounts
+        have many followers, like the popular ones of ``blog.timelines``.
+        """
+        accounts = self.user_ids[:]
+        self.rng.shuffle(accounts)
+        cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(accounts) + 1)))
+        followers: Dict[int, List[int]] = {}
+
+        follows = []
+        for user_id in self.new_user_ids:
+            count = 1 + self.power_law(self.follows_exponent, len(accounts) - 2)
+            for followed_id in sorted(set(self.rng.choices(accounts, cum_weights=cum_weights, k=count)) - {user_id}):
+                follows.append(Follow(follower_id=user_id, followed_id=followed_id, created_at=self.random_date()))
+                followers.setdefault(followed_id, []).append(user_id)
+
+        counts = dict(CustomUser.objects.filter(id__in=followers).values_list('id', 'followers_count'))
+        users = [CustomUser(id=user_id, followers_count=counts[user_id] + len(ids))
+                 for user_id, ids in followers.items()]
+        with transaction.atomic(), explicit_timestamps(Follow):
+            self.insert(Follow, follows)
+            CustomUser.objects.bulk_update(users, ['followers_count'], batch_size=self.batch_size)
+        # the posts of the popular accounts are merged into the feeds when they are read
+        self.followers = {user.id: followers[user.id] for user in users
+                          if user.followers_count < settings.TIMELINE_FANOUT_MAX_FOLLOWERS}
+        self.log(f"{len(follows)} follows")
+
+    def generate_posts(self, count: int) -> None:
+        if not self.user_ids:
+            self.user_ids = list(CustomUser.objects.filter(is_active=True).values_list('id', flat=True))
+
+        post_id = self.next_id(Post)
+        comment_id = self.next_id(Comment)
+        generated = 0
+
+        while generated < count:
+            posts, likes, comments, reports, timeline = [], [], [], [], []
+
+            for _ in range(min(self.batch_size, count - generated)):
+                created_at = self.random_date()
+                post = Post(id=post_id, author_id=self.rng.choice(self.user_ids), text=self.text(3, 60),
+                            is_anonymous=self.rng.random() < 0.7, created_at=created_at, updated_at=created_at)
+
+                likers = self.rng.sample(self.user_ids, self.power_law(self.likes_exponent, len(self.user_ids)))
+                likes.extend(Like(post_id=post_id, user_id=user_id, created_at=self.reaction_date(created_at))
+                             for user_id in likers)
+                post.likes_count = len(likers)
+
+                post.comments_count = self.power_law(self.comments_exponent, 500)
+                for _ in range(post.comments_count):
+                    comments.append(Comment(id=comment_id, post_id=post_id, author_id=self.rng.choice(self.user_ids),
+                                            text=self.text(1, 20), created_at=self.reaction_date(created_at)))
+                    comment_id += 1
+
+                if self.rng.random() < self.report_ratio:
+                    self.add_reports(post, reports)
+
+                if not post.is_anonymous:
+                    timeline.extend(TimelineEntry(user_id=user_id, post_id=post_id, author_id=post.author_id,
+                                                  created_at=created_at)
+                                    for user_id in self.followers.get(post.author_id, ()))
+
+                posts.append(post)
+                post_id += 1
+
+            with transaction.atomic(), explicit_timestamps(Post, Comment, Like, PostReport):
+                self.insert(Post, posts)
+                self.insert(Like, likes)
+                self.insert(Comment, comments)
+                self.insert(PostReport, reports)
+                self.insert(TimelineEntry, timeline)
+
+            generated += len(posts)
+            self.log(f"{generated} posts, {self.rows.get('like', 0)} likes, {self.rows.get('comment', 0)} comments")
+
+    def add_reports(self, post: Post, reports: List[PostReport]) -> None:
+        """ A few reports on the post, which is hidden if it reaches the limit like in ``record_report`` """
+        reporters = [user_id for user_id in self.rng.sample(self.user_ids, min(4, len(self.user_ids)))
+                     if user_id != post.author_id][:self.rng.randint(1, 4)]
+        if not reporters:
+            return
+
+        dates = sorted(self.reaction_date(post.created_at) for _ in reporters)
+        reports.extend(PostReport(post_id=post.id, user_id=user_id, created_at=date)
+                       for user_id, date in zip(reporters, dates))
+        post.reports_count = len(reporters)
+        post.first_reported_at, post.last_reported_at = dates[0], dates[-1]
+        post.report_priority = report_priority(dates)
+        if post.reports_count >= PostReport.MAX_REPORT_COUNT:
+            post.status, post.hidden_at = Post.HIDDEN, dates[-1]
+
+    @property
+    def throughput(self) -> float:
+        """ Inserted rows per second, generation time excluded """
+        return sum(self.rows.values()) / self.elapsed if self.elapsed else 0.0
+
+
+def generate_dataset(nb_users: int, nb_posts: int, seed: int = 0, **options) -> DatasetGenerator:
+    generator = DatasetGenerator(seed=seed, **options)
+    generator.generate_users(nb_users)
+    generator.generate_follows()
+    generator.generate_posts(nb_posts)
+    return generator
@@ -0,0 +1,46 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Post, Like, Comment, PostReport, Follow, add_to_post_counter
+from .timelines import follow_changed
+
+COUNTER_FIELDS = {
+    Like: 'likes_count',
+    Comment: 'comments_count',
+    PostReport: 'reports_count',
+}
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_save, sender=Comment)
+def increment_post_counter(sender, instance, created: bool, raw: bool, **kwargs) -> None:
+    if created and not raw:
+        add_to_post_counter(instance.post_id, COUNTER_FIELDS[sender], 1)
+
+
+@receiver(post_save, sender=PostReport)
+def record_report(sender, instance: PostReport, created: bool, raw: bool, **kwargs) -> None:
+    """ Count the report and hide the post if it has been reported too many times """
+    if created and not raw:
+        Post.objects.filter(pk=instance.post_id).record_report(instance.created_at)
+
+
+@receiver(post_delete, sender=Like)
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=PostReport)
+def decrement_post_counter(sender, instance, **kwargs) -> None:
+    """ Also called for each row deleted by a cascade (post or user deletion) """
+    add_to_post_counter(instance.post_id, COUNTER_FIELDS[sender], -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance: Follow, created: bool, raw: bool, **kwargs) -> None:
+    """ Follows created with the ORM (admin...), ``blog.timelines.set_following`` sends no signal """
+    if created and not raw:
+        follow_changed(instance.follower_id, instance.followed_id, True)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance: Follow, **kwargs) -> None:
+    """ Also called for each row deleted by a cascade (user deletion) """
+    follow_changed(instance.follower_id, instance.followed_id, False)
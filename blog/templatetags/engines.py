@@ -0,0 +1,19 @@
+from django import template
+from django.template import loader
+from django.template.backends.django import Template as DjangoTemplate
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def include_rendered(context: template.Context, template_name: str) -> str:
+    """
+    ``{% include %}`` of the version of the template of the first engine having it: the Jinja2 one if
+    ``JINJA2_TEMPLATES`` is set, see ``blog.jinja2env``
+    """
+    selected = loader.get_template(template_name)
+    if isinstance(selected, DjangoTemplate):
+        with context.push():
+            return selected.template.render(context)
+    return mark_safe(selected.render(context.flatten(), context.get('request')))
@@ -0,0 +1,26 @@
+from functools import lru_cache
+
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+from monodcrush.staticfiles import VENDORED_SCRIPTS
+
+register = template.Library()
+
+
+@lru_cache(maxsize=None)
+def vendored_script_url(name: str) -> str:
+    """
+    The local copy, downloaded by the vendor_static command. In development only, the pinned CDN url until it has
+    been downloaded; in production the check blog.E002 stops collectstatic without it.
+    """
+    path, cdn_url, _ = VENDORED_SCRIPTS[name]
+    return cdn_url if settings.PROFILE != 'production' and not finders.find(path) else static(path)
+
+
+@register.simple_tag
+def vendored_script(name: str) -> str:
+    return format_html('<script defer src="{}"></script>', vendored_script_url(name))
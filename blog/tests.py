@@ -1,3 +1,752 @@
-from django.test import TestCase
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import tempfile
+import threading
+import zipfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.http import Http404
+from django.template import engines
+from django.test.utils import CaptureQueriesContext
+from django.template.response import SimpleTemplateResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from auth.models import CustomUser
+from monodcrush import staticfiles
+from . import async_views
+from .admin import ApproximateCountPaginator, CappedInlineFormSet
+from .benchmark import RouteBenchmark, seed_dataset, format_failure
+from .deletion import add_progress, delete_batch, delete_user
+from .export import export_archive
+from .cache import post_card_keys
+from .live import Broker, broker, format_event, session_user_id, stream
+from .models import Comment, DailyStats, DeletionJob, Like, Post, PostReport, StatsWatermark, TimelineEntry, \
+    report_priority
+from .pagination import decode_cursor, encode_cursor, paginate_by_cursor
+from .search import filter_posts, search_users
+from .timelines import fan_out_on_commit, following_page, set_following
+
+
+def create_user(username: str, **fields) -> CustomUser:
+    return CustomUser.objects.create(username=username, date_of_birth='2000-01-01', **fields)
+
+
+class RouteQueryBudgetTests(TestCase):
+    """ Number of SQL queries of every page, the budgets are in blog/route_budgets.json """
+    namespaces = ('blog', 'about')
+
+    @classmethod
+    def setUpTestData(cls):
+        # more posts than a page of the feed, so that a query per post can't stay unnoticed
+        seed_dataset(nb_users=50, nb_posts=100)
+
+    def test_routes_within_query_budget(self):
+        report = RouteBenchmark(namespaces=self.namespaces, repeat=1).run()
+        self.assertEqual([], [format_failure(result) for result in report['failures']])
+
+
+
+class PostCounterTests(TestCase):
+    """ Denormalized counters of the posts, see blog.signals, ``set_liked`` and ``report`` """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.readers = [create_user(f'reader{index}') for index in range(PostReport.MAX_REPORT_COUNT)]
+        cls.post = Post.objects.create(author=cls.author, text="Bonjour")
+
+    def counter(self, field: str) -> int:
+        return Post.objects.filter(pk=self.post.pk).values_list(field, flat=True).get()
+
+    def test_comments_are_counted(self):
+        comments = [Comment.objects.create(post=self.post, author=reader, text="Salut") for reader in self.readers]
+        self.assertEqual(3, self.counter('comments_count'))
+
+        comments[0].delete()
+        self.assertEqual(2, self.counter('comments_count'))
+
+    def test_like_and_unlike_are_idempotent(self):
+        first, second = self.readers[:2]
+        self.assertEqual(1, Like.objects.set_liked(self.post, first, True))
+        self.assertEqual(1, Like.objects.set_liked(self.post, first, True))
+        self.assertEqual(2, Like.objects.set_liked(self.post, second, True))
+
+        self.assertEqual(1, Like.objects.set_liked(self.post, first, False))
+        self.assertEqual(1, Like.objects.set_liked(self.post, first, False))
+        self.assertEqual([second.pk], list(self.post.likes.values_list('user', flat=True)))
+
+    def test_post_is_hidden_at_the_report_threshold(self):
+        *first_readers, last_reader = self.readers
+        for reader in first_readers:
+            self.assertTrue(PostReport.objects.report(self.post, reader))
+        self.assertFalse(PostReport.objects.report(self.post, first_readers[0]))
+
+        self.post.refresh_from_db()
+        self.assertEqual((Post.NORMAl, PostReport.MAX_REPORT_COUNT - 1), (self.post.status, self.post.reports_count))
+
+        self.assertTrue(PostReport.objects.report(self.post, last_reader))
+        self.post.refresh_from_db()
+        self.assertEqual((Post.HIDDEN, PostReport.MAX_REPORT_COUNT), (self.post.status, self.post.reports_count))
+        self.assertEqual(self.post.last_reported_at, self.post.hidden_at)
+        dates = self.post.reports.order_by('created_at').values_list('created_at', flat=True)
+        self.assertAlmostEqual(report_priority(dates), self.post.report_priority)
+
+    def test_saving_a_stale_post_keeps_the_counters(self):
+        stale = Post.objects.get(pk=self.post.pk)
+        Like.objects.set_liked(self.post, self.readers[0], True)
+        Comment.objects.create(post=self.post, author=self.readers[0], text="Salut")
+
+        stale.text = "Bonjour à tous"
+        stale.save()
+        stale.hide()
+        self.assertEqual((1, 1), (self.counter('likes_count'), self.counter('comments_count')))
+
+
+    def test_reconcile_fixes_the_drifted_counters(self):
+        Comment.objects.create(post=self.post, author=self.readers[0], text="Salut")
+        Like.objects.create(post=self.post, user=self.readers[0])
+        Post.objects.filter(pk=self.post.pk).update(likes_count=7, comments_count=0)
+
+        out = io.StringIO()
+        call_command('reconcile_counters', chunk_size=1, stdout=out)
+        self.assertIn("1 post(s) fixed", out.getvalue())
+        self.assertEqual((1, 1), (self.counter('likes_count'), self.counter('comments_count')))
+
+class CursorPaginationTests(TestCase):
+    """ Keyset pagination of blog.pagination """
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        Post.objects.bulk_create([Post(author=author, text=str(index)) for index in range(7)])
+        # two posts per date: the id breaks the ties
+        now = timezone.now()
+        for index, post_id in enumerate(Post.objects.order_by('id').values_list('id', flat=True)):
+            Post.objects.filter(pk=post_id).update(created_at=now - timedelta(minutes=index // 2))
+
+    def test_cursor_round_trip(self):
+        created_at = timezone.now()
+        self.assertEqual((created_at, 42), decode_cursor(encode_cursor(created_at, 42)))
+
+    def test_invalid_cursors(self):
+        for raw in (b'', b'no separator', b'2022-06-01T12:00:00|not an id', b'not a date|42', b'\xff\xfe|1'):
+            cursor = base64.urlsafe_b64encode(raw).decode().rstrip('=')
+            with self.subTest(raw=raw), self.assertRaises(ValueError):
+                decode_cursor(cursor)
+        with self.assertRaises(ValueError):
+            decode_cursor('a')
+
+    def test_pages_follow_the_order_of_the_feed(self):
+        pages, cursor = [], None
+        while True:
+            page = paginate_by_cursor(Post.objects.all(), cursor, 3)
+            pages.append([post.pk for post in page])
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+
+        expected = list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual([expected[:3], expected[3:6], expected[6:]], pages)
+
+    def test_invalid_cursor_is_not_found(self):
+        self.assertEqual(404, self.client.get(reverse('blog:index'), {'cursor': 'invalide'}).status_code)
+
+
+class PostCardCacheTests(TestCase):
+    """ Fragments of the post cards cached between the requests, see blog.cache """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.post = Post.objects.create(author=cls.author, text="Premier texte", is_anonymous=False)
+
+    def setUp(self):
+        cache.clear()
+
+    def feed(self) -> str:
+        return self.client.get(reverse('blog:index')).content.decode()
+
+    def test_fragment_is_cached(self):
+        self.feed()
+        self.assertIsNotNone(cache.get(post_card_keys(self.post)[0]))
+
+        # an UPDATE keeping updated_at is not seen: the card comes from the cache
+        Post.objects.filter(pk=self.post.pk).update(text="Changé sans save()")
+        self.assertIn("Premier texte", self.feed())
+
+    def test_edited_post_is_rendered_again(self):
+        self.feed()
+        self.client.force_login(self.author)
+        self.client.post(reverse('blog:edit-post', kwargs={'post_id': self.post.pk}), {'text': "Texte modifié"})
+
+        self.assertIsNone(cache.get(post_card_keys(self.post)[0]))
+        feed = self.feed()
+        self.assertIn("Texte modifié", feed)
+        self.assertNotIn("Premier texte", feed)
+
+    def test_renamed_author_is_rendered_again(self):
+        self.feed()
+        CustomUser.objects.filter(pk=self.author.pk).update(username='renamed')
+
+        feed = self.feed()
+        self.assertIn("@renamed", feed)
+        self.assertNotIn("@author", feed)
+
+
+class SearchTests(TestCase):
+    """ Full-text search on the FTS5 indexes kept up to date by triggers, see blog.search """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = create_user('alice', first_name="Alice")
+        cls.bob = create_user('bob_lenon', first_name="Robert")
+        cls.post = Post.objects.create(author=cls.alice, text="Rendez-vous à la cafétéria à midi")
+        cls.bob_post = Post.objects.create(author=cls.bob, text="Qui vient ?")
+
+    def test_users_by_username_or_first_name(self):
+        self.assertEqual([self.bob], search_users('LENON'))
+        self.assertEqual([self.bob], search_users('ober'))
+        self.assertEqual([], search_users('inconnu'))
+        self.assertEqual([], search_users('   '))
+
+    def test_posts_by_text_or_author(self):
+        posts = Post.objects.order_by('id')
+        self.assertEqual([self.post], list(filter_posts(posts, 'cafét')))
+        self.assertEqual([self.bob_post], list(filter_posts(posts, 'bob_le')))
+        self.assertEqual([self.post, self.bob_post], list(filter_posts(posts, '')))
+
+    def test_index_follows_the_changes(self):
+        CustomUser.objects.filter(pk=self.alice.pk).update(first_name="Alicia")
+        Post.objects.filter(pk=self.post.pk).update(text="Rendez-vous au parc")
+        self.bob_post.delete()
+
+        self.assertEqual([self.alice], search_users('licia'))
+        self.assertEqual([], list(filter_posts(Post.objects.all(), 'cafét')))
+        self.assertEqual([], list(filter_posts(Post.objects.all(), 'vient')))
+
+    def test_short_queries_without_the_index(self):
+        self.assertEqual([self.alice], search_users('al'))
+
+
+class RollupStatsTests(TestCase):
+    """ Daily statistics of the moderation panel, added up incrementally by the rollup_stats command """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.posts = [Post.objects.create(author=cls.author, text=str(index)) for index in range(2)]
+
+    def rollup(self) -> dict:
+        call_command('rollup_stats', stdout=io.StringIO())
+        return DailyStats.objects.aggregate(**{field: Sum(field) for field in ('posts', 'users', 'hidden_posts')})
+
+    def test_new_rows_are_counted_once(self):
+        self.assertEqual({'posts': 2, 'users': 1, 'hidden_posts': 0}, self.rollup())
+        self.assertEqual(self.posts[-1].pk, StatsWatermark.objects.get(source='posts').last_id)
+        self.assertEqual({'posts': 2, 'users': 1, 'hidden_posts': 0}, self.rollup())
+
+        Post.objects.create(author=self.author, text="Nouveau")
+        self.assertEqual({'posts': 3, 'users': 1, 'hidden_posts': 0}, self.rollup())
+
+    def test_hidden_posts_are_counted_after_the_lag(self):
+        now = timezone.now()
+        Post.objects.filter(pk=self.posts[0].pk).update(status=Post.HIDDEN, hidden_at=now - timedelta(minutes=20))
+        Post.objects.filter(pk=self.posts[1].pk).update(status=Post.HIDDEN, hidden_at=now)
+        self.assertEqual(1, self.rollup()['hidden_posts'])
+        self.assertEqual(1, self.rollup()['hidden_posts'])
+
+        # ten minutes later
+        StatsWatermark.objects.filter(source='hidden_posts').update(last_date=F('last_date') - timedelta(minutes=10))
+        Post.objects.filter(pk=self.posts[1].pk).update(hidden_at=now - timedelta(minutes=10))
+        self.assertEqual(2, self.rollup()['hidden_posts'])
+
+    def test_moderation_panel_shows_the_rollups(self):
+        self.rollup()
+        self.client.force_login(CustomUser.objects.create(username='admin', date_of_birth='2000-01-01',
+                                                          is_superuser=True))
+        response = self.client.get(reverse('blog:moderation'))
+        self.assertEqual(2, response.context['nb_posts'])
+
+
+class CommentThreadTests(TestCase):
+    """ Comment threads loaded by pages of PostCommentView.paginate_by, newest first """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.post = Post.objects.create(author=cls.author, text="Post")
+        cls.comments = [Comment.objects.create(post=cls.post, author=cls.author, text=f"commentaire {index}")
+                        for index in range(25)]
+        cls.url = reverse('blog:comment-post', kwargs={'post_id': cls.post.id})
+
+    def test_thread_is_loaded_by_pages(self):
+        response = self.client.get(self.url)
+        first_page = response.context['comments']
+        self.assertEqual(self.comments[:-21:-1], list(first_page))
+        self.assertContains(response, f'?cursor={first_page.next_cursor}')
+
+        response = self.client.get(self.url, {'cursor': first_page.next_cursor})
+        self.assertTemplateNotUsed(response, 'blog/partials/rep.html')
+        self.assertEqual(self.comments[4::-1], list(response.context['comments']))
+        self.assertNotContains(response, 'Voir plus de commentaires')
+
+    def test_invalid_cursor(self):
+        self.assertEqual(404, self.client.get(self.url, {'cursor': 'invalide'}).status_code)
+
+    def test_new_comment_is_rendered_alone(self):
+        self.assertEqual(401, self.client.post(self.url, {'comment': "Anonyme"}).status_code)
+
+        self.client.force_login(create_user('reader'))
+        response = self.client.post(self.url, {'comment': "Nouveau commentaire"})
+        self.assertTemplateUsed(response, 'blog/partials/new-comment.html')
+        self.assertContains(response, "Nouveau commentaire")
+        self.assertNotContains(response, "commentaire 24")
+        self.assertContains(response, f'id="nb-of-comment-{self.post.id}" hx-swap-oob="true">26 commentaires')
+
+
+class ReportQueueTests(TestCase):
+    """ Moderation queue ordered by the decayed count of reports stored in Post.report_priority """
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        now = timezone.now()
+        cls.old, cls.single, cls.burst = [Post.objects.create(author=author, text=name)
+                                          for name in ('old', 'single', 'burst')]
+        for post, dates in ((cls.old, [now - timedelta(days=3, hours=hours) for hours in (2, 1, 0)]),
+                            (cls.single, [now - timedelta(hours=1)]),
+                            (cls.burst, [now - timedelta(minutes=minutes) for minutes in (20, 10)])):
+            for date in dates:
+                Post.objects.filter(pk=post.pk).record_report(date)
+        Post.objects.create(author=author, text="never reported")
+        cls.admin = create_user('admin', is_superuser=True)
+
+    def test_queue_is_ordered_by_report_velocity(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('blog:moderation-queue'))
+        self.assertEqual([self.burst, self.single, self.old], list(response.context['posts']))
+
+    def test_queue_pages(self):
+        first_page = paginate_by_cursor(Post.objects.report_queue(), None, 2, date_field='report_priority')
+        self.assertEqual([self.burst, self.single], list(first_page))
+        next_page = paginate_by_cursor(Post.objects.report_queue(), first_page.next_cursor, 2,
+                                       date_field='report_priority')
+        self.assertEqual([self.old], list(next_page))
+
+
+class AsyncViewTests(TransactionTestCase):
+    """ Sync views run and rendered in the thread pool by blog.async_views, the other threads need committed rows """
+
+    def test_view_is_rendered_out_of_the_event_loop(self):
+        threads = {}
+
+        def view(request, name):
+            threads['view'] = threading.get_ident()
+            return SimpleTemplateResponse(engines['django'].from_string("Bonjour {{ name }}"), {'name': name})
+
+        async def request_in_loop():
+            threads['loop'] = threading.get_ident()
+            return await async_view(RequestFactory().get('/'), name="Alice")
+
+        async_view = async_views.as_async_view(view)
+        self.assertTrue(asyncio.iscoroutinefunction(async_view))
+        self.assertEqual('view', async_view.__name__)
+
+        response = async_to_sync(request_in_loop)()
+        self.assertTrue(response.is_rendered)
+        self.assertEqual(b"Bonjour Alice", response.content)
+        self.assertNotEqual(threads['loop'], threads['view'])
+
+    def test_post_list(self):
+        Post.objects.create(author=create_user('author'), text="Premier post")
+        request = RequestFactory().get(reverse('blog:index'))
+        request.user = AnonymousUser()
+
+        response = async_to_sync(async_views.post_list)(request)
+        self.assertEqual(200, response.status_code)
+        self.assertContains(response, "Premier post")
+
+
+class StaticFilesTests(SimpleTestCase):
+    """ Precompressed static files sent by monodcrush.staticfiles.serve, vendored scripts checked by vendor_static """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        for name, content in (('app.0123456789ab.js', b'js'), ('app.0123456789ab.js.gz', b'gzip'),
+                              ('app.0123456789ab.js.br', b'brotli'), ('style.css', b'css'),
+                              ('style.css.gz', b'gzip')):
+            (self.root / name).write_bytes(content)
+
+        settings_override = override_settings(STATIC_ROOT=str(self.root))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def serve(self, path: str, **headers):
+        return staticfiles.serve(RequestFactory().get(f'/static/{path}', **headers), path)
+
+    def test_accepted_encodings(self):
+        def accepted(header: str) -> set:
+            return staticfiles.accepted_encodings(RequestFactory().get('/', HTTP_ACCEPT_ENCODING=header))
+
+        self.assertEqual({'gzip', 'deflate', 'br'}, accepted('gzip, deflate, br'))
+        self.assertEqual({'gzip'}, accepted('br;q=0, GZIP;q=0.5'))
+        self.assertEqual({'*', 'br', 'gzip'}, accepted('*'))
+        self.assertEqual({'identity'}, accepted('gzip;q=invalid, identity'))
+        self.assertEqual(set(), staticfiles.accepted_encodings(RequestFactory().get('/')))
+
+    def test_smallest_accepted_variant_is_served(self):
+        for header, encoding, content in (('gzip, br', 'br', b'brotli'), ('gzip, br;q=0', 'gzip', b'gzip'),
+                                          ('deflate', None, b'js')):
+            with self.subTest(header):
+                response = self.serve('app.0123456789ab.js', HTTP_ACCEPT_ENCODING=header)
+                self.assertEqual(encoding, response.headers.get('Content-Encoding'))
+                self.assertEqual(content, b''.join(response.streaming_content))
+                self.assertEqual('text/javascript', response.headers['Content-Type'])
+                self.assertEqual('Accept-Encoding', response.headers['Vary'])
+                self.assertEqual(staticfiles.IMMUTABLE, response.headers['Cache-Control'])
+
+        response = self.serve('style.css', HTTP_ACCEPT_ENCODING='br, gzip')
+        self.assertEqual('gzip', response.headers['Content-Encoding'])
+        self.assertEqual(staticfiles.REVALIDATE, response.headers['Cache-Control'])
+        response.close()
+
+    def test_not_modified(self):
+        modified = (self.root / 'style.css.gz').stat().st_mtime
+        response = self.serve('style.css', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_MODIFIED_SINCE=http_date(modified))
+        self.assertEqual(304, response.status_code)
+
+    def test_missing_or_outside_files(self):
+        for path in ('missing.js', '../secret.txt', '.'):
+            with self.subTest(path), self.assertRaises(Http404):
+                self.serve(path)
+
+    def test_vendored_script_must_match_its_pin(self):
+        path = 'scripts/vendor/library.js'
+        (self.root / 'scripts' / 'vendor').mkdir(parents=True)
+        (self.root / path).write_bytes(b'library')
+
+        with override_settings(STATICFILES_DIRS=[str(self.root)]):
+            with mock.patch.dict(staticfiles.VENDORED_SCRIPTS, {'library': (path, 'https://cdn/library.js', None)},
+                                 clear=True), self.assertRaisesMessage(CommandError, "No sha256 pinned for library"):
+                call_command('vendor_static', stdout=io.StringIO())
+
+            with mock.patch.dict(staticfiles.VENDORED_SCRIPTS, {'library': (path, 'https://cdn/library.js', '0' * 64)},
+                                 clear=True), self.assertRaisesMessage(CommandError, "does not match"):
+                call_command('vendor_static', stdout=io.StringIO())
+
+            digest = hashlib.sha256(b'library').hexdigest()
+            with mock.patch.dict(staticfiles.VENDORED_SCRIPTS, {'library': (path, 'https://cdn/library.js', digest)},
+                                 clear=True):
+                out = io.StringIO()
+                call_command('vendor_static', stdout=out)
+                self.assertIn("library: scripts/vendor/library.js already present", out.getvalue())
+
+
+@override_settings(BACKGROUND_WORKERS=0, TIMELINE_FANOUT_MAX_FOLLOWERS=2)
+class FollowingFeedTests(TestCase):
+    """ Follows, fan-out of the new posts to the timelines and merge of the popular accounts, see blog.timelines """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user('reader')
+        cls.friend = create_user('friend')
+        cls.star = create_user('star')
+
+    def follow(self, follower: CustomUser, followed: CustomUser, following: bool = True) -> bool:
+        with self.captureOnCommitCallbacks(execute=True):
+            return set_following(follower, followed, following)
+
+    def publish(self, author: CustomUser, text: str, is_anonymous: bool = False) -> Post:
+        author.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(author=author, text=text, is_anonymous=is_anonymous)
+            fan_out_on_commit(post)
+        return post
+
+    def timeline(self) -> list:
+        return list(TimelineEntry.objects.filter(user=self.reader).order_by('-created_at')
+                    .values_list('post', flat=True))
+
+    def test_follow_and_unfollow_are_idempotent(self):
+        self.assertTrue(self.follow(self.reader, self.friend))
+        self.assertFalse(self.follow(self.reader, self.friend))
+        self.friend.refresh_from_db()
+        self.assertEqual(1, self.friend.followers_count)
+
+        self.assertTrue(self.follow(self.reader, self.friend, False))
+        self.assertFalse(self.follow(self.reader, self.friend, False))
+        self.friend.refresh_from_db()
+        self.assertEqual(0, self.friend.followers_count)
+
+    def test_signed_posts_are_fanned_out(self):
+        self.follow(self.reader, self.friend)
+        post = self.publish(self.friend, "Signé")
+        self.publish(self.friend, "Anonyme", is_anonymous=True)
+        self.assertEqual([post.pk], self.timeline())
+
+    def test_timeline_backfilled_and_cleared(self):
+        post = self.publish(self.friend, "Avant le follow")
+        self.follow(self.reader, self.friend)
+        self.assertEqual([post.pk], self.timeline())
+
+        self.follow(self.reader, self.friend, False)
+        self.assertEqual([], self.timeline())
+
+    def test_popular_accounts_are_merged_when_read(self):
+        self.follow(self.reader, self.friend)
+        self.follow(self.reader, self.star)
+        self.follow(self.friend, self.star)  # TIMELINE_FANOUT_MAX_FOLLOWERS: the star is popular now
+
+        posts = [self.publish(self.friend, "1"), self.publish(self.star, "2"), self.publish(self.friend, "3")]
+        self.assertEqual([posts[2].pk, posts[0].pk], self.timeline())
+
+        first = following_page(self.reader, None, 2)
+        self.assertEqual([posts[2], posts[1]], list(first))
+        second = following_page(self.reader, first.next_cursor, 2)
+        self.assertEqual(([posts[0]], False), (list(second), second.has_next()))
+
+    def test_reconcile_fixes_the_drifted_followers_counts(self):
+        self.follow(self.reader, self.star)
+        self.follow(self.friend, self.star)
+        CustomUser.objects.filter(pk=self.star.pk).update(followers_count=5)
+        CustomUser.objects.filter(pk=self.friend.pk).update(followers_count=1)
+
+        out = io.StringIO()
+        call_command('reconcile_counters', chunk_size=1, stdout=out)
+        self.assertIn("2 user(s) fixed", out.getvalue())
+        self.assertEqual([2, 0], [CustomUser.objects.get(pk=user.pk).followers_count
+                                  for user in (self.star, self.friend)])
+
+
+def like_count(post_id: int, likes: int) -> tuple:
+    return 'blog/components/post-like-count.html', {'post': {'id': post_id, 'nb_of_likes': likes}, 'oob': True}
+
+
+@override_settings(LIVE_UPDATES_DEBOUNCE=60)
+class LiveUpdatesTests(TransactionTestCase):
+    """ Broker of blog.live and its SSE endpoint, the session is read from another thread: the rows are committed """
+
+    def test_updates_are_merged_by_key(self):
+        async def publish_and_flush() -> list:
+            live = Broker()
+            reader, author = live.subscribe(1), live.subscribe(2)
+            live.publish(('likes', 1), *like_count(1, 1))
+            live.publish(('likes', 1), *like_count(1, 2))
+            live.publish(('likes', 2), *like_count(2, 5), excluded_user_id=2)
+            live.timer.cancel()
+            live.flush()
+            await asyncio.sleep(0)
+
+            messages = [reader.queue.get_nowait(), author.queue.get_nowait()]
+            live.unsubscribe(reader)
+            live.unsubscribe(author)
+            # nobody is listening anymore
+            live.publish(('likes', 1), *like_count(1, 3), excluded_user_id=2)
+            self.assertEqual(({}, None), (live.pending, live.timer))
+            return messages
+
+        reader_message, author_message = async_to_sync(publish_and_flush)()
+        self.assertIn('id="like-count-1" hx-swap-oob="true">2</span>', reader_message)
+        self.assertNotIn('>1</span>', reader_message)
+        self.assertIn('id="like-count-2" hx-swap-oob="true">5</span>', reader_message)
+        self.assertNotIn('like-count-2', author_message)
+
+    def test_session_user(self):
+        user = create_user('reader')
+        self.client.force_login(user)
+        session_key = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.assertEqual(user.pk, session_user_id({settings.SESSION_COOKIE_NAME: session_key}))
+        self.assertIsNone(session_user_id({settings.SESSION_COOKIE_NAME: 'inconnue'}))
+        self.assertIsNone(session_user_id({}))
+
+    def test_stream(self):
+        author = create_user('author')
+        self.client.force_login(author)
+        cookie = f'{settings.SESSION_COOKIE_NAME}={self.client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+        async def connect(method: str = 'GET') -> list:
+            sent, received = [], asyncio.Queue()
+
+            async def send(message: dict) -> None:
+                sent.append(message)
+
+            connection = asyncio.ensure_future(stream({'type': 'http', 'method': method, 'path': '/live',
+                                                       'headers': [(b'cookie', cookie.encode())]},
+                                                      received.get, send))
+            if method == 'GET':
+                while not broker.subscribers:
+                    await asyncio.sleep(0.01)
+                self.assertEqual([author.pk], [subscriber.user_id for subscriber in broker.subscribers])
+                broker.publish(('likes', 1), *like_count(1, 4))
+                broker.publish(('comment', 1), *like_count(2, 1), excluded_user_id=author.pk)
+                broker.timer.cancel()
+                broker.flush()
+                await asyncio.sleep(0.01)
+                await received.put({'type': 'http.disconnect'})
+            await asyncio.wait_for(connection, timeout=5)
+            return sent
+
+        start, connected, update = async_to_sync(connect)()
+        self.assertEqual(200, start['status'])
+        self.assertIn((b'content-type', b'text/event-stream'), start['headers'])
+        self.assertEqual(b': connected\n\n', connected['body'])
+        html = '<span class="mr-2 " id="like-count-1" hx-swap-oob="true">4</span>'
+        self.assertEqual(format_event(html), update['body'])
+        self.assertEqual(set(), broker.subscribers)
+
+        start, body = async_to_sync(connect)('POST')
+        self.assertEqual(405, start['status'])
+
+
+class AdminTests(TestCase):
+    """ Changelists and change pages of the big tables, see blog.admin """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_user('admin', is_staff=True, is_superuser=True)
+        cls.readers = [create_user(f'reader{index}') for index in range(CappedInlineFormSet.max_rows + 5)]
+        cls.posts = [Post.objects.create(author=cls.admin, text=str(index)) for index in range(2)]
+        for post, readers in zip(cls.posts, (cls.readers[:3], cls.readers)):
+            for reader in readers:
+                Like.objects.create(post=post, user=reader)
+                Comment.objects.create(post=post, author=reader, text="Salut")
+
+    def test_approximate_count(self):
+        comments = Comment.objects.order_by('-id')
+        Comment.objects.filter(pk=comments.last().pk).delete()
+        # the largest id, the deleted rows are still counted
+        self.assertEqual(comments.first().pk, ApproximateCountPaginator(comments, 10).count)
+
+        filtered = comments.filter(post=self.posts[1])
+        self.assertEqual(len(self.readers), ApproximateCountPaginator(filtered, 10).count)
+        with mock.patch.object(ApproximateCountPaginator, 'MAX_COUNT', 10):
+            self.assertEqual(10, ApproximateCountPaginator(filtered, 10).count)
+
+    def change_post(self, post: Post) -> tuple:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:blog_post_change', args=[post.pk]))
+        self.assertEqual(200, response.status_code)
+        rows = {inline.formset.model: len(inline.formset.forms) for inline in response.context['inline_admin_formsets']}
+        return rows, len(queries)
+
+    def test_inlines_are_capped(self):
+        self.client.force_login(self.admin)
+        self.change_post(self.posts[0])  # the session and the permissions are cached by the first request
+        few, few_queries = self.change_post(self.posts[0])
+        many, many_queries = self.change_post(self.posts[1])
+
+        self.assertEqual({Comment: 3, Like: 3, PostReport: 0}, few)
+        self.assertEqual({Comment: CappedInlineFormSet.max_rows, Like: CappedInlineFormSet.max_rows, PostReport: 0},
+                         many)
+        # neither a query per row nor per post of the rows
+        self.assertEqual(few_queries, many_queries)
+        self.assertContains(self.client.get(reverse('admin:blog_post_change', args=[self.posts[1].pk])),
+                            f'?post__id__exact={self.posts[1].pk}">{len(self.readers)} (voir tout)</a>')
+
+
+class ExportTests(TestCase):
+    """ Personal data archive of blog.export """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('exported', email='exported@example.com')
+        cls.other = create_user('other')
+
+    def test_archive_has_the_data_of_the_user_only(self):
+        post = Post.objects.create(author=self.user, text="Mon post")
+        other_post = Post.objects.create(author=self.other, text="Pas le mien")
+        Comment.objects.create(post=other_post, author=self.user, text="Mon commentaire")
+        Comment.objects.create(post=post, author=self.other, text="Pas le mien")
+        Like.objects.set_liked(other_post, self.user, True)
+        Like.objects.set_liked(post, self.other, True)
+        set_following(self.user, self.other, True)
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(export_archive(self.user))))
+
+        def rows(name: str) -> list:
+            return [json.loads(line) for line in archive.read(name).decode().splitlines()]
+
+        profile, = rows('profile.ndjson')
+        self.assertEqual(('exported', 'exported@example.com'), (profile['username'], profile['email']))
+        self.assertNotIn('password', profile)
+        self.assertEqual([(post.pk, 1)], [(row['id'], row['likes_count']) for row in rows('posts.ndjson')])
+        self.assertEqual(["Mon commentaire"], [row['text'] for row in rows('comments.ndjson')])
+        self.assertEqual([other_post.pk], [row['post_id'] for row in rows('likes.ndjson')])
+        self.assertEqual([], rows('reports.ndjson'))
+        self.assertEqual(['other'], [row['username'] for row in rows('following.ndjson')])
+        # streamed files of unknown size: ZIP64 from the start
+        self.assertEqual({zipfile.ZIP64_VERSION}, {info.extract_version for info in archive.infolist()})
+
+    def test_only_the_user_can_export(self):
+        url = reverse('blog:export-profile', kwargs={'username': self.user.username})
+        self.client.force_login(self.other)
+        self.assertEqual(403, self.client.get(url).status_code)
+
+        self.client.force_login(self.user)
+        response = self.client.get(url)
+        self.assertEqual('application/zip', response['Content-Type'])
+        self.assertIn('profile.ndjson', zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))).namelist())
+
+
+@override_settings(BACKGROUND_WORKERS=0, DELETION_BATCH_SIZE=2)
+class DeletionTests(TestCase):
+    """ Deletion of the users by batches, resumed from where it stopped, see blog.deletion """
+
+    def test_interrupted_deletion_resumes_where_it_stopped(self):
+        user, other, third = create_user('leaving'), create_user('other'), create_user('third')
+        posts = [Post.objects.create(author=other, text=str(index)) for index in range(3)]
+        for post in posts:
+            Like.objects.set_liked(post, user, True)
+            Like.objects.set_liked(post, third, True)
+        Comment.objects.create(post=posts[0], author=user, text="Au revoir")
+        own_post = Post.objects.create(author=user, text="Le mien")
+        Comment.objects.create(post=own_post, author=third, text="Salut")
+
+        job = delete_user(user)  # run once committed, never in a TestCase
+        self.assertFalse(CustomUser.objects.get(pk=user.pk).is_active)
+
+        # stopped after the first batch of likes
+        with transaction.atomic():
+            add_progress(job, 'likes', delete_batch(Like.objects.filter(user=user), ('post', Post, 'likes_count')))
+        DeletionJob.objects.filter(pk=job.pk).update(status=DeletionJob.FAILED)
+
+        call_command('resume_deletions', stdout=io.StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(DeletionJob.DONE, job.status)
+        self.assertEqual(3, job.progress['likes'])
+        self.assertFalse(CustomUser.objects.filter(pk=user.pk).exists())
+        self.assertFalse(Post.objects.filter(pk=own_post.pk).exists())
+        self.assertFalse(Comment.objects.filter(author=third).exists())
+        # each like taken out of the counters once
+        self.assertEqual([(1, 0), (1, 0), (1, 0)], list(Post.objects.filter(author=other).order_by('id')
+                                                         .values_list('likes_count', 'comments_count')))
+
+    def test_deactivated_user_is_hidden_while_purged(self):
+        user, reader = create_user('leaving', first_name='Partant'), create_user('reader')
+        post = Post.objects.create(author=user, text="Bientôt supprimé", is_anonymous=False)
+        delete_user(user)
+
+        self.assertFalse(Post.objects.public().filter(pk=post.pk).exists())
+        self.assertEqual([], search_users('Partant'))
+        self.assertEqual(404, self.client.get(reverse('blog:profile', kwargs={'username': user.username})).status_code)
+        self.client.force_login(reader)
+        self.assertNotContains(self.client.get(reverse('blog:index')), "Bientôt supprimé")
 
-# Create your tests here.
@@ -0,0 +1,133 @@
+"""
+Follows and following feeds, with fan-out on write.
+
+When a user publishes a signed post, it is written in the timeline (``TimelineEntry``) of each of their followers,
+by batches, in a background task. Reading the following feed is then a range scan of the index of the timeline
+of the reader instead of a join between the follows and the posts.
+
+The posts of the popular accounts (``TIMELINE_FANOUT_MAX_FOLLOWERS`` followers or more) would have to be written
+in too many timelines: they are not fanned out but merged into the feed when it is read, from the last posts of
+the few popular accounts the reader follows.
+
+The anonymous posts are never in a timeline, they would reveal their author.
+"""
+from typing import Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from auth.models import CustomUser
+from monodcrush.background import submit_on_commit
+from .models import Follow, Post, TimelineEntry, delete_rows, insert_or_ignore
+from .pagination import CursorPage, encode_cursor, paginate_by_cursor
+
+
+def is_popular(followers_count: int) -> bool:
+    return followers_count >= settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+
+
+def add_to_followers_count(user_id: int, delta: int) -> None:
+    CustomUser.objects.filter(pk=user_id).update(followers_count=Greatest(F('followers_count') + delta, 0))
+
+
+def set_following(follower: CustomUser, followed: CustomUser, following: bool) -> bool:
+    """
+    Follow or unfollow the user in one statement, like ``LikeQuerySet.set_liked``. Return True if it has changed
+    anything: the counter and the timeline are only updated then.
+    """
+    with transaction.atomic():
+        if following:
+            changed = insert_or_ignore(Follow, follower=follower.pk, followed=followed.pk, created_at=timezone.now())
+        else:
+            changed = delete_rows(Follow, follower=follower.pk, followed=followed.pk) > 0
+
+        if changed:
+            follow_changed(follower.pk, followed.pk, following)
+    return changed
+
+
+def follow_changed(follower_id: int, followed_id: int, following: bool) -> None:
+    """ Update the counter of the followed user, and the timeline of the follower once committed """
+    add_to_followers_count(followed_id, 1 if following else -1)
+    submit_on_commit(backfill_timeline if following else clear_timeline, follower_id, followed_id)
+
+
+def fan_out_on_commit(post: Post) -> None:
+    """ Write the new post in the timelines of the followers of its author once it is committed """
+    if not post.is_anonymous and not is_popular(post.author.followers_count):
+        submit_on_commit(fan_out_post, post.pk)
+
+
+def fan_out_post(post_id: int) -> None:
+    """ Add the post to the timeline of each follower of its author, by batches of short transactions """
+    post = Post.objects.filter(pk=post_id, status__in=Post.PUBLIC, is_anonymous=False) \
+        .values('author_id', 'created_at').first()
+    if post is None:
+        return
+
+    followers = Follow.objects.filter(followed=post['author_id']).order_by('follower')
+    last_follower = 0
+    while True:
+        batch = list(followers.filter(follower__gt=last_follower)
+                     .values_list('follower', flat=True)[:settings.TIMELINE_FANOUT_BATCH_SIZE])
+        if not batch:
+            return
+
+        TimelineEntry.objects.bulk_create(
+                [TimelineEntry(user_id=follower, post_id=post_id, **post) for follower in batch],
+                ignore_conflicts=True)
+        last_follower = batch[-1]
+
+
+def backfill_timeline(follower_id: int, followed_id: int) -> None:
+    """ Add the last posts of a newly followed account to the timeline, unless they are merged at read time """
+    followed = CustomUser.objects.filter(pk=followed_id).values('followers_count').first()
+    if followed is None or is_popular(followed['followers_count']):
+        return
+
+    posts = Post.objects.public().filter(author=followed_id, is_anonymous=False) \
+        .values_list('id', 'created_at')[:settings.TIMELINE_BACKFILL]
+    TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=follower_id, post_id=post_id, author_id=followed_id, created_at=created_at)
+             for post_id, created_at in posts],
+            ignore_conflicts=True)
+
+
+def clear_timeline(follower_id: int, followed_id: int) -> None:
+    """ Remove the posts of an unfollowed account from the timeline """
+    if not Follow.objects.filter(follower=follower_id, followed=followed_id).exists():  # followed again meanwhile
+        TimelineEntry.objects.filter(user=follower_id, author=followed_id).delete()
+
+
+def following_page(user: CustomUser, cursor: Optional[str], page_size: int) -> CursorPage:
+    """
+    Page of the posts of the accounts followed by the user, newest first: the page of the timeline of the user
+    merged with the page of the posts of the popular accounts they follow. Raise ``ValueError`` for an invalid
+    cursor.
+    """
+    entries = paginate_by_cursor(TimelineEntry.objects.filter(user=user).only('post_id', 'created_at'),
+                                 cursor, page_size, id_field='post_id')
+    candidates = {(entry.created_at, entry.post_id) for entry in entries}
+    has_next = entries.has_next()
+
+    popular = list(Follow.objects.filter(follower=user,
+                                         followed__followers_count__gte=settings.TIMELINE_FANOUT_MAX_FOLLOWERS)
+                   .values_list('followed', flat=True))
+    if popular:
+        merged = paginate_by_cursor(Post.objects.public().filter(author__in=popular, is_anonymous=False)
+                                    .only('id', 'created_at'), cursor, page_size)
+        # a post may be in both if its author has become popular since
+        candidates.update((post.created_at, post.id) for post in merged)
+        has_next = has_next or merged.has_next()
+
+    candidates = sorted(candidates, reverse=True)
+    has_next = has_next or len(candidates) > page_size
+    candidates = candidates[:page_size]
+
+    # the hidden and deleted posts stay in the timelines, they are filtered out here
+    posts = Post.objects.public().filter(id__in=[post_id for _, post_id in candidates]).for_viewer(user).in_bulk()
+    return CursorPage([posts[post_id] for _, post_id in candidates if post_id in posts],
+                      encode_cursor(*candidates[-1]) if has_next and candidates else None)
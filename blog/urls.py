@@ -1,29 +1,46 @@
+from django.conf import settings
 from django.urls import path
 
-from .views import PostCreateView, PostEditView, PostListView, PostDeleteView, PostCommentView, PostLikeView, \
-    ProfileView, ProfileEditView, ProfileDeleteView, ProfilSearchView, \
-    ProfileStarView, PostReportView, PostHideView, ModerationView
+from . import async_views
+from .views import PostCreateView, PostEditView, PostListView, PostFeedView, PostDeleteView, PostCommentView, PostLikeView, \
+    NewPostsView, FollowingListView, FollowingFeedView, \
+    ProfileView, ProfileEditView, ProfileDeleteView, ProfileExportView, ProfilSearchView, \
+    ProfileStarView, PostReportView, PostHideView, ModerationView, ReportQueueView
 
 from .views import test
 
 app_name = 'blog'
 
+if settings.ASYNC_VIEWS:
+    post_list, post_feed, post_comment, post_like, profile_search = (
+        async_views.post_list, async_views.post_feed, async_views.post_comment, async_views.post_like,
+        async_views.profile_search)
+else:
+    post_list, post_feed, post_comment, post_like, profile_search = (
+        PostListView.as_view(), PostFeedView.as_view(), PostCommentView.as_view(), PostLikeView.as_view(),
+        ProfilSearchView.as_view())
+
 urlpatterns = [
-    path('', PostListView.as_view(), name='index'),
+    path('', post_list, name='index'),
+    path('feed', post_feed, name='feed'),
+    path('feed/new', NewPostsView.as_view(), name='new-posts'),
+    path('following', FollowingListView.as_view(), name='following'),
+    path('following/feed', FollowingFeedView.as_view(), name='following-feed'),
 
     path('post/new', PostCreateView.as_view(), name='new-post'),
     path('post/<int:post_id>/edit', PostEditView.as_view(), name='edit-post'),
     path('post/<int:post_id>/delete', PostDeleteView.as_view(), name='delete-post'),
-    path('post/<int:post_id>/comment', PostCommentView.as_view(), name='comment-post'),
-    path('post/<int:post_id>/like', PostLikeView.as_view(), name='like-post'),
+    path('post/<int:post_id>/comment', post_comment, name='comment-post'),
+    path('post/<int:post_id>/like', post_like, name='like-post'),
     path('post/<int:post_id>/report', PostReportView.as_view(), name='report-post'),
     path('post/<int:post_id>/hide', PostHideView.as_view(), name='hide-post'),
 
     path('user/<str:username>', ProfileView.as_view(), name='profile'),
     path('user/<str:username>/edit', ProfileEditView.as_view(), name='edit-profile'),
     path('user/<str:username>/delete', ProfileDeleteView.as_view(), name='delete-profile'),
+    path('user/<str:username>/export', ProfileExportView.as_view(), name='export-profile'),
     path('user/<str:username>/star', ProfileStarView.as_view(), name='start-profile'),
-    path("search", ProfilSearchView.as_view(), name="search"),
+    path("search", profile_search, name="search"),
 
     path('comment/<int:comment_id>/delete', PostCommentView.as_view(), name='delete-comment'),
     path('comment/<int:comment_id>/like', PostLikeView.as_view(), name='like-comment'),
@@ -31,5 +48,6 @@ urlpatterns = [
     path('comment/<int:comment_id>/hide', PostHideView.as_view(), name='hide-comment'),
 
     path('moderation', ModerationView.as_view(), name='moderation'),
+    path('moderation/reports', ReportQueueView.as_view(), name='moderation-queue'),
 
 ]
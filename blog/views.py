@@ -1,18 +1,28 @@
 import logging
+from typing import List
 
+from django.contrib.auth import logout
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.core.exceptions import PermissionDenied
-from django.db.models import QuerySet, Q
-from django.http import HttpResponseRedirect, HttpResponse, HttpRequest
+from django.db.models import Q, QuerySet, Sum, Max, Exists, OuterRef, Value, BooleanField
+from django.http import HttpResponseRedirect, HttpResponse, HttpRequest, Http404, StreamingHttpResponse
 from django.shortcuts import render
 from django.urls import reverse_lazy
+from django.utils.cache import add_never_cache_headers
 from django.views import View
 from django.views.generic import CreateView, UpdateView, ListView, DetailView
 from django.views.generic.detail import SingleObjectMixin
 from django.views.generic.edit import DeletionMixin
 
 from auth.models import CustomUser
-from .models import Comment, Post, PostReport, Like
+from .cache import invalidate_post_card
+from .deletion import delete_post, delete_user
+from .export import export_archive, export_filename
+from .live import comment_added, likes_changed, live_updates_url, post_published
+from .models import Comment, Post, PostReport, Like, Follow, DailyStats, StatsWatermark
+from .pagination import CursorPaginationMixin, decode_cursor, encode_cursor, paginate_by_cursor
+from .search import search_users
+from .timelines import fan_out_on_commit, following_page, set_following
 
 log = logging.getLogger(__name__)
 
@@ -27,19 +37,75 @@ class PostMixin:
     slug_field = 'id'
 
 
-class PostListView(ListView):
+class PostListView(CursorPaginationMixin, ListView):
     model = Post
     template_name = 'blog/index.html'
     context_object_name = 'posts'
+    # next pages, loaded by htmx
+    feed_url = reverse_lazy('blog:feed')
 
     paginate_by = 30
 
     def get_queryset(self) -> QuerySet[Post]:
-        posts = Post.objects.filter(status__in=Post.PUBLIC).order_by('-created_at')
-        if self.request.user.is_authenticated:
-            for post in posts:
-                post.liked = post.likes.filter(user=self.request.user).exists()
-        return posts
+        """ The cursor pagination adds a LIMIT, so the viewer state is only computed for the current page. """
+        return Post.objects.public().for_viewer(self.request.user)
+
+    def get_context_data(self, **kwargs) -> dict:
+        """ ``latest_cursor``: where the posts announced by the live updates start (see NewPostsView) """
+        context = super().get_context_data(feed_url=self.feed_url, live_updates_url=live_updates_url(), **kwargs)
+        posts = context['object_list']
+        context['latest_cursor'] = (encode_cursor(posts[0].created_at, posts[0].id) if posts
+                                    else self.request.GET.get('since', ''))
+        return context
+
+
+class PostFeedView(PostListView):
+    """ Next posts of the feed, loaded by htmx when the end of the page is revealed """
+    template_name = 'blog/partials/post-feed.html'
+
+
+class NewPostsView(PostListView):
+    """
+    Posts published after ``since``, the cursor of the post at the top of the page, loaded by htmx when the live
+    updates announce new posts. The page is reloaded instead if there are too many to fill the gap.
+    """
+    template_name = 'blog/partials/new-posts.html'
+
+    def paginate_queryset(self, queryset: QuerySet, page_size: int) -> tuple:
+        since = self.request.GET.get('since')
+        if since:
+            try:
+                created_at, pk = decode_cursor(since)
+            except ValueError:
+                raise Http404("Page invalide")
+            queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+
+        posts = list(queryset.order_by('-created_at', '-id')[:page_size + 1])
+        return None, None, posts, len(posts) > page_size
+
+    def render_to_response(self, context: dict, **kwargs) -> HttpResponse:
+        if context['is_paginated']:
+            return HttpResponse(headers={'HX-Refresh': 'true'})
+        return super().render_to_response(context, **kwargs)
+
+
+class FollowingListView(LoginRequiredMixin, PostListView):
+    """ Posts of the accounts followed by the user, read from their timeline (see blog.timelines) """
+    feed_url = reverse_lazy('blog:following-feed')
+
+    def get_queryset(self) -> QuerySet[Post]:
+        return Post.objects.none()
+
+    def paginate_queryset(self, queryset: QuerySet, page_size: int) -> tuple:
+        try:
+            page = following_page(self.request.user, self.request.GET.get(self.cursor_kwarg), page_size)
+        except ValueError:
+            raise Http404("Page invalide")
+        return None, page, page.object_list, page.has_next()
+
+
+class FollowingFeedView(FollowingListView):
+    template_name = 'blog/partials/post-feed.html'
 
 
 class PostCreateView(LoginRequiredMixin, CreateView):
@@ -50,7 +116,10 @@ class PostCreateView(LoginRequiredMixin, CreateView):
 
     def form_valid(self, form) -> HttpResponseRedirect:
         form.instance.author = self.request.user
-        return super().form_valid(form)
+        response = super().form_valid(form)
+        fan_out_on_commit(self.object)
+        post_published(self.object)
+        return response
 
 
 class PostEditView(PostMixin, LoginRequiredMixin, UpdateView):
@@ -64,6 +133,11 @@ class PostEditView(PostMixin, LoginRequiredMixin, UpdateView):
             return post
         raise PermissionDenied
 
+    def form_valid(self, form) -> HttpResponseRedirect:
+        # before saving, the new updated_at would change the cache keys
+        invalidate_post_card(self.object)
+        return super().form_valid(form)
+
 
 class PostDeleteView(PostMixin, LoginRequiredMixin, SingleObjectMixin, DeletionMixin, View):
     success_url = reverse_lazy('blog:index')
@@ -74,59 +148,82 @@ class PostDeleteView(PostMixin, LoginRequiredMixin, SingleObjectMixin, DeletionM
             return post
         raise PermissionDenied
 
+    def delete(self, request: HttpRequest, *args, **kwargs) -> HttpResponseRedirect:
+        """ Hidden at once, its comments, likes and reports are purged in the background (see blog.deletion) """
+        self.object = self.get_object()
+        delete_post(self.object)
+        invalidate_post_card(self.object)
+        log.info(f"User {request.user} deleted post {self.object.pk}")
+        return HttpResponseRedirect(self.get_success_url())
+
 
 # TODO maybe use SingleObjectTemplateResponseMixin
 class PostCommentView(PostMixin, SingleObjectMixin, View):
     """ login required for post """
+    paginate_by = 20
 
     def post(self, request: HttpRequest, post_id) -> HttpResponse:
+        """ Only render the new comment, the count of comments is updated out of band """
         if not request.user.is_authenticated:
             return HttpResponse(status=401)
 
         post = super().get_object()
         comment = request.POST['comment']
 
-        Comment.objects.create(post=post, author=request.user, text=comment, is_anonymous=True)
+        comment = Comment.objects.create(post=post, author=request.user, text=comment, is_anonymous=True)
+        post.refresh_from_db(fields=['comments_count'])
+        comment_added(post, comment)
 
-        comments = post.comments.order_by('-created_at')
-        return render(request, 'blog/partials/rep.html', {'comments': comments, 'post': post})
+        return render(request, 'blog/partials/new-comment.html', {'comment': comment, 'post': post})
 
     def get(self, request: HttpRequest, post_id) -> HttpResponse:
+        """ The comment thread with its first page, or only the next page of comments when a cursor is given """
         post = super().get_object()
-        comments = post.comments.order_by('-created_at')
-        return render(request, 'blog/partials/rep.html', {'comments': comments, 'post': post})
+        cursor = request.GET.get('cursor')
+
+        try:
+            comments = paginate_by_cursor(post.comments.select_related('author'), cursor, self.paginate_by)
+        except ValueError:
+            raise Http404("Page invalide")
+
+        template = 'blog/partials/comments.html' if cursor else 'blog/partials/rep.html'
+        return render(request, template, {'comments': comments, 'post': post})
 
 
 # TODO Delete comment
 # TODO remove post_id
 class PostLikeView(PostMixin, LoginRequiredMixin, SingleObjectMixin, View):
+    """ Set the like of the user to the state sent by the button (``like`` = 1 or 0), so a double click is harmless """
+
+    def get_queryset(self) -> QuerySet[Post]:
+        return Post.objects.only('id', 'likes_count')
+
     def post(self, request: HttpRequest, post_id) -> HttpResponse:
         post = super().get_object()
+        liked = request.POST.get('like', '1') == '1'
 
-        if post.likes.filter(user=request.user).exists():
-            post.likes.filter(user=request.user).delete()
-            log.info(f"User {request.user} unliked post {post}")
-            post.liked = False
-            return render(request, 'blog/components/post-like-button.html', {'post': post})
-
-        else:
-            post.likes.create(user=request.user)
-            log.info(f"User {request.user} liked post {post}")
-            post.liked = True
-            return render(request, 'blog/components/post-like-button.html', {'post': post})
+        post.likes_count = Like.objects.set_liked(post, request.user, liked)
+        if post.likes_count is None:
+            raise Http404("Post supprimé")
+        post.liked = liked
+        likes_changed(post)
+        log.info(f"User {request.user} {'liked' if liked else 'unliked'} post {post.id}")
+        return render(request, 'blog/components/post-like-button.html', {'post': post})
 
 
 class PostReportView(PostMixin, LoginRequiredMixin, SingleObjectMixin, View):
+    def get_queryset(self) -> QuerySet[Post]:
+        return Post.objects.only('id', 'author_id')
+
     def post(self, request: HttpRequest, post_id) -> HttpResponse:
         post = super().get_object()
 
-        if not post.reports.filter(user=request.user).exists():
-            post.reports.create(user=request.user)
-            log.info(f"User {request.user} reported post {post}")
+        if post.author_id != request.user.id and PostReport.objects.report(post, request.user):
+            log.info(f"User {request.user} reported post {post.id}")
             return HttpResponse(status=201)
 
         # TODO notify user
-        log.info(f"User {request.user} already reported post {post}")
+        log.info(f"User {request.user} can't report post {post.id}")
         return HttpResponse(status=400)
 
 
@@ -135,16 +232,31 @@ class PostHideView(PostMixin, LoginRequiredMixin, SingleObjectMixin, View):
         post = super().get_object()
 
         if request.user.has_perm('blog.hide_post'):
-            post.status = Post.HIDDEN
-            post.save()
+            invalidate_post_card(post)
+            post.hide()
             log.info(f"User {request.user} hid post {post}")
             return HttpResponse(status=201)
 
         raise PermissionDenied
 
 
+class ReportQueueView(LoginRequiredMixin, CursorPaginationMixin, ListView):
+    """ reported posts to review, the most reported lately first """
+    template_name = 'blog/moderation_queue.html'
+    context_object_name = 'posts'
+    paginate_by = 30
+    cursor_date_field = 'report_priority'
+
+    def get_queryset(self) -> QuerySet[Post]:
+        if not self.request.user.is_superuser:
+            raise PermissionDenied
+        return Post.objects.report_queue()
+
+
 class CustomUserMixin:
     model = CustomUser
+    # the deactivated accounts are gone for the others while they are purged
+    queryset = CustomUser.objects.filter(is_active=True)
     slug_url_kwarg = 'username'
     slug_field = 'username'
 
@@ -153,9 +265,27 @@ class ProfileView(CustomUserMixin, DetailView):
     template_name = 'blog/profile.html'
     context_object_name = 'profile'
 
+    MAX_POSTS = 30
+
+    def get_queryset(self) -> QuerySet[CustomUser]:
+        """ ``followed`` by the viewer, in the same query """
+        users = super().get_queryset()
+        if not self.request.user.is_authenticated:
+            return users.annotate(followed=Value(False, output_field=BooleanField()))
+        return users.annotate(
+                followed=Exists(Follow.objects.filter(follower=self.request.user, followed=OuterRef('pk'))))
+
+    def get_context_data(self, **kwargs) -> dict:
+        """ Add the last public posts of the user, anonymous posts are never shown on a profile. """
+        context = super().get_context_data(live_updates_url=live_updates_url(), **kwargs)
+        posts = self.object.posts.public().filter(is_anonymous=False)[:self.MAX_POSTS]
+        context['posts'] = posts.for_viewer(self.request.user)
+        return context
+
 
 class ProfileEditView(CustomUserMixin, LoginRequiredMixin, UpdateView):
-    fields = ['username', 'first_name', 'bio', "study", 'email', 'instagram', 'twitter', 'github', 'website']
+    fields = ['username', 'first_name', 'profile_pic', 'bio', "study", 'email', 'instagram', 'twitter', 'github',
+              'website']
     template_name = 'blog/edit_profile.html'
 
     def get_object(self, queryset=None) -> CustomUser:
@@ -164,6 +294,12 @@ class ProfileEditView(CustomUserMixin, LoginRequiredMixin, UpdateView):
             return user
         raise PermissionDenied
 
+    def form_valid(self, form) -> HttpResponseRedirect:
+        # only the fields of the form: followers_count, the password... may have changed since the user was loaded
+        self.object = form.save(commit=False)
+        self.object.save(update_fields=list(form.fields))
+        return HttpResponseRedirect(self.get_success_url())
+
     def get_success_url(self) -> str:
         # redirect with new username
         return reverse_lazy('blog:profile', kwargs={'username': self.object.username})
@@ -180,19 +316,52 @@ class ProfileDeleteView(CustomUserMixin, LoginRequiredMixin, SingleObjectMixin,
             return user
         raise PermissionDenied
 
+    def delete(self, request: HttpRequest, *args, **kwargs) -> HttpResponseRedirect:
+        """ Deactivated at once, the posts and the reactions are purged in the background (see blog.deletion) """
+        self.object = self.get_object()
+        log.info(f"User {request.user} deleted user {self.object}")
+        if self.object == request.user:
+            logout(request)
+        delete_user(self.object)
+        return HttpResponseRedirect(self.get_success_url())
 
-class ProfileStarView(CustomUserMixin, LoginRequiredMixin, SingleObjectMixin, View):
-    def post(self, request: HttpRequest) -> HttpResponse:
+
+class ProfileExportView(CustomUserMixin, LoginRequiredMixin, SingleObjectMixin, View):
+    """ Zip of the personal data of the user (see blog.export), for themselves or the moderators """
+
+    def get_object(self, queryset=None) -> CustomUser:
         user = super().get_object()
-        return HttpResponse(status=200)
-        # if user.stars.filter(user=request.user).exists():
-        #     user.stars.filter(user=request.user).delete()
-        #     log.info(f"User {request.user} unstarred user {user}")
-        #     return HttpResponse(status=200)
-        # else:
-        #     user.stars.create(user=request.user)
-        #     log.info(f"User {request.user} starred user {user}")
-        #     return HttpResponse(status=200)
+        if user == self.request.user or self.request.user.is_superuser:
+            return user
+        raise PermissionDenied
+
+    def get(self, request: HttpRequest, username: str) -> StreamingHttpResponse:
+        profile = self.get_object()
+        log.info(f"User {request.user} exported the data of user {profile}")
+
+        response = StreamingHttpResponse(export_archive(profile), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="{export_filename(profile)}"'
+        add_never_cache_headers(response)
+        return response
+
+
+class ProfileStarView(CustomUserMixin, LoginRequiredMixin, SingleObjectMixin, View):
+    """ Follow or unfollow the user, set to the state sent by the button (``follow`` = 1 or 0) like the likes """
+
+    def get_queryset(self) -> QuerySet[CustomUser]:
+        return CustomUser.objects.only('id', 'username', 'followers_count')
+
+    def post(self, request: HttpRequest, username: str) -> HttpResponse:
+        profile = super().get_object()
+        if profile == request.user:
+            return HttpResponse(status=400)
+
+        following = request.POST.get('follow', '1') == '1'
+        if set_following(request.user, profile, following):
+            profile.followers_count += 1 if following else -1
+            log.info(f"User {request.user} {'followed' if following else 'unfollowed'} user {profile}")
+        profile.followed = following
+        return render(request, 'blog/components/follow-button.html', {'profile': profile})
 
 
 class ProfilSearchView(ListView):
@@ -200,31 +369,34 @@ class ProfilSearchView(ListView):
     template_name = "blog/search_results.html"
     context_object_name = "users"
 
-    def get_queryset(self) -> QuerySet[CustomUser]:
+    def get_queryset(self) -> List[CustomUser]:
         query = self.request.GET.get("q", "")
-        users = CustomUser.objects.filter(Q(username__icontains=query) | Q(first_name__icontains=query))
-        return users
+        return search_users(query)
 
 
 class ModerationView(LoginRequiredMixin, View):
     """ moderation panel with statistics """
+    NB_DAYS = 30
 
     def get(self, request: HttpRequest) -> HttpResponse:
         if not request.user.is_superuser:
             raise PermissionDenied
 
-        nb_posts = Post.objects.all().count()
-        nb_users = CustomUser.objects.all().count()
-        nb_comments = Comment.objects.all().count()
-        nb_reports = PostReport.objects.all().count()
-        nb_likes = Like.objects.all().count()
+        # totals and time series come from the rollups of the rollup_stats command, not from the tables: they count
+        # the rows created (posts hidden) since the beginning, the deletions are not subtracted
+        totals = DailyStats.objects.aggregate(
+                nb_posts=Sum('posts'),
+                nb_users=Sum('users'),
+                nb_comments=Sum('comments'),
+                nb_reports=Sum('reports'),
+                nb_likes=Sum('likes'),
+                nb_hidden_posts=Sum('hidden_posts'),
+        )
 
         context = {
-            'nb_posts': nb_posts,
-            'nb_users': nb_users,
-            'nb_comments': nb_comments,
-            'nb_reports': nb_reports,
-            'nb_likes': nb_likes,
+            **{key: value or 0 for key, value in totals.items()},
+            'days': DailyStats.objects.order_by('-day')[:self.NB_DAYS],
+            'last_update': StatsWatermark.objects.aggregate(last_update=Max('updated_at'))['last_update'],
         }
 
         return render(request, 'blog/moderation.html', context)
@@ -0,0 +1,212 @@
+"""
+Social graph of the users and its layout, computed offline by the ``build_instamap`` command.
+
+Only the users who publish their Instagram account are on the map, even without any relation: they are linked by
+their likes and signed comments on each other's signed posts (the anonymous posts and comments reveal nothing).
+The graph is a sparse symmetric adjacency matrix, laid out with a force-directed algorithm (Fruchterman-Reingold,
+with the repulsion limited to the close nodes so that an iteration costs O(nodes + edges) instead of O(nodes²)).
+
+The map is then cut in chunks at several levels of detail: the level ``l`` is a grid of ``2 ** l`` x ``2 ** l``
+chunks showing the ``NODES_PER_CHUNK * 4 ** l`` most connected users and the strongest edges between them, so
+that the browser only loads about the same amount of data whatever the zoom.
+
+Needs NumPy and SciPy (requirements-instamap.txt), which are only used by the command.
+"""
+import json
+import math
+import time
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, F, Q
+from scipy.sparse import coo_matrix, csr_matrix, triu
+from scipy.spatial import cKDTree
+
+from auth.models import CustomUser
+from blog.models import Comment, Like, Post
+from .models import MapChunk, MapLayout, MapNode
+
+LIKE_WEIGHT = 1.0
+COMMENT_WEIGHT = 3.0
+
+NODES_PER_CHUNK = 200
+EDGES_PER_CHUNK = 400
+MAX_LEVEL = 6
+
+GRAVITY = 0.05
+PRECISION = 4  # decimals of the coordinates sent to the browser
+
+
+class SocialGraph:
+    """ ``adjacency[i, j]``: weight of the relations between the users ``user_ids[i]`` and ``user_ids[j]`` """
+
+    def __init__(self, user_ids: np.ndarray, adjacency: csr_matrix) -> None:
+        self.user_ids = user_ids
+        self.adjacency = adjacency
+
+    @property
+    def nb_edges(self) -> int:
+        return triu(self.adjacency, k=1).nnz
+
+    @property
+    def weights(self) -> np.ndarray:
+        """ Weighted degree of each user """
+        return np.asarray(self.adjacency.sum(axis=1)).ravel()
+
+
+def on_the_map(prefix: str = '') -> Q:
+    """ The active users with an Instagram account, ``prefix`` being the path to the user """
+    return Q(**{f'{prefix}is_active': True}) & ~Q(**{f'{prefix}instagram': ''})
+
+
+def interactions() -> Iterator[Tuple[int, int, float]]:
+    """
+    ``(user, author, weight)`` of the likes and signed comments on the signed public posts, between the users on
+    the map
+    """
+    related = Q(post__status__in=Post.PUBLIC, post__is_anonymous=False) & on_the_map('post__author__')
+    for model, user_field, weight, extra in ((Like, 'user', LIKE_WEIGHT, Q()),
+                                             (Comment, 'author', COMMENT_WEIGHT, Q(is_anonymous=False))):
+        pairs = (model.objects.filter(related, extra, on_the_map(f'{user_field}__'))
+                 .exclude(**{f'{user_field}_id': F('post__author_id')})
+                 .values_list(f'{user_field}_id', 'post__author_id')
+                 .annotate(count=Count('id')).order_by())
+        for user_id, author_id, count in pairs.iterator():
+            yield user_id, author_id, count * weight
+
+
+def build_graph() -> SocialGraph:
+    edges = np.array(list(interactions()), dtype=np.float64).reshape(-1, 3)
+    instagram_users = CustomUser.objects.filter(on_the_map()).values_list('id', flat=True)
+    user_ids = np.union1d(edges[:, :2].astype(np.int64).ravel(), np.fromiter(instagram_users, dtype=np.int64))
+
+    rows = np.searchsorted(user_ids, edges[:, 0].astype(np.int64))
+    cols = np.searchsorted(user_ids, edges[:, 1].astype(np.int64))
+    # duplicates (likes and comments between the same users) are summed
+    directed = coo_matrix((edges[:, 2], (rows, cols)), shape=(len(user_ids), len(user_ids))).tocsr()
+    return SocialGraph(user_ids, (directed + directed.T).tocsr())
+
+
+def accumulate(indexes: np.ndarray, vectors: np.ndarray, size: int) -> np.ndarray:
+    """ Sum of the 2D vectors by index, like ``np.add.at`` but much faster """
+    return np.column_stack([np.bincount(indexes, weights=vectors[:, axis], minlength=size) for axis in (0, 1)])
+
+
+def force_layout(adjacency: csr_matrix, iterations: int = 100, seed: int = 0) -> np.ndarray:
+    """ Positions of the nodes in [0, 1] x [0, 1] """
+    size = adjacency.shape[0]
+    positions = np.random.default_rng(seed).random((size, 2))
+    if size < 2:
+        return positions
+
+    edges = triu(adjacency, k=1).tocoo()
+    # a few users liking everything of each other would collapse on the same point with the raw weights
+    weights = np.log1p(edges.data) / np.log1p(edges.data.max()) if edges.nnz else edges.data
+    ideal_distance = 1 / math.sqrt(size)
+    cutoff = 3 * ideal_distance
+    temperature = 0.1
+    cooling = temperature / (iterations + 1)
+
+    for _ in range(iterations):
+        # repulsion k² / d between the nodes closer than the cutoff
+        pairs = cKDTree(positions).query_pairs(cutoff, output_type='ndarray')
+        delta = positions[pairs[:, 0]] - positions[pairs[:, 1]]
+        squared = np.maximum((delta ** 2).sum(axis=1), 1e-12)
+        force = delta * (ideal_distance ** 2 / squared)[:, None]
+        displacement = accumulate(pairs[:, 0], force, size) - accumulate(pairs[:, 1], force, size)
+
+        # attraction d² / k along the edges
+        delta = positions[edges.row] - positions[edges.col]
+        force = delta * (weights * np.sqrt((delta ** 2).sum(axis=1)) / ideal_distance)[:, None]
+        displacement += accumulate(edges.col, force, size) - accumulate(edges.row, force, size)
+
+        # gravity, keeps the users without relations and the small groups around the others
+        displacement -= GRAVITY * (positions - positions.mean(axis=0))
+
+        length = np.maximum(np.sqrt((displacement ** 2).sum(axis=1)), 1e-12)
+        positions += displacement * (np.minimum(length, temperature) / length)[:, None]
+        temperature -= cooling
+
+    # scale to the unit square with a margin, keeping the proportions
+    positions -= positions.min(axis=0)
+    positions *= 0.96 / max(positions.max(), 1e-12)
+    return positions + 0.02
+
+
+def node_levels(weights: np.ndarray) -> Tuple[np.ndarray, int]:
+    """ First level of detail showing each node (the most connected first) and the number of levels """
+    ranks = np.empty(len(weights), dtype=np.int64)
+    ranks[np.argsort(-weights, kind='stable')] = np.arange(len(weights))
+    levels = np.ceil(np.log(np.maximum(ranks + 1, NODES_PER_CHUNK) / NODES_PER_CHUNK) / np.log(4)).astype(np.int64)
+    nb_levels = min(MAX_LEVEL, int(levels.max(initial=0))) + 1
+    return np.minimum(levels, nb_levels - 1), nb_levels
+
+
+def cut_chunks(graph: SocialGraph, positions: np.ndarray, levels: np.ndarray, nb_levels: int,
+               labels: Dict[int, Tuple[str, str]]) -> Iterator[Tuple[int, int, int, dict]]:
+    """
+    ``(level, x, y, data)`` of the non-empty chunks. ``data`` has the visible nodes of the chunk,
+    ``[user id, x, y, size, username, instagram]``, and the strongest visible edges with an end in the chunk,
+    ``[x1, y1, x2, y2, strength]``: an edge is in the chunks of both its ends.
+    """
+    weights = graph.weights
+    sizes = np.log1p(weights) / max(np.log1p(weights.max(initial=0)), 1e-12)
+    edges = triu(graph.adjacency, k=1).tocoo()
+    strengths = np.log1p(edges.data) / np.log1p(edges.data.max()) if edges.nnz else edges.data
+    rounded = positions.round(PRECISION)
+
+    for level in range(nb_levels):
+        side = 2 ** level
+        cells = np.minimum((positions * side).astype(np.int64), side - 1)
+        keys = cells[:, 0] * side + cells[:, 1]
+        visible = levels <= level
+
+        chunk_nodes: Dict[int, List[int]] = {}
+        for index in np.flatnonzero(visible):
+            chunk_nodes.setdefault(int(keys[index]), []).append(int(index))
+
+        # each visible edge in the chunk of its first end, and of its second end if it is another one
+        shown = np.flatnonzero(visible[edges.row] & visible[edges.col])
+        other_chunk = shown[keys[edges.row[shown]] != keys[edges.col[shown]]]
+        edge_indexes = np.concatenate([shown, other_chunk])
+        edge_keys = np.concatenate([keys[edges.row[shown]], keys[edges.col[other_chunk]]])
+        order = np.lexsort((-strengths[edge_indexes], edge_keys))
+        edge_indexes, edge_keys = edge_indexes[order], edge_keys[order]
+        unique_keys, starts = np.unique(edge_keys, return_index=True)
+        chunk_edges = {}
+        for key, start, end in zip(unique_keys, starts, np.append(starts[1:], len(edge_keys))):
+            chunk_edges[int(key)] = edge_indexes[start:min(end, start + EDGES_PER_CHUNK)]
+
+        for key, indexes in chunk_nodes.items():
+            nodes = [[int(graph.user_ids[index]), *rounded[index].tolist(), round(float(sizes[index]), 2),
+                      *labels.get(int(graph.user_ids[index]), ('', ''))] for index in indexes]
+            edge_list = [[*rounded[edges.row[edge]].tolist(), *rounded[edges.col[edge]].tolist(),
+                          round(float(strengths[edge]), 2)] for edge in chunk_edges.get(key, ())]
+            yield level, key // side, key % side, {'nodes': nodes, 'edges': edge_list}
+
+
+def build_layout(iterations: int = 100, seed: int = 0, batch_size: int = 1000) -> MapLayout:
+    """ Compute a new layout of the current graph, save it and delete the previous ones """
+    start = time.perf_counter()
+    graph = build_graph()
+    positions = force_layout(graph.adjacency, iterations, seed)
+    levels, nb_levels = node_levels(graph.weights)
+    labels = {user_id: (username, instagram) for user_id, username, instagram
+              in CustomUser.objects.filter(id__in=graph.user_ids.tolist()).values_list('id', 'username', 'instagram')}
+    chunks = list(cut_chunks(graph, positions, levels, nb_levels, labels))
+
+    with transaction.atomic():
+        layout = MapLayout.objects.create(nb_nodes=len(graph.user_ids), nb_edges=graph.nb_edges, levels=nb_levels,
+                                          duration=time.perf_counter() - start)
+        MapNode.objects.bulk_create(
+                (MapNode(layout=layout, user_id=int(user_id), x=float(x), y=float(y), weight=float(weight),
+                         level=int(level))
+                 for user_id, (x, y), weight, level in zip(graph.user_ids, positions, graph.weights, levels)),
+                batch_size=batch_size)
+        MapChunk.objects.bulk_create(
+                (MapChunk(layout=layout, level=level, x=x, y=y, content=json.dumps(data, separators=(',', ':')))
+                 for level, x, y, data in chunks),
+                batch_size=batch_size)
+        MapLayout.objects.exclude(pk=layout.pk).delete()
+    return layout
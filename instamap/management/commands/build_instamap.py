@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ("Build the graph of the users from their likes and comments, compute its force-directed layout and "
+            "save the chunks of the map served by the instamap page. Needs NumPy and SciPy "
+            "(requirements-instamap.txt).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=100, help="Iterations of the layout (default: 100)")
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the initial positions (default: 0)")
+
+    def handle(self, *args, iterations: int, seed: int, **options):
+        if iterations < 1:
+            raise CommandError("--iterations must be positive")
+        try:
+            from instamap.graph import build_layout
+        except ImportError as error:
+            raise CommandError(f"The instamap layout needs NumPy and SciPy, "
+                               f"run pip install -r requirements-instamap.txt: {error}")
+
+        layout = build_layout(iterations=iterations, seed=seed)
+        self.stdout.write(self.style.SUCCESS(
+                f"Layout of {layout.nb_nodes} users and {layout.nb_edges} relations in {layout.levels} levels of "
+                f"detail computed in {layout.duration:.1f} s ({layout.chunks.count()} chunks)"))
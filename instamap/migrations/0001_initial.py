@@ -0,0 +1,71 @@
+# Generated by Django 4.0.5 on 2026-10-18 09:32
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MapLayout',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='date de calcul')),
+                ('nb_nodes', models.PositiveIntegerField(verbose_name="nombre d'utilisateurs")),
+                ('nb_edges', models.PositiveIntegerField(verbose_name='nombre de relations')),
+                ('levels', models.PositiveSmallIntegerField(verbose_name='niveaux de détail')),
+                ('duration', models.FloatField(verbose_name='durée du calcul (s)')),
+            ],
+            options={
+                'verbose_name': 'disposition de la carte',
+                'verbose_name_plural': 'dispositions de la carte',
+            },
+        ),
+        migrations.CreateModel(
+            name='MapNode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('x', models.FloatField()),
+                ('y', models.FloatField()),
+                ('weight', models.FloatField(help_text="Somme des poids des relations de l'utilisateur.", verbose_name='poids')),
+                ('level', models.PositiveSmallIntegerField(help_text='Premier niveau de détail où il est affiché.', verbose_name='niveau')),
+                ('layout', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nodes', to='instamap.maplayout', verbose_name='disposition')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='utilisateur')),
+            ],
+            options={
+                'verbose_name': "position d'un utilisateur",
+                'verbose_name_plural': 'positions des utilisateurs',
+            },
+        ),
+        migrations.CreateModel(
+            name='MapChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.PositiveSmallIntegerField(verbose_name='niveau')),
+                ('x', models.PositiveIntegerField()),
+                ('y', models.PositiveIntegerField()),
+                ('content', models.TextField(verbose_name='contenu')),
+                ('layout', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='instamap.maplayout', verbose_name='disposition')),
+            ],
+            options={
+                'verbose_name': 'morceau de la carte',
+                'verbose_name_plural': 'morceaux de la carte',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='mapnode',
+            constraint=models.UniqueConstraint(fields=('layout', 'user'), name='unique_map_node_layout_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='mapchunk',
+            constraint=models.UniqueConstraint(fields=('layout', 'level', 'x', 'y'), name='unique_map_chunk'),
+        ),
+    ]
@@ -1,3 +1,69 @@
 from django.db import models
 
-# Create your models here.
+from auth.models import CustomUser
+
+
+class MapLayoutQuerySet(models.QuerySet):
+    def current(self) -> "MapLayout":
+        """ The last computed layout, None if the build_instamap command has never been run """
+        return self.order_by('-created_at', '-id').first()
+
+
+class MapLayout(models.Model):
+    """
+    Positions of the users on the map, computed offline by the ``build_instamap`` command (see instamap.graph).
+    A new layout is created by each run: the chunks of a layout never change, the browsers can cache them.
+    """
+    created_at = models.DateTimeField("date de calcul", auto_now_add=True)
+    nb_nodes = models.PositiveIntegerField("nombre d'utilisateurs")
+    nb_edges = models.PositiveIntegerField("nombre de relations")
+    levels = models.PositiveSmallIntegerField("niveaux de détail")
+    duration = models.FloatField("durée du calcul (s)")
+
+    objects = MapLayoutQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "disposition de la carte"
+        verbose_name_plural = "dispositions de la carte"
+
+    def __str__(self) -> str:
+        return f"{self.created_at:%Y-%m-%d %H:%M} ({self.nb_nodes} utilisateurs)"
+
+
+class MapNode(models.Model):
+    """ Position of a user in a layout, in [0, 1] x [0, 1] """
+    layout = models.ForeignKey(MapLayout, on_delete=models.CASCADE, related_name='nodes', verbose_name="disposition")
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+', verbose_name="utilisateur")
+    x = models.FloatField()
+    y = models.FloatField()
+    weight = models.FloatField("poids", help_text="Somme des poids des relations de l'utilisateur.")
+    level = models.PositiveSmallIntegerField("niveau", help_text="Premier niveau de détail où il est affiché.")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['layout', 'user'], name='unique_map_node_layout_user'),
+        ]
+
+        verbose_name = "position d'un utilisateur"
+        verbose_name_plural = "positions des utilisateurs"
+
+
+class MapChunk(models.Model):
+    """
+    Nodes and edges of a square of the map at a level of detail, as served to the browser.
+    The map is cut in ``2 ** level`` x ``2 ** level`` squares, each level showing more (less important) users.
+    """
+    layout = models.ForeignKey(MapLayout, on_delete=models.CASCADE, related_name='chunks', verbose_name="disposition")
+    level = models.PositiveSmallIntegerField("niveau")
+    x = models.PositiveIntegerField()
+    y = models.PositiveIntegerField()
+    # JSON served as is by instamap.views.chunk, see instamap.graph.cut_chunks
+    content = models.TextField("contenu")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['layout', 'level', 'x', 'y'], name='unique_map_chunk'),
+        ]
+
+        verbose_name = "morceau de la carte"
+        verbose_name_plural = "morceaux de la carte"
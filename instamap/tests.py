@@ -1,3 +1,107 @@
+import json
+
+import numpy as np
 from django.test import TestCase
+from django.urls import reverse
+
+from auth.models import CustomUser
+from blog.models import Comment, Like, Post
+from .graph import NODES_PER_CHUNK, build_graph, build_layout, force_layout, node_levels
+from .models import MapChunk, MapLayout
+from .views import EMPTY_CHUNK
+
+
+def create_user(username: str, **fields) -> CustomUser:
+    return CustomUser.objects.create(username=username, date_of_birth='2000-01-01', **fields)
+
+
+class GraphTests(TestCase):
+    """ Social graph and layout of the map, see instamap.graph """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice, cls.bob, cls.carol = [create_user(name, instagram=name) for name in ('alice', 'bob', 'carol')]
+        cls.hidden = create_user('hidden')  # no Instagram account
+        cls.inactive = create_user('inactive', instagram='inactive', is_active=False)
+
+        signed = [Post.objects.create(author=cls.bob, text=str(index), is_anonymous=False) for index in range(2)]
+        anonymous = Post.objects.create(author=cls.bob, text="anonyme")
+        for post in signed:
+            Like.objects.create(post=post, user=cls.alice)
+        Like.objects.create(post=anonymous, user=cls.carol)
+        Like.objects.create(post=signed[0], user=cls.bob)
+        Like.objects.create(post=signed[0], user=cls.hidden)
+        Like.objects.create(post=signed[0], user=cls.inactive)
+        Comment.objects.create(post=signed[0], author=cls.carol, text="signé", is_anonymous=False)
+        Comment.objects.create(post=signed[1], author=cls.alice, text="anonyme")
+
+    def test_graph(self):
+        graph = build_graph()
+        self.assertEqual([self.alice.pk, self.bob.pk, self.carol.pk], graph.user_ids.tolist())
+        # 2 likes of alice, the signed comment of carol: the anonymous post and comment, the self-like, the users
+        # off the map are left out
+        expected = np.array([[0, 2, 0], [2, 0, 3], [0, 3, 0]])
+        np.testing.assert_array_equal(expected, graph.adjacency.toarray())
+        self.assertEqual(2, graph.nb_edges)
+        self.assertEqual([2, 5, 3], graph.weights.tolist())
+
+    def test_force_layout(self):
+        graph = build_graph()
+        positions = force_layout(graph.adjacency, seed=1)
+        self.assertEqual((3, 2), positions.shape)
+        self.assertTrue(((positions >= 0.02 - 1e-9) & (positions <= 0.98 + 1e-9)).all())
+        np.testing.assert_array_equal(positions, force_layout(graph.adjacency, seed=1))
+
+    def test_node_levels(self):
+        weights = np.arange(NODES_PER_CHUNK * 5, dtype=np.float64)
+        levels, nb_levels = node_levels(weights)
+        self.assertEqual(3, nb_levels)
+        # the most connected users are shown at the first level
+        self.assertEqual({0}, set(levels[-NODES_PER_CHUNK:].tolist()))
+        self.assertEqual({1}, set(levels[-4 * NODES_PER_CHUNK:-NODES_PER_CHUNK].tolist()))
+        self.assertEqual({2}, set(levels[:NODES_PER_CHUNK].tolist()))
+
+    def test_layout_is_replaced(self):
+        first = build_layout(iterations=10)
+        layout = build_layout(iterations=10)
+        self.assertEqual([layout], list(MapLayout.objects.all()))
+        self.assertEqual((3, 2, 1), (layout.nb_nodes, layout.nb_edges, layout.levels))
+        self.assertFalse(MapChunk.objects.filter(layout=first.pk).exists())
+
+        nodes = json.loads(MapChunk.objects.get(layout=layout, level=0).content)['nodes']
+        self.assertEqual({'alice', 'bob', 'carol'}, {node[4] for node in nodes})
+
+
+class MapViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('alice', instagram='alice')
+        cls.layout = MapLayout.objects.create(nb_nodes=1, nb_edges=0, levels=2, duration=0)
+        MapChunk.objects.create(layout=cls.layout, level=0, x=0, y=0, content='{"nodes":[[1,0.5,0.5,0,"a","a"]]}')
+
+    def chunk_url(self, level: int, x: int, y: int) -> str:
+        return reverse('instamap:chunk', kwargs={'layout_id': self.layout.pk, 'level': level, 'x': x, 'y': y})
+
+    def test_login_required(self):
+        for url in (reverse('instamap:index'), self.chunk_url(0, 0, 0)):
+            with self.subTest(url):
+                response = self.client.get(url)
+                self.assertEqual(302, response.status_code)
+                self.assertTrue(response.url.startswith('/auth/login'))
+
+    def test_chunks(self):
+        self.client.force_login(self.user)
+        self.assertEqual(200, self.client.get(reverse('instamap:index')).status_code)
+
+        response = self.client.get(self.chunk_url(0, 0, 0))
+        self.assertEqual('application/json', response.headers['Content-Type'])
+        self.assertIn('private', response.headers['Cache-Control'])
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertEqual('a', json.loads(response.content)['nodes'][0][4])
 
-# Create your tests here.
+        # the empty squares are not stored
+        self.assertEqual(EMPTY_CHUNK, self.client.get(self.chunk_url(1, 1, 0)).content.decode())
+        for level, x, y in ((1, 2, 0), (2, 0, 0)):
+            with self.subTest(level=level, x=x, y=y):
+                self.assertEqual(404, self.client.get(self.chunk_url(level, x, y)).status_code)
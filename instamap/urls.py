@@ -1,9 +1,10 @@
 from django.urls import path
 
-from .views import index
+from .views import index, chunk
 
 app_name = 'instamap'
 
 urlpatterns = [
     path("", index, name="index"),
+    path("<int:layout_id>/<int:level>/<int:x>/<int:y>.json", chunk, name="chunk"),
 ]
@@ -1,8 +1,27 @@
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpRequest, HttpResponse
 from django.shortcuts import render
+from django.views.decorators.cache import cache_control
 
+from .models import MapChunk, MapLayout
 
-# Create your views here.
+EMPTY_CHUNK = '{"nodes":[],"edges":[]}'
 
 
-def index(request):
-    return render(request, 'instamap/index.html')
+@login_required
+def index(request: HttpRequest) -> HttpResponse:
+    return render(request, 'instamap/index.html', {'layout': MapLayout.objects.current()})
+
+
+# a layout never changes once computed, a new one has a new id, but only the logged in users may see it
+@login_required
+@cache_control(private=True, max_age=31536000, immutable=True)
+def chunk(request: HttpRequest, layout_id: int, level: int, x: int, y: int) -> HttpResponse:
+    """ Precomputed nodes and edges of a square of the map, see instamap.graph.cut_chunks """
+    content = MapChunk.objects.filter(layout=layout_id, level=level, x=x, y=y).values_list('content', flat=True).first()
+    if content is None:
+        # the empty squares are not stored
+        if x >= 2 ** level or y >= 2 ** level or not MapLayout.objects.filter(pk=layout_id, levels__gt=level).exists():
+            raise Http404()
+        content = EMPTY_CHUNK
+    return HttpResponse(content, content_type='application/json')
@@ -1,7 +1,9 @@
 """
 ASGI config for monodcrush project.
 
-It exposes the ASGI callable as a module-level variable named ``application``.
+It exposes the ASGI callable as a module-level variable named ``application``: the Django application, which sends
+the streaming responses from a thread (see monodcrush.streaming), and the Server-Sent Events endpoint of the live
+updates (see blog.live) when ``LIVE_UPDATES`` is set.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.0/howto/deployment/asgi/
@@ -9,8 +11,24 @@ https://docs.djangoproject.com/en/4.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'monodcrush.settings')
 
-application = get_asgi_application()
+# as get_asgi_application, with our handler
+django.setup(set_prefix=False)
+
+# once the settings are configured and the apps loaded
+from django.conf import settings  # noqa: E402
+
+from blog import live  # noqa: E402
+from monodcrush.streaming import StreamingASGIHandler  # noqa: E402
+
+django_application = StreamingASGIHandler()
+
+
+async def application(scope, receive, send):
+    if settings.LIVE_UPDATES and scope['type'] == 'http' and scope['path'] == settings.LIVE_UPDATES_PATH:
+        await live.stream(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
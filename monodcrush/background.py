@@ -0,0 +1,70 @@
+"""
+Small in-process task runner for the work which doesn't need to delay the response (image resizing...).
+
+The tasks run in a bounded pool of ``BACKGROUND_WORKERS`` threads of the server process; with 0 workers
+they run at once in the calling thread (tests, management commands). They are lost if the process stops:
+each task must be safe to run again, and a command must be able to redo what has been lost.
+"""
+import atexit
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> Optional[ThreadPoolExecutor]:
+    global _executor
+    workers = getattr(settings, 'BACKGROUND_WORKERS', 0)
+    if not workers:
+        return None
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='background')
+        return _executor
+
+
+@atexit.register
+def shutdown() -> None:
+    """ Wait for the running and queued tasks """
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+
+
+def run_task(function: Callable, *args, **kwargs) -> None:
+    """ Run the task, log its exception instead of losing it in a future nobody reads """
+    try:
+        function(*args, **kwargs)
+    except Exception:
+        logger.exception("Background task %s failed", getattr(function, '__qualname__', function))
+
+
+def run_in_worker(function: Callable, *args, **kwargs) -> None:
+    close_old_connections()
+    try:
+        run_task(function, *args, **kwargs)
+    finally:
+        # the thread may stay idle for a long time, don't keep its connections open
+        connections.close_all()
+
+
+def submit(function: Callable, *args, **kwargs) -> Optional[Future]:
+    executor = get_executor()
+    if executor is None:
+        run_task(function, *args, **kwargs)
+        return None
+    return executor.submit(run_in_worker, function, *args, **kwargs)
+
+
+def submit_on_commit(function: Callable, *args, using: Optional[str] = None, **kwargs) -> None:
+    """ Submit the task when the current transaction is committed, so it sees the data it is about """
+    transaction.on_commit(lambda: submit(function, *args, **kwargs), using=using)
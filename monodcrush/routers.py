@@ -0,0 +1,31 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class ReadReplicaRouter:
+    """
+    Send the reads to the read-only connection of the same SQLite database (``replica`` alias) and the writes
+    to the default one.
+
+    In WAL mode the readers don't wait for the writer, and a read-only connection can't take the write lock by
+    mistake. As it is the same file, a committed write is visible at once from the replica. The reads made in
+    a transaction of the default connection stay on it, to see its uncommitted writes.
+    """
+    replica = 'replica'
+
+    def db_for_read(self, model, **hints):
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return self.replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # both aliases are the same database
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
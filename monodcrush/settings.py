@@ -10,11 +10,15 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# 'development' or 'production', chosen with the MONODCRUSH_PROFILE environment variable
+PROFILE = os.environ.get('MONODCRUSH_PROFILE', 'development')
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -36,7 +40,7 @@ LOGGING = {
 SECRET_KEY = 'django-insecure-7c^j9^pjeo-2xw8y)gs$v4+$v^dkxj!vh+($ld!&=(hpw9nx9*'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = PROFILE != 'production'
 
 ALLOWED_HOSTS = ["dev.monodcrush.fr", "monodcrush.fr", "localhost", "127.0.0.1"]
 
@@ -72,6 +76,17 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'monodcrush.urls'
 
+# Serve the feed, like, comment and search pages with the views of blog.async_views (for ASGI servers)
+ASYNC_VIEWS = os.environ.get('MONODCRUSH_ASYNC_VIEWS') == '1'
+
+# Push the like counts, comments and new posts to the open feeds with Server-Sent Events (see blog.live), the
+# endpoint is served at LIVE_UPDATES_PATH by the ASGI application only. The updates are sent by batches every
+# LIVE_UPDATES_DEBOUNCE seconds, a comment every LIVE_UPDATES_KEEPALIVE seconds keeps the idle connections open.
+LIVE_UPDATES = os.environ.get('MONODCRUSH_LIVE_UPDATES') == '1'
+LIVE_UPDATES_PATH = '/live'
+LIVE_UPDATES_DEBOUNCE = 1.0
+LIVE_UPDATES_KEEPALIVE = 20
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -90,6 +105,25 @@ TEMPLATES = [
     },
 ]
 
+# Render the hot templates of the blog (feed, post card, like button, comments) with their Jinja2 versions
+# (blog/jinja2/, needs the jinja2 package): the engine listed first has priority for the names both have
+JINJA2_TEMPLATES = os.environ.get('MONODCRUSH_JINJA2_TEMPLATES') == '1'
+JINJA2_BACKEND = {
+    'BACKEND': 'django.template.backends.jinja2.Jinja2',
+    'DIRS': [],
+    'APP_DIRS': True,
+    'OPTIONS': {
+        'environment': 'blog.jinja2env.environment',
+        'context_processors': [
+            # memoized, unlike the csrf_token of the Jinja2 backend which is masked again each time it is printed
+            'django.template.context_processors.csrf',
+            'django.contrib.auth.context_processors.auth',
+        ],
+    },
+}
+if JINJA2_TEMPLATES:
+    TEMPLATES.insert(0, JINJA2_BACKEND)
+
 WSGI_APPLICATION = 'monodcrush.wsgi.application'
 
 # Database
@@ -102,6 +136,35 @@ DATABASES = {
     }
 }
 
+if PROFILE == 'production':
+    SQLITE_PRAGMAS = {
+        'synchronous': 'NORMAL',  # durable in WAL mode except on power loss, fsync only at checkpoints
+        'busy_timeout': 5000,  # ms
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # KiB
+    }
+    DATABASES = {
+        'default': {
+            'ENGINE': 'monodcrush.sqlite',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': 600,
+            'OPTIONS': {
+                # WAL: the readers don't block the writer nor the writer the readers
+                'pragmas': {'journal_mode': 'WAL', **SQLITE_PRAGMAS},
+                'transaction_mode': 'IMMEDIATE',
+            },
+        },
+        # same file, read-only: used for the reads by monodcrush.routers.ReadReplicaRouter
+        'replica': {
+            'ENGINE': 'monodcrush.sqlite',
+            'NAME': f"file:{BASE_DIR / 'db.sqlite3'}?mode=ro",
+            'CONN_MAX_AGE': 600,
+            'OPTIONS': {'uri': True, 'pragmas': SQLITE_PRAGMAS},
+            'TEST': {'MIRROR': 'default'},
+        },
+    }
+    DATABASE_ROUTERS = ['monodcrush.routers.ReadReplicaRouter']
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -146,12 +209,80 @@ STATICFILES_DIRS = [
 
 STATIC_ROOT = BASE_DIR / "collected_static"
 
+if PROFILE == 'production':
+    # content-hashed names and .gz/.br variants, served by monodcrush.staticfiles.serve (see monodcrush.urls)
+    STATICFILES_STORAGE = 'monodcrush.staticfiles.CompressedManifestStaticFilesStorage'
+
+# Uploaded files (variants of the profile pictures, see auth.images), served by Django in development only
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / "media"
+# Original profile pictures, with their metadata: never served (see auth.storage)
+PRIVATE_MEDIA_ROOT = BASE_DIR / "private_media"
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # shared by the processes of the server, read on every request by the session engine
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'sessions',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    # permissions of the users and their versions (see auth.backends), in memory for the single development process
+    'permissions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'permissions',
+    },
+}
+
+if PROFILE == 'production':
+    # several server processes: a revoked permission must be forgotten by all of them
+    CACHES['permissions'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'permissions',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    }
+
+# Modified sessions and last_login are written to the database in batches (see auth.coalescing):
+# when there are WRITE_BEHIND_BATCH_SIZE pending writes or after WRITE_BEHIND_INTERVAL seconds (0: no batching).
+# Only in production: the pending writes are lost if the process is killed, and a password reset token checks
+# last_login as it is in the database.
+WRITE_BEHIND_BATCH_SIZE = 100
+WRITE_BEHIND_INTERVAL = 0
+
+if PROFILE == 'production':
+    SESSION_ENGINE = 'auth.sessions'
+    SESSION_CACHE_ALIAS = 'sessions'
+    WRITE_BEHIND_INTERVAL = 5
+
+# Same as the default backend, with the permissions of the users cached between requests
+AUTHENTICATION_BACKENDS = ['auth.backends.CachedModelBackend']
+PERMISSIONS_CACHE_ALIAS = 'permissions'
+
+# hashlib.pbkdf2_hmac releases the GIL: the threads of a worker hash the passwords in parallel
 PASSWORD_HASHERS = [
     'django.contrib.auth.hashers.PBKDF2PasswordHasher',
     'auth.hasher.Hasher',
-]
\ No newline at end of file
+]
+
+# Threads of each server process running the tasks which don't need to delay the response, like resizing the
+# profile pictures (see monodcrush.background; 0: run them in the request thread)
+BACKGROUND_WORKERS = 2
+
+# The deleted users and posts are deactivated or hidden at once, their rows are then purged in the background by
+# batches of DELETION_BATCH_SIZE rows, each in its own short transaction (see blog.deletion)
+DELETION_BATCH_SIZE = 500
+
+# The new posts are written in the following feeds of the followers of their author (see blog.timelines), by
+# batches of TIMELINE_FANOUT_BATCH_SIZE, unless the author has TIMELINE_FANOUT_MAX_FOLLOWERS followers or more:
+# the posts of these popular accounts are merged into the feeds when they are read. The last TIMELINE_BACKFILL
+# posts of an account are added to the feed of a new follower.
+TIMELINE_FANOUT_MAX_FOLLOWERS = 1000
+TIMELINE_FANOUT_BATCH_SIZE = 500
+TIMELINE_BACKFILL = 50
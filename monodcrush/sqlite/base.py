@@ -0,0 +1,30 @@
+"""
+SQLite backend applying ``PRAGMA`` statements to every new connection.
+
+``OPTIONS`` accepts, besides the arguments of ``sqlite3.connect()``:
+
+- ``pragmas``: ``{name: value}`` executed in this order when the connection is opened,
+- ``transaction_mode``: ``'IMMEDIATE'`` starts the transactions with ``BEGIN IMMEDIATE``, so that a transaction
+  which will write waits for the write lock (``busy_timeout``) when it starts, instead of failing with
+  "database is locked" when it tries to upgrade its read lock in the middle.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict['OPTIONS'].get('pragmas', {}).items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
@@ -0,0 +1,144 @@
+"""
+Static files: content-hashed and precompressed by ``collectstatic``, served with long-lived cache headers.
+
+- ``CompressedManifestStaticFilesStorage`` adds the hash of their content to the names of the files (so a file
+  can be cached forever: a new version has a new name) and writes a ``.gz`` and, if the optional ``brotli``
+  package is installed, a ``.br`` variant next to each text file.
+- ``serve`` sends the smallest variant accepted by the browser, with ``Cache-Control: immutable`` for the
+  hashed names.
+- ``VENDORED_SCRIPTS`` are the third-party scripts served from ``static/`` instead of a CDN, downloaded by the
+  ``vendor_static`` command, which refuses a file whose sha256 is not the pinned one.
+"""
+import gzip
+import logging
+import mimetypes
+import posixpath
+import re
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, StaticFilesStorage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpRequest, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# name: (path in the static files, pinned CDN url it is downloaded from, sha256 of the file)
+# The sha256 must be taken from a copy checked against the release, vendor_static downloads nothing without it.
+VENDORED_SCRIPTS: Dict[str, Tuple[str, str, Optional[str]]] = {
+    'alpinejs': ('scripts/vendor/alpinejs-3.10.2.min.js', 'https://unpkg.com/alpinejs@3.10.2/dist/cdn.min.js', None),
+    'alpinejs-collapse': ('scripts/vendor/alpinejs-collapse-3.10.2.min.js',
+                          'https://unpkg.com/@alpinejs/collapse@3.10.2/dist/cdn.min.js', None),
+    # the Server-Sent Events extension of the htmx version of static/scripts/htmx.min.js
+    'htmx-sse': ('scripts/vendor/htmx-sse-1.7.0.js', 'https://unpkg.com/htmx.org@1.7.0/dist/ext/sse.js', None),
+}
+
+COMPRESSED_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.xml', '.map', '.ico')
+MIN_COMPRESSED_SIZE = 256
+# extension and Content-Encoding of the variants, preferred first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^.]+$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, max-age=3600'
+
+
+def compress(path: Path) -> Iterator[Path]:
+    """ Write the gzip and brotli variants of the file, if they are smaller """
+    content = path.read_bytes()
+    variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(content, quality=11)
+
+    for extension, compressed in variants.items():
+        if len(compressed) < len(content) * 0.95:
+            variant = path.with_name(path.name + extension)
+            variant.write_bytes(compressed)
+            yield variant
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+
+    def post_process(self, paths, dry_run=False, **options):
+        names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not isinstance(processed, Exception):
+                names.update((name, hashed_name))
+            yield name, hashed_name, processed
+
+        if dry_run:
+            return
+        for name in names:
+            if name and name.endswith(COMPRESSED_EXTENSIONS) and self.size(name) >= MIN_COMPRESSED_SIZE:
+                list(compress(Path(self.path(name))))
+
+    def url(self, name, force=False):
+        try:
+            return super().url(name, force)
+        except ValueError:
+            # not collected yet (collectstatic has not been run since the file was added): not hashed
+            logger.warning("Static file %r missing from the manifest, run collectstatic", name)
+            return StaticFilesStorage.url(self, name)
+
+
+def accepted_encodings(request: HttpRequest) -> set:
+    """ Encodings of the ``Accept-Encoding`` header, without those refused with ``q=0`` """
+    encodings = set()
+    for item in request.headers.get('Accept-Encoding', '').split(','):
+        encoding, *parameters = item.split(';')
+        quality = 1.0
+        for parameter in parameters:
+            key, _, value = parameter.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        encoding = encoding.strip().lower()
+        if encoding and quality > 0:
+            encodings.add(encoding)
+
+    if '*' in encodings:
+        encodings.update(name for name, extension in ENCODINGS)
+    return encodings
+
+
+def serve(request: HttpRequest, path: str) -> FileResponse:
+    """ Serve a file of ``STATIC_ROOT``, precompressed if possible """
+    try:
+        fullpath = Path(safe_join(settings.STATIC_ROOT, posixpath.normpath(path).lstrip('/')))
+    except SuspiciousFileOperation:  # outside of STATIC_ROOT
+        raise Http404()
+    if not fullpath.is_file():
+        raise Http404()
+
+    content_type = mimetypes.guess_type(fullpath.name)[0] or 'application/octet-stream'
+    accepted = accepted_encodings(request)
+    encoding, served = None, fullpath
+    for name, extension in ENCODINGS:
+        variant = fullpath.with_name(fullpath.name + extension)
+        if name in accepted and variant.is_file():
+            encoding, served = name, variant
+            break
+
+    stat = served.stat()
+    cache_control = IMMUTABLE if HASHED_NAME.search(fullpath.name) else REVALIDATE
+    if not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(served.open('rb'), content_type=content_type)
+        response.headers['Last-Modified'] = http_date(stat.st_mtime)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = cache_control
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
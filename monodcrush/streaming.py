@@ -0,0 +1,71 @@
+"""
+ASGI handler sending the streaming responses without blocking the event loop.
+
+Django 4.0 iterates the ``StreamingHttpResponse`` in the event loop (async iterators are only accepted from 4.2): a
+response computed as it is sent, like the exports of blog.export, would hold every other connection of the worker
+while it reads the database, and the ORM refuses to run there anyway. ``StreamingASGIHandler`` computes each chunk in
+a thread dedicated to the response, always the same one since the cursors of the iterators belong to its connection,
+and awaits it. The WSGI handler iterates the responses in the thread of the request, as usual.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections, connections
+from django.http.response import HttpResponseBase
+
+END = object()
+
+
+def close_stream(response: HttpResponseBase) -> None:
+    """ Close the iterator and the connections of the stream thread, from this thread """
+    try:
+        response.close()
+    finally:
+        connections.close_all()
+
+
+class StreamingASGIHandler(ASGIHandler):
+
+    async def send_response(self, response: HttpResponseBase, send) -> None:
+        if not response.streaming:
+            await super().send_response(response, send)
+            return
+
+        await send({'type': 'http.response.start', 'status': response.status_code,
+                    'headers': response_headers(response)})
+
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='streaming')
+        parts = iter(response)
+        try:
+            while True:
+                part = await loop.run_in_executor(executor, next, parts, END)
+                if part is END:
+                    break
+                for chunk, _ in self.chunk_bytes(part):
+                    # as ASGIHandler: "more_body" is left to the empty final message
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body'})
+        finally:
+            # also when the client has gone away in the middle of the stream
+            await loop.run_in_executor(executor, close_stream, response)
+            executor.shutdown()
+            # request_finished has been sent in the stream thread, the connections of the view are still open
+            await sync_to_async(close_old_connections, thread_sensitive=True)()
+
+
+def response_headers(response: HttpResponseBase) -> List[Tuple[bytes, bytes]]:
+    """ Headers and cookies of the response, encoded like ``ASGIHandler.send_response`` does """
+    headers = []
+    for header, value in response.items():
+        if isinstance(header, str):
+            header = header.encode('ascii')
+        if isinstance(value, str):
+            value = value.encode('latin1')
+        headers.append((bytes(header), bytes(value)))
+    for cookie in response.cookies.values():
+        headers.append((b'Set-Cookie', cookie.output(header='').encode('ascii').strip()))
+    return headers
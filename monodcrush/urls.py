@@ -13,8 +13,12 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+
+from . import staticfiles
 
 urlpatterns = [
     path('', include('blog.urls')),
@@ -24,3 +28,11 @@ urlpatterns = [
     path('about/', include("about.urls")),
 
 ]
+
+if settings.PROFILE == 'production':
+    urlpatterns += [
+        re_path(rf'^{settings.STATIC_URL.strip("/")}/(?P<path>.+)$', staticfiles.serve, name='static'),
+    ]
+
+# no-op outside of DEBUG: the web server serves MEDIA_ROOT in production
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,160 @@
+// Instamap: draws the precomputed chunks of the map (see instamap.graph) visible at the current zoom.
+// The map coordinates are in [0, 1] x [0, 1]; the level of detail doubles its resolution each time the zoom does.
+(function () {
+    const canvas = document.getElementById('instamap');
+    const context = canvas.getContext('2d');
+    const levels = Number(canvas.dataset.levels);
+    const chunksUrl = canvas.dataset.chunksUrl.replace(/0\/0\/0\.json$/, '');
+    const profileUrl = canvas.dataset.profileUrl;
+
+    const chunks = new Map();  // "level/x/y" -> {nodes, edges}, or null while loading
+    const view = {zoom: 1, x: 0, y: 0};  // zoom 1: the whole map; x, y: map coordinates of the top left corner
+    let scale = 1, hovered = null, drawPending = false;
+
+    function resize() {
+        const ratio = window.devicePixelRatio || 1;
+        canvas.width = canvas.clientWidth * ratio;
+        canvas.height = canvas.clientHeight * ratio;
+        context.setTransform(ratio, 0, 0, ratio, 0, 0);
+        scale = Math.min(canvas.clientWidth, canvas.clientHeight);
+        draw();
+    }
+
+    function level() {
+        return Math.max(0, Math.min(levels - 1, Math.floor(Math.log2(view.zoom))));
+    }
+
+    function toScreen(x, y) {
+        return [(x - view.x) * view.zoom * scale, (y - view.y) * view.zoom * scale];
+    }
+
+    function toMap(left, top) {
+        return [view.x + left / (view.zoom * scale), view.y + top / (view.zoom * scale)];
+    }
+
+    function visibleChunks() {
+        const current = level(), side = 2 ** current;
+        const [x0, y0] = toMap(0, 0), [x1, y1] = toMap(canvas.clientWidth, canvas.clientHeight);
+        const clamp = value => Math.max(0, Math.min(side - 1, Math.floor(value * side)));
+        const keys = [];
+        for (let x = clamp(x0); x <= clamp(x1); x++) {
+            for (let y = clamp(y0); y <= clamp(y1); y++) {
+                keys.push(`${current}/${x}/${y}`);
+            }
+        }
+        return keys;
+    }
+
+    function load(key) {
+        chunks.set(key, null);
+        fetch(`${chunksUrl}${key}.json`)
+            .then(response => response.ok ? response.json() : {nodes: [], edges: []})
+            .then(chunk => {
+                chunks.set(key, chunk);
+                draw();
+            })
+            .catch(() => chunks.delete(key));
+    }
+
+    function draw() {
+        if (drawPending) return;
+        drawPending = true;
+        requestAnimationFrame(() => {
+            drawPending = false;
+            render();
+        });
+    }
+
+    function render() {
+        context.clearRect(0, 0, canvas.clientWidth, canvas.clientHeight);
+        const loaded = [];
+        for (const key of visibleChunks()) {
+            if (!chunks.has(key)) load(key);
+            else if (chunks.get(key)) loaded.push(chunks.get(key));
+        }
+
+        // an edge is in the chunks of both its ends
+        const drawn = new Set();
+        context.lineWidth = 1;
+        for (const chunk of loaded) {
+            for (const [x1, y1, x2, y2, strength] of chunk.edges) {
+                const key = `${x1},${y1},${x2},${y2}`;
+                if (drawn.has(key)) continue;
+                drawn.add(key);
+                context.strokeStyle = `rgba(241, 70, 104, ${0.1 + strength * 0.5})`;
+                context.beginPath();
+                context.moveTo(...toScreen(x1, y1));
+                context.lineTo(...toScreen(x2, y2));
+                context.stroke();
+            }
+        }
+
+        context.font = '12px sans-serif';
+        for (const chunk of loaded) {
+            for (const node of chunk.nodes) {
+                const [, x, y, size, username] = node;
+                const [left, top] = toScreen(x, y);
+                context.fillStyle = node === hovered ? '#3273dc' : '#363636';
+                context.beginPath();
+                context.arc(left, top, 2 + size * 6, 0, 2 * Math.PI);
+                context.fill();
+                if (node === hovered || size * view.zoom > 0.8) {
+                    context.fillText(`@${username}`, left + 4 + size * 6, top + 4);
+                }
+            }
+        }
+    }
+
+    function nodeAt(left, top) {
+        const current = level();
+        for (const [key, chunk] of chunks) {
+            if (!chunk || !key.startsWith(`${current}/`)) continue;
+            for (const node of chunk.nodes) {
+                const [nodeLeft, nodeTop] = toScreen(node[1], node[2]);
+                const radius = 4 + node[3] * 6;
+                if ((nodeLeft - left) ** 2 + (nodeTop - top) ** 2 < radius ** 2) return node;
+            }
+        }
+        return null;
+    }
+
+    let dragging = null, dragged = false;
+    canvas.addEventListener('mousedown', event => {
+        dragging = {left: event.offsetX, top: event.offsetY, moved: false};
+        canvas.style.cursor = 'grabbing';
+    });
+    window.addEventListener('mouseup', () => {
+        dragged = Boolean(dragging && dragging.moved);
+        dragging = null;
+        canvas.style.cursor = 'grab';
+    });
+    canvas.addEventListener('mousemove', event => {
+        if (dragging) {
+            view.x -= (event.offsetX - dragging.left) / (view.zoom * scale);
+            view.y -= (event.offsetY - dragging.top) / (view.zoom * scale);
+            dragging = {left: event.offsetX, top: event.offsetY, moved: true};
+        } else {
+            hovered = nodeAt(event.offsetX, event.offsetY);
+            canvas.title = hovered && hovered[5] ? `@${hovered[4]} (Instagram : @${hovered[5]})` : '';
+            canvas.style.cursor = hovered ? 'pointer' : 'grab';
+        }
+        draw();
+    });
+    canvas.addEventListener('click', () => {
+        if (hovered && !dragged) {
+            window.location = profileUrl.replace('__username__', encodeURIComponent(hovered[4]));
+        }
+    });
+    canvas.addEventListener('wheel', event => {
+        event.preventDefault();
+        const [x, y] = toMap(event.offsetX, event.offsetY);
+        view.zoom = Math.max(1, Math.min(2 ** (levels + 2), view.zoom * (event.deltaY < 0 ? 1.25 : 0.8)));
+        // keep the point under the cursor in place
+        view.x = x - event.offsetX / (view.zoom * scale);
+        view.y = y - event.offsetY / (view.zoom * scale);
+        draw();
+    }, {passive: false});
+
+    window.addEventListener('resize', resize);
+    resize();
+})();